@@ -0,0 +1,77 @@
+# Бенчмарк кодеков хранения состояния игры
+#
+# Запуск: python filehub_tycoon/benchmarks/bench_codecs.py [--turns 100] [--repeat 200]
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from game.game_engine import GameEngine
+from game.models import GameState, ALL_SECTIONS, construct_trusted
+from utils.database import CODECS
+
+def play_game(turns: int, seed: int = 42) -> GameState:
+    """Прогон игры на заданное число ходов со случайными ответами на события"""
+    random.seed(seed)
+    engine = GameEngine()
+    game_state = GameState(
+        user_id=1,
+        rng_seed=seed,
+        tracker_name="Бенчмарк Хаб",
+        site_name="Бенчмарк Хаб",
+        domain_name="bench.com",
+        setup_complete=True,
+        budget=10_000_000
+    )
+
+    for _ in range(turns):
+        if game_state.last_event and not game_state.last_event.resolved:
+            engine.handle_event_choice(game_state, random.randrange(len(game_state.last_event.choices)))
+        engine.process_turn(game_state)
+        game_state.current_turn += 1
+        game_state.actions_remaining = 3
+
+    return game_state
+
+def measure(func, repeat: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение кодеков хранения GameState")
+    parser.add_argument('--turns', type=int, default=100, help="Длина партии в ходах")
+    parser.add_argument('--repeat', type=int, default=200, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    game_state = play_game(args.turns)
+    sections = game_state.dump_sections(list(ALL_SECTIONS))
+    print(f"Партия: {args.turns} ходов, событий в истории: {len(game_state.recent_events)}")
+    print(f"{'Кодек':<10}{'Байт/игра':>12}{'Кодир., мкс':>14}{'Декод., мкс':>14}"
+          f"{'Декод.+валид., мкс':>22}{'Декод.+довер., мкс':>22}")
+
+    for codec in CODECS.values():
+        blobs = {name: codec.encode(data) for name, data in sections.items()}
+        size = sum(len(blob.encode('utf-8') if isinstance(blob, str) else blob) for blob in blobs.values())
+
+        encode_us = measure(lambda: [codec.encode(data) for data in sections.values()], args.repeat)
+        decode_us = measure(lambda: {name: codec.decode(blob) for name, blob in blobs.items()}, args.repeat)
+        validate_us = measure(
+            lambda: GameState(**GameState.merge_sections({name: codec.decode(blob) for name, blob in blobs.items()})),
+            args.repeat
+        )
+        trusted_us = measure(
+            lambda: construct_trusted(GameState, GameState.merge_sections({name: codec.decode(blob) for name, blob in blobs.items()})),
+            args.repeat
+        )
+
+        print(f"{codec.name:<10}{size:>12,}{encode_us:>14,.0f}{decode_us:>14,.0f}{validate_us:>22,.0f}{trusted_us:>22,.0f}")
+
+if __name__ == "__main__":
+    main()
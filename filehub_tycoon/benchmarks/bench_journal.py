@@ -0,0 +1,109 @@
+# Бенчмарк восстановления игры из снимка и журнала действий
+#
+# Для каждого интервала снимков K партия играется с записью после каждого хода,
+# затем замеряется восстановление: чтение из базы, сборка состояния и повтор
+# действий после последнего снимка. Для сравнения - хранение секциями.
+#
+# Запуск: python filehub_tycoon/benchmarks/bench_journal.py [--turns 199] [--repeat 50]
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from game import actions
+from game.game_engine import GameEngine
+from game.models import GameState, construct_trusted
+from utils.database import Database, AsyncDatabase
+from utils.state_manager import StateManager
+
+INTERVALS = [1, 5, 10, 25, 50, 100, None]  # None - только начальный снимок
+
+async def play_game(db_path: str, turns: int, journal: bool, interval: int, seed: int = 42):
+    """Партия со случайными действиями игрока и записью после каждого хода"""
+    db = Database(db_path)
+    state_manager = StateManager(AsyncDatabase(db), engine=GameEngine(), journal=journal, snapshot_interval=interval)
+    await state_manager.start()
+    rng = random.Random(seed)
+    user_id = 1
+
+    await state_manager.create_new_game(user_id)
+    state_manager.generate_setup_options(user_id)
+    state_manager.select_setup_option(user_id, 0)
+    state_manager.update_state(user_id, {'budget': 10_000_000})
+    for _ in range(turns):
+        game_state = await state_manager.get_game_state(user_id)
+        if game_state.last_event and not game_state.last_event.resolved:
+            state_manager.choose_event(user_id, rng.randrange(len(game_state.last_event.choices)))
+        if rng.random() < 0.2:
+            state_manager.start_marketing_campaign(user_id, 'social_media', 'small', 10_000)
+        state_manager.play_turn(user_id)
+        state_manager.advance_turn(user_id)
+        await state_manager.save_game(user_id, durable=True)
+
+    await state_manager.shutdown()
+    db.close()
+
+def restore(db: Database, engine: GameEngine, user_id: int) -> GameState:
+    """Восстановление игры так же, как StateManager при загрузке"""
+    game_data = db.load_game(user_id)
+    game_state = construct_trusted(GameState, game_data['game_state'])
+    game_state.link_last_event()
+    actions.replay(game_state, engine, game_data['actions'])
+    game_state.take_log()
+    return game_state
+
+def stored_bytes(db_path: str) -> int:
+    """Объем данных игры во всех таблицах состояния"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return sum(
+            conn.execute(f"SELECT COALESCE(SUM(LENGTH({column})), 0) FROM {table}").fetchone()[0]
+            for table, column in [('games', 'game_state'), ('game_sections', 'data'), ('events', 'data'), ('snapshots', 'data')]
+        )
+    finally:
+        conn.close()
+
+def measure(func, repeat: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Время восстановления игры в зависимости от интервала снимков")
+    parser.add_argument('--turns', type=int, default=199, help="Длина партии в ходах")
+    parser.add_argument('--repeat', type=int, default=50, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    engine = GameEngine()
+    print(f"Партия: {args.turns} ходов, запись после каждого хода")
+    print(f"{'Хранение':<16}{'Действий повтора':>18}{'Байт в базе/ход':>18}{'Восстановление, мкс':>22}")
+
+    modes = [('секции', False, 10)] + [
+        (f"журнал K={interval}" if interval else "журнал, без K", True, interval or args.turns + 1)
+        for interval in INTERVALS
+    ]
+    for label, journal, interval in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            asyncio.run(play_game(db_path, args.turns, journal, interval))
+
+            db = Database(db_path)
+            replayed = len(db.load_game(1)['actions'])
+            restore_us = measure(lambda: restore(db, engine, 1), args.repeat)
+            db.close()
+
+            per_turn = stored_bytes(db_path) / args.turns
+            print(f"{label:<16}{replayed:>18,}{per_turn:>18,.0f}{restore_us:>22,.0f}")
+
+if __name__ == "__main__":
+    main()
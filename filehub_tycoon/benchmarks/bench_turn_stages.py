@@ -0,0 +1,70 @@
+# Бенчмарк стадий хода
+#
+# Партии играются с замером времени стадий конвейера хода (game/pipeline.py):
+# по каждой стадии - вызовы, среднее время и гистограмма длительностей.
+# Затем время хода сравнивается с отключением каждой стадии по очереди.
+#
+# Запуск: python filehub_tycoon/benchmarks/bench_turn_stages.py [--games 200] [--turns 50]
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from game.game_engine import GameEngine
+from game.models import GameState
+
+def new_games(count: int):
+    return [GameState(
+        user_id=index,
+        rng_seed=index,
+        tracker_name="Бенчмарк Хаб",
+        site_name="Бенчмарк Хаб",
+        domain_name="bench.com",
+        setup_complete=True,
+        budget=10_000_000
+    ) for index in range(count)]
+
+def play(engine: GameEngine, games: int, turns: int) -> float:
+    """Партии с ответами на события; среднее время хода в микросекундах"""
+    choices = random.Random(42)
+    elapsed = 0.0
+    for game_state in new_games(games):
+        for _ in range(turns):
+            if game_state.last_event and not game_state.last_event.resolved:
+                engine.handle_event_choice(game_state, choices.randrange(len(game_state.last_event.choices)))
+            start = time.perf_counter()
+            engine.process_turn(game_state)
+            elapsed += time.perf_counter() - start
+            game_state.current_turn += 1
+    return elapsed / (games * turns) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Время стадий хода игры")
+    parser.add_argument('--games', type=int, default=200, help="Число партий")
+    parser.add_argument('--turns', type=int, default=50, help="Ходов в партии")
+    args = parser.parse_args()
+
+    engine = GameEngine()
+    baseline = play(engine, args.games, args.turns)
+
+    engine.pipeline.enable_profiling()
+    profiled = play(engine, args.games, args.turns)
+    print(f"Ход: {baseline:,.1f} мкс, с замером стадий: {profiled:,.1f} мкс")
+    print(f"{'Стадия':<14}{'Вызовов':>10}{'Среднее, мкс':>14}  Гистограмма")
+    for name, stats in engine.pipeline.report().items():
+        histogram = " ".join(f"{bucket}:{count}" for bucket, count in stats['histogram'].items())
+        print(f"{name:<14}{stats['calls']:>10,}{stats['mean_us']:>14,.1f}  {histogram}")
+    engine.pipeline.enable_profiling(False)
+
+    print(f"\n{'Без стадии':<14}{'Ход, мкс':>10}")
+    for name in engine.pipeline.stage_names():
+        engine.pipeline.set_enabled(name, False)
+        print(f"{name:<14}{play(engine, args.games, args.turns):>10,.1f}")
+        engine.pipeline.set_enabled(name, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+# Игровые действия над состоянием игры
+#
+# Функции изменяют переданный GameState напрямую и не зависят от бота и базы
+# данных: их используют StateManager и симулятор партий.
+#
+# Действия игрока выполняются через perform: оно записывает действие в журнал
+# игры, а replay повторяет записанные действия. Так игра восстанавливается из
+# снимка и журнала (при детерминированных случайных величинах, game/rng.py).
+
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from game.models import (GameState, Staff, UserRole, InfrastructureLevel, HostingRegion, STATE_SECTIONS, CORE_SECTION,
+                         TIMER_CAMPAIGN_END, campaign_end_turn)
+from game.ledger import LedgerCategory, post_entry, update_indicators
+from utils.config import Config
+
+# Секции, от которых зависят производные метрики (game/derived.py)
+DERIVED_SECTIONS = {'staff', 'infrastructure', 'expenses'}
+
+# Ключи стоимости апгрейдов в Config.INFRASTRUCTURE_COSTS по типу компонента
+UPGRADE_COST_KEYS = {
+    'server': 'server_upgrade',
+    'bandwidth': 'bandwidth_increase',
+    'storage': 'storage_expansion',
+    'security': 'security_enhancement'
+}
+
+def hire_staff(game_state: GameState, role: UserRole, name: str, salary: int, skill_level: int = 1) -> bool:
+    """Найм сотрудника"""
+    # Проверяем, не нанят ли уже сотрудник на эту роль
+    if role in game_state.staff and game_state.staff[role].hired:
+        return False
+
+    previous = game_state.staff.get(role.value)
+    game_state.derived().staff_hired(salary, replaced_hired=bool(previous and previous.hired))
+    game_state.staff[role.value] = Staff(
+        role=role,
+        name=name,
+        salary=salary,
+        skill_level=skill_level,
+        hired=True,
+        hired_date=datetime.now()
+    )
+
+    # Увеличиваем расходы на персонал и общие расходы
+    game_state.expenses.staff_cost += salary
+    game_state.expenses.total_expenses += salary
+
+    game_state.touch('staff', 'expenses')
+    return True
+
+def upgrade_infrastructure(game_state: GameState, upgrade_type: str, level: str) -> bool:
+    """Апгрейд компонента инфраструктуры"""
+    infrastructure = game_state.infrastructure
+    derived = game_state.derived()  # До изменения: в режиме проверки чтение сверяет кэш с состоянием
+
+    if upgrade_type == 'server':
+        infrastructure.server_level = InfrastructureLevel(level)
+    elif upgrade_type == 'bandwidth':
+        infrastructure.bandwidth_level = InfrastructureLevel(level)
+    elif upgrade_type == 'storage':
+        infrastructure.storage_level = InfrastructureLevel(level)
+    elif upgrade_type == 'security':
+        infrastructure.security_level = InfrastructureLevel(level)
+    else:
+        return False
+
+    derived.infrastructure_changed(infrastructure)
+    game_state.touch('infrastructure')
+    return True
+
+def add_hosting_region(game_state: GameState, region: str, level: str) -> bool:
+    """Добавление региона хостинга"""
+    hosting = game_state.hosting
+    hosting.regions[HostingRegion(region)] = InfrastructureLevel(level)
+    hosting.mirrors_count += 1
+
+    game_state.touch('hosting')
+    return True
+
+def start_marketing_campaign(game_state: GameState, campaign_type: str, level: str, cost: int) -> bool:
+    """Запуск маркетинговой кампании (стоимость списывается из бюджета один раз)"""
+    marketing = game_state.marketing
+
+    campaign_key = marketing.add_campaign({
+        'type': campaign_type,
+        'level': level,
+        'cost': cost,
+        'start_turn': game_state.current_turn,
+        'duration': 3  # Ходы
+    })
+    game_state.schedule_campaign_end(campaign_key)
+
+    # Разовый расход: в регулярные расходы хода кампания не попадает
+    marketing.ad_spend += cost
+    post_entry(game_state, LedgerCategory.MARKETING, -cost, f"campaign:{campaign_type}:{level}")
+
+    game_state.touch('marketing')
+    return True
+
+# Покупки с проверкой бюджета - так же, как их выполняют обработчики кнопок бота
+
+def buy_staff(game_state: GameState, config: Config, role: str, name: str = None) -> bool:
+    """Найм сотрудника с оплатой первой зарплаты из бюджета"""
+    salary = config.get_staff_salary(role)
+    if game_state.budget < salary:
+        return False
+    if not hire_staff(game_state, UserRole(role), name or role, salary):
+        return False
+    return post_entry(game_state, LedgerCategory.STAFF, -salary, f"hire:{role}")
+
+def buy_upgrade(game_state: GameState, config: Config, upgrade_type: str, level: str) -> bool:
+    """Апгрейд инфраструктуры с оплатой из бюджета"""
+    cost = config.get_infrastructure_cost(UPGRADE_COST_KEYS.get(upgrade_type, upgrade_type), level)
+    if game_state.budget < cost:
+        return False
+    if not upgrade_infrastructure(game_state, upgrade_type, level):
+        return False
+    return post_entry(game_state, LedgerCategory.INFRASTRUCTURE, -cost, f"upgrade:{upgrade_type}:{level}")
+
+def buy_campaign(game_state: GameState, config: Config, campaign_type: str, level: str) -> bool:
+    """Запуск маркетинговой кампании с оплатой из бюджета"""
+    cost = config.get_marketing_cost(campaign_type, level)
+    if game_state.budget < cost:
+        return False
+    return start_marketing_campaign(game_state, campaign_type, level, cost)
+
+def buy_hosting(game_state: GameState, config: Config, region: str, level: str = 'basic') -> bool:
+    """Добавление региона хостинга с оплатой из бюджета"""
+    cost = config.get_hosting_cost(region, level)
+    if game_state.budget < cost:
+        return False
+    add_hosting_region(game_state, region, level)
+    return post_entry(game_state, LedgerCategory.HOSTING, -cost, f"hosting:{region}")
+
+def buy_legal(game_state: GameState, config: Config, action: str) -> bool:
+    """Юридическое действие (Config.LEGAL_ACTIONS) с оплатой из бюджета"""
+    action_info = config.LEGAL_ACTIONS.get(action)
+    if action_info is None or game_state.budget < action_info['cost']:
+        return False
+    game_state.legal.risk_level = max(0, game_state.legal.risk_level + action_info['effect'])
+    game_state.touch('legal')
+    return post_entry(game_state, LedgerCategory.LEGAL, -action_info['cost'], f"legal:{action}")
+
+def request_donations(game_state: GameState, amount: int) -> bool:
+    """Сбор пожертвований у сообщества: разовый взнос и рост ежемесячных пожертвований"""
+    game_state.community.donations_monthly += amount
+    game_state.touch('community')
+    return post_entry(game_state, LedgerCategory.DONATIONS, amount, "community:request_donations")
+
+def advance_turn(game_state: GameState, at: Optional[datetime] = None) -> bool:
+    """Переход к следующему ходу игры (at - время хода, по умолчанию текущее)"""
+    game_state.current_turn += 1
+    game_state.actions_remaining = 3  # Восстанавливаем количество действий
+    game_state.last_turn_date = at or datetime.now()
+    game_state.touch('core')
+    fire_turn_timers(game_state)
+    return True
+
+def fire_turn_timers(game_state: GameState) -> int:
+    """Срабатывание таймеров по ходам до текущего хода включительно
+    
+    Закончившиеся кампании переносятся в итоги по типу: ход их больше не
+    просматривает, а на расчет они уже не влияют.
+    """
+    fired = game_state.turn_timers().advance(game_state.current_turn)
+    for timer in fired:
+        kind, key = timer.key
+        if kind == TIMER_CAMPAIGN_END:
+            campaign = game_state.marketing.campaigns.get(key)
+            if campaign and campaign_end_turn(campaign) < game_state.current_turn:
+                game_state.marketing.retire_campaign(key)
+                game_state.touch('marketing')
+    return len(fired)
+
+def update_fields(game_state: GameState, updates: Dict[str, Any]) -> bool:
+    """Прямое обновление полей состояния (неизвестные поля пропускаются)"""
+    sections = set()
+    for key, value in updates.items():
+        if hasattr(game_state, key):
+            setattr(game_state, key, value)
+            sections.add(key if key in STATE_SECTIONS else CORE_SECTION)
+    
+    if sections:
+        game_state.touch(*sections)
+        if sections & DERIVED_SECTIONS:
+            game_state.drop_derived()
+    return True
+
+def answer_event(game_state: GameState, choice: str) -> bool:
+    """Ответ на событие текстом варианта (без применения эффекта)"""
+    event = game_state.last_event
+    if not event or event.resolved:
+        return False
+    
+    if choice in event.choices:
+        event.choice_index = event.choices.index(choice)
+    event.resolved = True
+    game_state.record_event_choice(event)
+    game_state.touch('core', 'recent_events')
+    return True
+
+def expire_event(game_state: GameState) -> bool:
+    """Истечение срока ответа на событие: событие закрывается без выбора"""
+    event = game_state.last_event
+    if not event or event.resolved:
+        return False
+    
+    event.resolved = True
+    game_state.record_event_choice(event)
+    game_state.touch('core', 'recent_events')
+    return True
+
+def calculate_metrics(game_state: GameState) -> bool:
+    """Финансовые показатели по сводке последнего хода из журнала (game/ledger.py)
+
+    Доходы и расходы считает только ход движка; здесь они не пересчитываются.
+    """
+    rollup = game_state.ledger.last_rollup()
+    if rollup is None:
+        return False
+    update_indicators(game_state.financial, rollup)
+    game_state.touch('financial')
+    return True
+
+def generate_setup_options(game_state: GameState, count: int = 5) -> bool:
+    """Генерация вариантов названия и домена (из потока случайности игры)"""
+    from utils.name_generator import TrackerNameGenerator
+    
+    game_state.current_setup_options = TrackerNameGenerator.generate_multiple_options(count, game_state.misc_random())
+    game_state.touch('core')
+    return True
+
+def setup_name(game_state: GameState, name: str) -> bool:
+    """Настройка названия хаба"""
+    game_state.tracker_name = name
+    game_state.site_name = name
+    game_state.name_setup_step = "domain"
+    game_state.touch('core')
+    return True
+
+def setup_domain(game_state: GameState, domain: str) -> bool:
+    """Настройка домена хаба (завершает настройку)"""
+    game_state.domain_name = domain
+    game_state.available_domains = []
+    game_state.add_domain(domain)
+    game_state.name_setup_step = "complete"
+    game_state.setup_complete = True
+    game_state.touch('core')
+    return True
+
+def select_setup_option(game_state: GameState, option_index: int) -> bool:
+    """Выбор варианта настройки из предложенных"""
+    if option_index >= len(game_state.current_setup_options):
+        return False
+    
+    name, domain = game_state.current_setup_options[option_index]
+    setup_name(game_state, name)
+    setup_domain(game_state, domain)
+    game_state.current_setup_options = []
+    return True
+
+def change_domain(game_state: GameState, new_domain: str) -> bool:
+    """Смена домена хаба (снимает блокировку текущего домена)"""
+    from utils.name_generator import TrackerNameGenerator
+    if not TrackerNameGenerator.validate_domain(new_domain):
+        return False
+    
+    game_state.add_domain(new_domain)
+    game_state.domain_name = new_domain
+    game_state.current_domain_blocked = False
+    game_state.touch('core')
+    return True
+
+def _catch_up(game_state: GameState, engine, turns: int, tick_hours: float) -> Dict[str, Any]:
+    """Догоняние ходов, пропущенных игроком в режиме реального времени (game/idle.py)"""
+    from game.idle import catch_up
+    return catch_up(game_state, engine, turns, tick_hours)
+
+# Журналируемые действия: имя -> функция(game_state, engine, **params).
+# Параметры записываются в журнал, поэтому должны сериализоваться кодеками базы.
+ACTIONS = {
+    'hire': lambda game_state, engine, role, name, salary, skill_level=1:
+        hire_staff(game_state, UserRole(role), name, salary, skill_level),
+    'upgrade': lambda game_state, engine, upgrade_type, level: upgrade_infrastructure(game_state, upgrade_type, level),
+    'hosting': lambda game_state, engine, region, level: add_hosting_region(game_state, region, level),
+    'campaign': lambda game_state, engine, campaign_type, level, cost:
+        start_marketing_campaign(game_state, campaign_type, level, cost),
+    'buy_staff': lambda game_state, engine, role, name=None: buy_staff(game_state, engine.config, role, name),
+    'buy_upgrade': lambda game_state, engine, upgrade_type, level:
+        buy_upgrade(game_state, engine.config, upgrade_type, level),
+    'buy_hosting': lambda game_state, engine, region, level='basic':
+        buy_hosting(game_state, engine.config, region, level),
+    'buy_legal': lambda game_state, engine, legal_action: buy_legal(game_state, engine.config, legal_action),
+    'donations': lambda game_state, engine, amount: request_donations(game_state, amount),
+    'ledger': lambda game_state, engine, category, amount, source: post_entry(game_state, category, amount, source),
+    'update': lambda game_state, engine, updates: update_fields(game_state, updates),
+    'metrics': lambda game_state, engine: calculate_metrics(game_state),
+    'turn': lambda game_state, engine: engine.process_turn(game_state),
+    'next': lambda game_state, engine, at=None: advance_turn(game_state, datetime.fromisoformat(at) if at else None),
+    'catch_up': lambda game_state, engine, turns, tick_hours: _catch_up(game_state, engine, turns, tick_hours),
+    'event_choice': lambda game_state, engine, choice_index: engine.handle_event_choice(game_state, choice_index),
+    'event_answer': lambda game_state, engine, choice: answer_event(game_state, choice),
+    'expire_event': lambda game_state, engine: expire_event(game_state),
+    'setup_options': lambda game_state, engine: generate_setup_options(game_state),
+    'setup_name': lambda game_state, engine, name: setup_name(game_state, name),
+    'setup_domain': lambda game_state, engine, domain: setup_domain(game_state, domain),
+    'setup_select': lambda game_state, engine, option_index: select_setup_option(game_state, option_index),
+    'change_domain': lambda game_state, engine, domain: change_domain(game_state, domain)
+}
+
+def _succeeded(action: str, result: Any) -> bool:
+    """Изменило ли действие состояние (неудачные действия проверяют условия до изменений)"""
+    if isinstance(result, dict):
+        if action == 'turn' and result.get('status') == 'error':
+            # Ход не выполнен; сводка догоняния с ошибкой ('catch_up') пишется -
+            # ходы до ошибки уже применены
+            return False
+        return result.get('success', True)
+    return bool(result)
+
+def perform(game_state: GameState, engine, action: str, **params) -> Any:
+    """Выполнение действия игрока с записью в журнал игры
+    
+    engine - GameEngine для хода и выбора в событии. Неудачные действия
+    (вернувшие False или {'success': False}, ход со статусом 'error') в
+    журнал не пишутся.
+    """
+    result = ACTIONS[action](game_state, engine, **params)
+    if _succeeded(action, result):
+        game_state.record_action(action, params)
+    return result
+
+def progress_metrics(game_state: GameState) -> Dict[str, Any]:
+    """Показатели для сводки нескольких ходов"""
+    return {
+        'turn': game_state.current_turn,
+        'active_users': game_state.active_users,
+        'budget': game_state.budget,
+        'nps_score': game_state.marketing.nps_score,
+        'legal_risk': game_state.legal.risk_level
+    }
+
+def fast_forward(game_state: GameState, engine, max_turns: int) -> Dict[str, Any]:
+    """Несколько ходов подряд с одной сводкой
+    
+    Каждый ход выполняется как при /next (действия 'turn' и 'next').
+    Остановка раньше max_turns: нерешенное событие, победа, поражение или
+    ошибка хода (stop_reason: 'event', 'win', 'lose', 'error'; None - все ходы).
+    """
+    summary = {
+        'turns': 0,
+        'start': progress_metrics(game_state),
+        'end': None,
+        'total_revenue': 0,
+        'total_expenses': 0,
+        'cash_flow': 0,
+        'new_events': [],
+        'status': 'success',
+        'stop_reason': None
+    }
+    
+    for _ in range(max_turns):
+        if game_state.last_event and not game_state.last_event.resolved:
+            summary['stop_reason'] = 'event'
+            break
+        
+        turn_results = perform(game_state, engine, 'turn')
+        if turn_results['status'] == 'error':
+            summary['status'] = 'error'
+            summary['stop_reason'] = 'error'
+            break
+        
+        rollup = game_state.ledger.last_rollup()
+        summary['turns'] += 1
+        summary['total_revenue'] += rollup['revenue']
+        summary['total_expenses'] += rollup['expenses']
+        summary['cash_flow'] += rollup['cash_flow']
+        summary['new_events'].extend(turn_results['new_events'])
+        summary['status'] = turn_results['status']
+        perform(game_state, engine, 'next', at=datetime.now().isoformat())
+        
+        if turn_results['status'] in ('win', 'lose'):
+            summary['stop_reason'] = turn_results['status']
+            break
+    
+    summary['end'] = progress_metrics(game_state)
+    return summary
+
+def replay(game_state: GameState, engine, records: List[Dict[str, Any]]) -> int:
+    """Повтор записанных действий по порядку (данные записей журнала LOG_ACTION)
+    
+    Записи журнала, которые создает повтор (события хода и т.п.), уже есть в
+    базе; их забирает вызывающий (take_log).
+    """
+    for record in records:
+        perform(game_state, engine, record['action'], **record['params'])
+    return len(records)
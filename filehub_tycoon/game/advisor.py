@@ -0,0 +1,289 @@
+# Советник /plan: поиск плана действий на несколько ходов вперед
+#
+# Expectimax по копиям состояния (clone_game_state). В узле решения
+# перебираются действия игрока - одна покупка за ход или пропуск, в узле
+# случая ход считается движком для нескольких выборок случайности: копия
+# получает зерно из отдельного потока, а не настоящее зерно игры, поэтому
+# советник не знает будущих событий заранее. Значения узлов кэшируются по
+# квантованному состоянию; таблица транспозиций живет в процессе поиска
+# между запросами. Глубина растет, пока хватает бюджета времени, а порядок
+# действий во внутренних узлах берется из оценок корня на прошлой глубине.
+# Результат - лучший план последней полностью просчитанной глубины.
+#
+# Поиск выполняется в отдельном процессе (PlanAdvisor), чтобы не блокировать
+# цикл бота, а готовые планы запоминаются по версии состояния игры.
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from game import actions, rng
+from game.game_engine import GameEngine
+from game.models import GameState, HostingRegion, campaign_end_turn, clone_game_state
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+WIN_VALUE = 1e9
+LOSS_VALUE = -1e9
+PLAN_STREAM = 0x3C6EF372FE94F82B  # Сдвиг зерна для выборок случайности советника
+TRANSPOSITION_LIMIT = 200_000     # Записей в таблице транспозиций процесса поиска
+MEMO_LIMIT = 10_000               # Запомненных планов (по одному на игрока)
+
+CAMPAIGN_TYPES = ('social_media', 'paid_ads', 'content_marketing')  # Типы с эффектом в расчете хода
+CAMPAIGN_LEVELS = ('small', 'medium', 'large')
+NEXT_LEVEL = {'basic': 'advanced', 'advanced': 'enterprise'}
+
+Action = Tuple[str, ...]
+WAIT: Action = ('wait',)
+
+class SearchTimeout(Exception):
+    """Бюджет времени поиска исчерпан"""
+
+def candidate_actions(game_state: GameState, config: Config) -> List[Action]:
+    """Действия, доступные игроку по бюджету (пропуск хода - всегда)"""
+    budget = game_state.budget
+    options = [WAIT]
+    for role, salary in config.STAFF_SALARIES.items():
+        staff = game_state.staff.get(role)
+        if (staff is None or not staff.hired) and budget >= salary:
+            options.append(('hire', role))
+    for component, cost_key in actions.UPGRADE_COST_KEYS.items():
+        level = NEXT_LEVEL.get(getattr(game_state.infrastructure, f"{component}_level"))
+        if level and budget >= config.get_infrastructure_cost(cost_key, level):
+            options.append(('upgrade', component, level))
+    for campaign_type in CAMPAIGN_TYPES:
+        for level in CAMPAIGN_LEVELS:
+            if budget >= config.get_marketing_cost(campaign_type, level):
+                options.append(('campaign', campaign_type, level))
+    for region in HostingRegion:
+        if region not in game_state.hosting.regions and budget >= config.get_hosting_cost(region.value, 'basic'):
+            options.append(('hosting', region.value))
+    for action, action_info in config.LEGAL_ACTIONS.items():
+        if budget >= action_info['cost']:
+            options.append(('legal', action))
+    return options
+
+def apply_action(game_state: GameState, config: Config, action: Action) -> bool:
+    """Выполнение действия плана на состоянии (так же, как покупки в боте)"""
+    kind = action[0]
+    if kind == 'wait':
+        return True
+    if kind == 'hire':
+        return actions.buy_staff(game_state, config, action[1])
+    if kind == 'upgrade':
+        return actions.buy_upgrade(game_state, config, action[1], action[2])
+    if kind == 'campaign':
+        return actions.buy_campaign(game_state, config, action[1], action[2])
+    if kind == 'hosting':
+        return actions.buy_hosting(game_state, config, action[1])
+    if kind == 'legal':
+        return actions.buy_legal(game_state, config, action[1])
+    return False
+
+def describe_action(action: Action, config: Config) -> str:
+    """Текст действия плана для игрока (без "_": сообщения бота размечены Markdown)"""
+    return _action_text(action, config).replace('_', ' ')
+
+def _action_text(action: Action, config: Config) -> str:
+    kind = action[0]
+    if kind == 'hire':
+        return f"Нанять {action[1]} (${config.get_staff_salary(action[1]):,})"
+    if kind == 'upgrade':
+        cost = config.get_infrastructure_cost(actions.UPGRADE_COST_KEYS[action[1]], action[2])
+        return f"Апгрейд {action[1]} до {action[2]} (${cost:,})"
+    if kind == 'campaign':
+        return f"Кампания {action[1]} {action[2]} (${config.get_marketing_cost(action[1], action[2]):,})"
+    if kind == 'hosting':
+        return f"Хостинг в регионе {action[1]} (${config.get_hosting_cost(action[1], 'basic'):,})"
+    if kind == 'legal':
+        action_info = config.LEGAL_ACTIONS[action[1]]
+        return f"{action_info['description']} (${action_info['cost']:,})"
+    return "Пропустить ход и копить бюджет"
+
+def _log_bucket(value: float) -> int:
+    """Знаковая логарифмическая корзина (шаг ~9%)"""
+    bucket = int(math.log2(1 + abs(value)) * 8)
+    return bucket if value >= 0 else -bucket
+
+def state_key(game_state: GameState, depth: int) -> tuple:
+    """Квантованное состояние для таблицы транспозиций"""
+    infrastructure = game_state.infrastructure
+    return (
+        depth,
+        game_state.current_turn,
+        _log_bucket(game_state.active_users),
+        _log_bucket(game_state.budget),
+        _log_bucket(game_state.derived().expenses),
+        round(game_state.marketing.nps_score),
+        round(game_state.legal.risk_level),
+        round(game_state.community.retention_rate_30d),
+        frozenset(role for role, staff in game_state.staff.items() if staff.hired),
+        (str(infrastructure.server_level), str(infrastructure.bandwidth_level),
+         str(infrastructure.storage_level), str(infrastructure.security_level)),
+        frozenset(str(region) for region in game_state.hosting.regions),
+        tuple((campaign.get('type'), campaign.get('level'), campaign_end_turn(campaign))
+              for campaign in game_state.marketing.campaigns.values())
+    )
+
+def evaluate(engine, game_state: GameState, status: str = 'success') -> float:
+    """Оценка состояния: счет игры плюс бюджет; победа и поражение - крайние значения"""
+    if status == 'win':
+        return WIN_VALUE
+    if status in ('lose', 'error'):
+        return LOSS_VALUE
+    return engine.calculate_score(game_state) + game_state.budget / 1000
+
+class PlanSearch:
+    """Один поиск плана с ограничением по времени"""
+
+    def __init__(self, engine, deadline: float, samples: int, inner_width: int, table: Dict[tuple, tuple]):
+        self.engine = engine
+        self.config = engine.config
+        self.deadline = deadline
+        self.samples = samples
+        self.inner_width = inner_width
+        self.table = table
+        self.ordering: List[Action] = []  # Действия корня по убыванию оценки (с прошлой глубины)
+        self.nodes = 0
+        self.cache_hits = 0
+
+    def root(self, game_state: GameState, depth: int) -> List[Tuple[float, List[Action]]]:
+        """Оценки всех действий корня на глубину depth (по убыванию)"""
+        scored = []
+        for action in candidate_actions(game_state, self.config):
+            child = clone_game_state(game_state)
+            if apply_action(child, self.config, action):
+                value, plan = self.chance(child, depth)
+                scored.append((value, [action] + plan))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def decision(self, game_state: GameState, depth: int) -> Tuple[float, List[Action]]:
+        """Узел решения: лучшее действие хода"""
+        if depth == 0:
+            return evaluate(self.engine, game_state), []
+
+        key = state_key(game_state, depth)
+        cached = self.table.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        available = set(candidate_actions(game_state, self.config))
+        options = [action for action in self.ordering if action in available][:self.inner_width]
+        if WAIT not in options:
+            options.append(WAIT)
+
+        best = (-math.inf, [])
+        for action in options:
+            child = clone_game_state(game_state)
+            if not apply_action(child, self.config, action):
+                continue
+            value, plan = self.chance(child, depth)
+            if value > best[0]:
+                best = (value, [action] + plan)
+        self.table[key] = best
+        return best
+
+    def chance(self, game_state: GameState, depth: int) -> Tuple[float, List[Action]]:
+        """Узел случая: средняя оценка хода по выборкам случайности"""
+        total = 0.0
+        first_plan: List[Action] = []
+        for sample in range(self.samples):
+            child = clone_game_state(game_state) if sample < self.samples - 1 else game_state
+            child.rng_seed = rng.stream_value(game_state.rng_seed ^ PLAN_STREAM, sample)
+            status = self.engine.process_turn(child).get('status')
+            self.nodes += 1
+            if status == 'success':
+                actions.advance_turn(child)
+                value, plan = self.decision(child, depth - 1)
+            else:
+                value, plan = evaluate(self.engine, child, status), []
+            total += value
+            if sample == 0:
+                first_plan = plan
+        return total / self.samples, first_plan
+
+_worker_engine = None
+_transpositions: Dict[tuple, tuple] = {}
+
+def search_plan(game_state: GameState, budget_ms: float = 200, max_depth: int = 4, samples: int = 3,
+                inner_width: int = 4) -> Dict[str, Any]:
+    """Лучший план в пределах бюджета времени (выполняется в процессе поиска)"""
+    global _worker_engine
+    start = time.perf_counter()
+    if _worker_engine is None:
+        _worker_engine = GameEngine()
+    if len(_transpositions) > TRANSPOSITION_LIMIT:
+        _transpositions.clear()
+
+    search = PlanSearch(_worker_engine, start + budget_ms / 1000, samples, inner_width, _transpositions)
+    result = {'plan': [WAIT], 'value': None, 'depth': 0, 'alternatives': []}
+    for depth in range(1, max_depth + 1):
+        try:
+            scored = search.root(game_state, depth)
+        except SearchTimeout:
+            break
+        if not scored:
+            break
+        search.ordering = [plan[0] for _, plan in scored]
+        result = {
+            'plan': scored[0][1],
+            'value': scored[0][0],
+            'depth': depth,
+            'alternatives': [(plan[0], value) for value, plan in scored[1:3]]
+        }
+    result.update(nodes=search.nodes, cache_hits=search.cache_hits,
+                  elapsed_ms=(time.perf_counter() - start) * 1000)
+    return result
+
+class PlanAdvisor:
+    """Поиск планов в отдельном процессе с запоминанием по версии состояния"""
+
+    def __init__(self, budget_ms: float = 200, max_depth: int = 4, samples: int = 3,
+                 inner_width: int = 4, workers: int = 1):
+        self.budget_ms = budget_ms
+        self.max_depth = max_depth
+        self.samples = samples
+        self.inner_width = inner_width
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._memo: Dict[int, Tuple[int, Dict[str, Any]]] = {}  # Игрок -> (версия состояния, план)
+        self.stats = {'searches': 0, 'memo_hits': 0}
+
+    async def plan(self, game_state: GameState) -> Optional[Dict[str, Any]]:
+        """План для текущего состояния игры (None - поиск не удался)"""
+        memo = self._memo.get(game_state.user_id)
+        if memo is not None and memo[0] == game_state.version:
+            self.stats['memo_hits'] += 1
+            return memo[1]
+
+        version = game_state.version
+        snapshot = clone_game_state(game_state)  # Передается в процесс поиска, пока игра может меняться
+        try:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            plan = await asyncio.get_running_loop().run_in_executor(
+                self._executor, search_plan, snapshot, self.budget_ms, self.max_depth, self.samples, self.inner_width)
+        except Exception as e:
+            logger.error(f"Ошибка поиска плана для пользователя {game_state.user_id}: {e}")
+            return None
+
+        self.stats['searches'] += 1
+        self._memo.pop(game_state.user_id, None)
+        self._memo[game_state.user_id] = (version, plan)
+        if len(self._memo) > MEMO_LIMIT:
+            self._memo.pop(next(iter(self._memo)))
+        return plan
+
+    def shutdown(self):
+        """Остановка процесса поиска"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
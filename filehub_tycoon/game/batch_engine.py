@@ -0,0 +1,375 @@
+# Пакетная обработка ходов для многих игр сразу
+#
+# Числовые поля игр упаковываются в столбцы NumPy, случайные величины хода
+# для всех игр считаются одним блоком из потоков игр (game/rng.py), метрики
+# считаются векторно и записываются обратно в состояния. Формулы повторяют
+# GameEngine.process_turn (включая порядок операций с плавающей точкой), а
+# случайные величины берутся из тех же слотов, поэтому результаты совпадают
+# со скалярным путем.
+
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from game import rng
+from game.models import GameState, GameEvent
+from game.event_catalog import DOMAIN_BLOCK_REASONS
+from game.event_sampler import EventSampler
+from game.ledger import close_turn
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Игры с величинами больше этого предела считаются скалярным путем:
+# до него int64 не переполняется, а float64 представляет целые точно
+SAFE_VALUE_LIMIT = 2 ** 50
+
+LEVEL_MULTIPLIERS = {
+    'small': 1.0,
+    'medium': 2.0,
+    'large': 5.0
+}
+
+# Коды типов кампаний в упакованных столбцах
+CAMPAIGN_SOCIAL_MEDIA = 1
+CAMPAIGN_PAID_ADS = 2
+CAMPAIGN_CONTENT_MARKETING = 3
+CAMPAIGN_CODES = {
+    'social_media': CAMPAIGN_SOCIAL_MEDIA,
+    'paid_ads': CAMPAIGN_PAID_ADS,
+    'content_marketing': CAMPAIGN_CONTENT_MARKETING
+}
+
+# Секции состояния, которые меняет расчет метрик за ход
+TURN_SECTIONS = ('core', 'community', 'marketing', 'legal', 'revenue', 'expenses', 'financial')
+
+class TurnColumns:
+    """Числовые поля пачки игр в виде столбцов"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.current_turn = np.zeros(size, dtype=np.int64)
+        self.active_users = np.zeros(size, dtype=np.int64)
+        self.mau = np.zeros(size, dtype=np.int64)
+        self.budget = np.zeros(size, dtype=np.int64)
+        self.retention = np.zeros(size, dtype=np.float64)
+        self.nps = np.zeros(size, dtype=np.float64)
+        self.legal_risk = np.zeros(size, dtype=np.float64)
+        self.brand_awareness = np.zeros(size, dtype=np.float64)
+        self.donations_monthly = np.zeros(size, dtype=np.int64)
+        self.expenses = np.zeros(size, dtype=np.int64)
+        self.staff_count = np.zeros(size, dtype=np.int64)
+        self.infra_multiplier = np.ones(size, dtype=np.float64)
+
+        # Результаты хода
+        self.ad_revenue = np.zeros(size, dtype=np.int64)
+        self.donation_revenue = np.zeros(size, dtype=np.int64)
+        self.total_revenue = np.zeros(size, dtype=np.int64)
+        self.cash_flow = np.zeros(size, dtype=np.int64)
+
+        # Кампании одной плоской таблицей: номер игры, тип, множитель уровня, начало, длительность
+        self.campaign_game = np.zeros(0, dtype=np.int64)
+        self.campaign_type = np.zeros(0, dtype=np.int64)
+        self.campaign_level = np.zeros(0, dtype=np.float64)
+        self.campaign_start = np.zeros(0, dtype=np.int64)
+        self.campaign_duration = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def pack(cls, game_states: List[GameState]) -> "TurnColumns":
+        """Упаковка числовых полей игр в столбцы"""
+        columns = cls(len(game_states))
+        current_turn, active_users, mau, budget = [], [], [], []
+        retention, nps, legal_risk, brand_awareness = [], [], [], []
+        donations, expenses, staff_count, infra_multiplier = [], [], [], []
+        campaign_rows = []
+
+        for index, game_state in enumerate(game_states):
+            current_turn.append(game_state.current_turn)
+            active_users.append(game_state.active_users)
+            mau.append(game_state.mau)
+            budget.append(game_state.budget)
+            retention.append(game_state.community.retention_rate_30d)
+            nps.append(game_state.marketing.nps_score)
+            legal_risk.append(game_state.legal.risk_level)
+            brand_awareness.append(game_state.marketing.brand_awareness)
+            donations.append(game_state.community.donations_monthly)
+
+            derived = game_state.derived()
+            expenses.append(derived.expenses)
+            staff_count.append(derived.staff_count)
+            infra_multiplier.append(derived.infra_multiplier)
+
+            for campaign in game_state.marketing.campaigns.values():
+                campaign_code = CAMPAIGN_CODES.get(campaign.get('type', ''))
+                if campaign_code is not None:
+                    campaign_rows.append((index, campaign_code,
+                                          LEVEL_MULTIPLIERS.get(campaign.get('level', 'small'), 1.0),
+                                          campaign.get('start_turn', 0), campaign.get('duration', 0)))
+
+        columns.current_turn[:] = current_turn
+        columns.active_users[:] = active_users
+        columns.mau[:] = mau
+        columns.budget[:] = budget
+        columns.retention[:] = retention
+        columns.nps[:] = nps
+        columns.legal_risk[:] = legal_risk
+        columns.brand_awareness[:] = brand_awareness
+        columns.donations_monthly[:] = donations
+        columns.expenses[:] = expenses
+        columns.staff_count[:] = staff_count
+        columns.infra_multiplier[:] = infra_multiplier
+
+        if campaign_rows:
+            game, code, level, start, duration = zip(*campaign_rows)
+            columns.campaign_game = np.array(game, dtype=np.int64)
+            columns.campaign_type = np.array(code, dtype=np.int64)
+            columns.campaign_level = np.array(level, dtype=np.float64)
+            columns.campaign_start = np.array(start, dtype=np.int64)
+            columns.campaign_duration = np.array(duration, dtype=np.int64)
+
+        return columns
+
+    def scatter(self, game_states: List[GameState]):
+        """Запись результатов хода обратно в состояния игр"""
+        rows = zip(game_states, self.active_users.tolist(), self.mau.tolist(), self.budget.tolist(),
+                   self.retention.tolist(), self.nps.tolist(), self.legal_risk.tolist(),
+                   self.brand_awareness.tolist(), self.ad_revenue.tolist(), self.donation_revenue.tolist(),
+                   self.total_revenue.tolist(), self.expenses.tolist(), self.cash_flow.tolist())
+
+        # Значения пишутся прямо в __dict__ моделей: присваивание через pydantic
+        # (без валидации) в несколько раз медленнее и для пачки игр заметно
+        for (game_state, active_users, mau, budget, retention, nps, legal_risk, brand_awareness,
+             ad_revenue, donation_revenue, total_revenue, expenses, cash_flow) in rows:
+            game_state.__dict__.update(active_users=active_users, mau=mau, budget=budget)
+            game_state.community.__dict__['retention_rate_30d'] = retention
+            game_state.marketing.__dict__.update(nps_score=nps, brand_awareness=brand_awareness)
+            game_state.legal.__dict__['risk_level'] = legal_risk
+            game_state.revenue.__dict__.update(ad_revenue=ad_revenue, donation_revenue=donation_revenue,
+                                               total_revenue=total_revenue)
+            game_state.expenses.__dict__['total_expenses'] = expenses
+            game_state.financial.__dict__['cash_flow'] = cash_flow
+            game_state.touch(*TURN_SECTIONS)
+
+def metric_noise(block: np.ndarray) -> Dict[str, np.ndarray]:
+    """Случайные величины базовых изменений метрик из блока хода"""
+    return {
+        'growth': rng.block_uniform(block, rng.SLOT_GROWTH, 0.02, 0.05),
+        'retention': rng.block_uniform(block, rng.SLOT_RETENTION, -0.02, 0.03),
+        'nps': rng.block_uniform(block, rng.SLOT_NPS, -2, 4),
+        'legal_risk': rng.block_uniform(block, rng.SLOT_LEGAL_RISK, -1, 3)
+    }
+
+def step_metrics(columns: TurnColumns, noise: Dict[str, np.ndarray], config: Config) -> Dict[str, np.ndarray]:
+    """Векторный расчет метрик за ход (без событий)
+
+    Возвращает изменения, которые скалярный путь кладет в metrics_changed.
+    """
+    # Базовые изменения (_calculate_base_metrics_change)
+    staff_bonus = columns.staff_count * 0.05
+    user_growth = noise['growth'] * (1 + staff_bonus) * columns.infra_multiplier
+    users_delta = (columns.active_users * user_growth).astype(np.int64)
+    mau_delta = (columns.mau * (1 + user_growth * 0.8)).astype(np.int64)
+    retention = np.clip(columns.retention + noise['retention'] * 100, 0, 100)
+    nps = np.clip(columns.nps + noise['nps'], -100, 100)
+    legal_risk = np.clip(columns.legal_risk + noise['legal_risk'], 0, 100)
+
+    # Оба изменения прибавляются к активным пользователям, как в _apply_metrics_changes
+    columns.active_users = columns.active_users + users_delta + mau_delta
+    columns.retention = retention
+    columns.nps = nps
+    columns.legal_risk = legal_risk
+
+    # Маркетинговые кампании (_process_marketing_campaigns)
+    size = columns.size
+    active = ((columns.campaign_start <= columns.current_turn[columns.campaign_game]) &
+              (columns.current_turn[columns.campaign_game] <= columns.campaign_start + columns.campaign_duration))
+    games = columns.campaign_game
+    level = columns.campaign_level
+    social = active & (columns.campaign_type == CAMPAIGN_SOCIAL_MEDIA)
+    paid = active & (columns.campaign_type == CAMPAIGN_PAID_ADS)
+    content = active & (columns.campaign_type == CAMPAIGN_CONTENT_MARKETING)
+
+    campaign_users = (np.bincount(games[social], (500 * level[social]).astype(np.int64), size) +
+                      np.bincount(games[paid], (800 * level[paid]).astype(np.int64), size)).astype(np.int64)
+    campaign_awareness = np.bincount(games[paid], (5 * level[paid]).astype(np.int64), size).astype(np.int64)
+    campaign_nps = np.bincount(games[content], (2 * level[content]).astype(np.int64), size).astype(np.int64)
+    has_content = np.bincount(games[content], minlength=size) > 0
+
+    columns.active_users = columns.active_users + campaign_users
+    columns.brand_awareness = columns.brand_awareness + campaign_awareness
+    # Скалярный путь присваивает изменение NPS от кампаний, а не прибавляет его
+    columns.nps = np.where(has_content, campaign_nps, columns.nps)
+
+    # Финансы (_calculate_financial_changes)
+    ad_metrics = config.AD_METRICS
+    ad_revenue_per_user = ad_metrics['base_cpm'] * 0.001 * (
+        1 + (columns.nps * ad_metrics['nps_bonus']) +
+        (columns.retention * ad_metrics['retention_bonus'] / 100)
+    )
+    columns.ad_revenue = (columns.active_users * ad_revenue_per_user).astype(np.int64)
+    columns.donation_revenue = (columns.donations_monthly * 0.8).astype(np.int64)
+    columns.total_revenue = columns.ad_revenue + columns.donation_revenue
+    columns.cash_flow = columns.total_revenue - columns.expenses
+    columns.budget = columns.budget + columns.cash_flow
+    columns.mau = (columns.active_users * 1.2).astype(np.int64)
+
+    return {
+        'active_users': users_delta,
+        'mau': mau_delta,
+        'retention_rate_30d': retention,
+        'nps_score': nps,
+        'legal_risk': legal_risk,
+        'campaign_users': campaign_users,
+        'campaign_awareness': campaign_awareness,
+        'campaign_nps': campaign_nps,
+        'has_campaign_users': np.bincount(games[social | paid], minlength=size) > 0,
+        'has_campaign_awareness': np.bincount(games[paid], minlength=size) > 0,
+        'has_content': has_content
+    }
+
+def turn_status(columns: TurnColumns) -> np.ndarray:
+    """Статус хода для пачки игр: 0 - продолжение, 1 - победа, 2 - поражение"""
+    win = ((columns.active_users >= 1000000) & (columns.nps >= 70) &
+           (columns.legal_risk <= 40) & (columns.cash_flow > 0))
+    lose = (columns.budget <= 0) | (columns.legal_risk >= 100) | (columns.active_users < 100)
+    return np.where(win, 1, np.where(lose, 2, 0))
+
+class BatchTurnEngine:
+    """Обработка хода для пачки игр"""
+
+    STATUSES = ('success', 'win', 'lose')
+
+    def __init__(self, config: Optional[Config] = None, event_sampler: Optional[EventSampler] = None):
+        self.config = config or Config()
+        self.event_sampler = event_sampler or EventSampler(self.config.EVENTS, self.config.EVENT_MODIFIERS)
+
+    def _generate_events(self, game_states: List[GameState], block: np.ndarray) -> List[List[GameEvent]]:
+        """Случайные события и блокировки доменов (как GameEngine._generate_events)"""
+        size = len(game_states)
+        events: List[List[GameEvent]] = [[] for _ in range(size)]
+
+        # Случайное событие: вероятность и тип - по весам с поправками к состоянию
+        sampler = self.event_sampler
+        buckets = sampler.buckets(game_states)
+        rolled = np.flatnonzero(block[:, rng.SLOT_EVENT_ROLL] < sampler.chance_batch(buckets))
+        event_type_index = sampler.sample_batch(buckets[rolled], block[rolled, rng.SLOT_EVENT_TYPE])
+        for index, type_index in zip(rolled.tolist(), event_type_index.tolist()):
+            event_type = sampler.event_types[type_index]
+            events[index].append(GameEvent(
+                event_type=event_type,
+                impact=self.config.get_event_impact(event_type),
+                duration_hours=self.config.EVENTS.get(event_type, {}).get('duration', 0),
+                probability=self.config.get_event_probability(event_type),
+                timestamp=datetime.now(),
+                resolved=False
+            ))
+
+        # Блокировка домена для игр, у которых подошел срок проверки
+        checks = np.array([game_state.setup_complete and game_state.current_turn >= game_state.next_domain_check_turn
+                           for game_state in game_states], dtype=bool)
+        if checks.any():
+            legal_risk = np.array([game_state.legal.risk_level for game_state in game_states], dtype=np.float64)
+            blocked = checks & (block[:, rng.SLOT_BLOCK_ROLL] < 0.15 * (1 + legal_risk / 100.0))
+            next_check = rng.block_randint(block, rng.SLOT_BLOCK_NEXT_CHECK, 3, 7)
+            reasons = rng.block_randint(block, rng.SLOT_BLOCK_REASON, 0, len(DOMAIN_BLOCK_REASONS) - 1)
+
+            for index in np.flatnonzero(checks).tolist():
+                game_state = game_states[index]
+                game_state.next_domain_check_turn = game_state.current_turn + int(next_check[index])
+                if not blocked[index]:
+                    game_state.touch('core')
+                    continue
+
+                game_state.current_domain_blocked = True
+                game_state.last_domain_block_turn = game_state.current_turn
+                block_record = {
+                    'domain': game_state.domain_name,
+                    'blocked_turn': game_state.current_turn,
+                    'reason': DOMAIN_BLOCK_REASONS[reasons[index]]
+                }
+                game_state.record_domain_block(block_record)
+                events[index].append(GameEvent(
+                    event_type='domain_blocked',
+                    impact=20,
+                    duration_hours=0,
+                    probability=1.0,
+                    timestamp=datetime.now(),
+                    resolved=False,
+                    params={'domain': block_record['domain'], 'reason': block_record['reason']}
+                ))
+
+        for game_state, game_events in zip(game_states, events):
+            for event in game_events:
+                game_state.record_event(event)
+        return events
+
+    @staticmethod
+    def is_safe(game_state: GameState) -> bool:
+        """Помещаются ли величины игры в столбцы без переполнения"""
+        return (abs(game_state.active_users) < SAFE_VALUE_LIMIT and abs(game_state.mau) < SAFE_VALUE_LIMIT and
+                abs(game_state.budget) < SAFE_VALUE_LIMIT)
+
+    def process(self, game_states: List[GameState], collect_results: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """Обработка одного хода для всех переданных игр"""
+        # События не меняют номер хода, поэтому блок можно посчитать до них
+        block = rng.turn_block([game_state.rng_seed for game_state in game_states],
+                               [game_state.current_turn for game_state in game_states])
+        events = self._generate_events(game_states, block)
+
+        columns = TurnColumns.pack(game_states)
+        changes = step_metrics(columns, metric_noise(block), self.config)
+        status = turn_status(columns)
+        columns.scatter(game_states)
+        for game_state, ad_revenue, donation_revenue in zip(game_states, columns.ad_revenue.tolist(),
+                                                            columns.donation_revenue.tolist()):
+            close_turn(game_state, ad_revenue, donation_revenue)
+
+        if not collect_results:
+            return None
+        return self._results(columns, changes, status, events)
+
+    def _results(self, columns: TurnColumns, changes: Dict[str, np.ndarray], status: np.ndarray,
+                 events: List[List[GameEvent]]) -> List[Dict[str, Any]]:
+        """Результаты хода в формате GameEngine.process_turn"""
+        rows = zip(changes['active_users'].tolist(), changes['mau'].tolist(),
+                   changes['retention_rate_30d'].tolist(), changes['nps_score'].tolist(),
+                   changes['legal_risk'].tolist(), changes['campaign_users'].tolist(),
+                   changes['campaign_awareness'].tolist(), changes['campaign_nps'].tolist(),
+                   changes['has_campaign_users'].tolist(), changes['has_campaign_awareness'].tolist(),
+                   changes['has_content'].tolist(), columns.ad_revenue.tolist(),
+                   columns.donation_revenue.tolist(), columns.total_revenue.tolist(),
+                   columns.expenses.tolist(), columns.cash_flow.tolist(), status.tolist(), events)
+
+        results = []
+        for (users, mau, retention, nps, legal_risk, campaign_users, campaign_awareness, campaign_nps,
+             has_users, has_awareness, has_content, ad_revenue, donation_revenue, total_revenue,
+             expenses, cash_flow, game_status, game_events) in rows:
+            metrics_changed = {
+                'active_users': users,
+                'mau': mau,
+                'retention_rate_30d': retention,
+                'nps_score': nps,
+                'legal_risk': legal_risk
+            }
+            if has_users:
+                metrics_changed['active_users'] = campaign_users
+            if has_awareness:
+                metrics_changed['brand_awareness'] = campaign_awareness
+            if has_content:
+                metrics_changed['nps_score'] = campaign_nps
+            metrics_changed.update({
+                'ad_revenue': ad_revenue,
+                'donation_revenue': donation_revenue,
+                'total_revenue': total_revenue,
+                'total_expenses': expenses,
+                'cash_flow': cash_flow
+            })
+            results.append({
+                'events': [],
+                'metrics_changed': metrics_changed,
+                'new_events': game_events,
+                'status': self.STATUSES[game_status]
+            })
+        return results
@@ -0,0 +1,92 @@
+# Производные метрики игры
+#
+# Значения, которые ход и экраны бота читают постоянно, а меняются они
+# только отдельными действиями: число нанятых сотрудников, множитель
+# инфраструктуры и сумма статей расходов. Действия обновляют их на месте,
+# прочие изменения этих секций сбрасывают кэш, и он пересчитывается при
+# следующем чтении. В режиме проверки каждое чтение сверяется с полным
+# пересчетом - для тестов и отладки.
+
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Множители уровней инфраструктуры (ключи - значения InfrastructureLevel)
+INFRASTRUCTURE_MULTIPLIERS = {
+    'basic': 1.0,
+    'advanced': 1.15,
+    'enterprise': 1.35
+}
+
+# Статьи расходов, сумма которых дает расходы за ход
+EXPENSE_FIELDS = ('staff_cost', 'marketing_cost', 'legal_cost', 'infrastructure_cost', 'hosting_cost')
+
+_check_consistency = False
+
+def set_consistency_check(enabled: bool):
+    """Включение сверки кэша с полным пересчетом при каждом чтении"""
+    global _check_consistency
+    _check_consistency = enabled
+
+def consistency_check_enabled() -> bool:
+    return _check_consistency
+
+class DerivedMetricsMismatch(RuntimeError):
+    """Кэш производных метрик разошелся с состоянием игры"""
+
+def infrastructure_multiplier(infrastructure) -> float:
+    """Средний множитель четырех компонентов инфраструктуры"""
+    return (INFRASTRUCTURE_MULTIPLIERS.get(infrastructure.server_level, 1.0) +
+            INFRASTRUCTURE_MULTIPLIERS.get(infrastructure.bandwidth_level, 1.0) +
+            INFRASTRUCTURE_MULTIPLIERS.get(infrastructure.storage_level, 1.0) +
+            INFRASTRUCTURE_MULTIPLIERS.get(infrastructure.security_level, 1.0)) / 4
+
+class DerivedMetrics:
+    """Кэш производных метрик одной игры"""
+
+    __slots__ = ('staff_count', 'infra_multiplier', 'expenses')
+
+    def __init__(self, staff_count: int, infra_multiplier: float, expenses: int):
+        self.staff_count = staff_count            # Нанятых сотрудников
+        self.infra_multiplier = infra_multiplier  # Множитель роста от инфраструктуры
+        self.expenses = expenses                  # Сумма статей расходов за ход
+
+    @classmethod
+    def compute(cls, game_state) -> 'DerivedMetrics':
+        """Полный пересчет по состоянию игры"""
+        expenses = game_state.expenses
+        return cls(
+            staff_count=sum(1 for staff in game_state.staff.values() if staff.hired),
+            infra_multiplier=infrastructure_multiplier(game_state.infrastructure),
+            expenses=sum(getattr(expenses, name) for name in EXPENSE_FIELDS)
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def mismatches(self, game_state) -> List[str]:
+        """Метрики, значения которых не совпадают с полным пересчетом"""
+        expected = self.compute(game_state)
+        return [name for name in self.__slots__ if getattr(self, name) != getattr(expected, name)]
+
+    def verify(self, game_state):
+        """Сверка с полным пересчетом (DerivedMetricsMismatch при расхождении)"""
+        names = self.mismatches(game_state)
+        if names:
+            expected = self.compute(game_state)
+            details = ", ".join(f"{name}: {getattr(self, name)} != {getattr(expected, name)}" for name in names)
+            logger.error(f"Расхождение производных метрик игры {game_state.user_id}: {details}")
+            raise DerivedMetricsMismatch(details)
+
+    # Обновления на месте - вызываются действиями, меняющими исходные поля
+
+    def staff_hired(self, salary: int, replaced_hired: bool = False):
+        """Найм сотрудника (replaced_hired - на месте уже был нанятый)"""
+        if not replaced_hired:
+            self.staff_count += 1
+        self.expenses += salary
+
+    def infrastructure_changed(self, infrastructure):
+        """Смена уровня компонента инфраструктуры"""
+        self.infra_multiplier = infrastructure_multiplier(infrastructure)
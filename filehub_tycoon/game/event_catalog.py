@@ -0,0 +1,109 @@
+# Каталог игровых событий
+#
+# Тексты событий неизменяемы и общие для всех игроков. В состоянии игры
+# событие хранит только тип, параметры и номер выбора, а текст берется
+# из каталога при отображении.
+
+from types import MappingProxyType
+from typing import Any, Dict, NamedTuple, Tuple
+
+class EventTemplate(NamedTuple):
+    """Шаблон события: описание (может содержать {параметры}) и варианты выбора"""
+    description: str
+    choices: Tuple[str, ...]
+
+EVENT_CATALOG = MappingProxyType({
+    'ddos_attack': EventTemplate(
+        description='🔥 DDoS атака! Вашу платформу атакуют хакеры.',
+        choices=(
+            'Усилить защиту (+20 к безопасности, -$50,000)',
+            'Переключиться на резервный сервер (+10 к доступности, -$30,000)',
+            'Игнорировать атаку (-30 к популярности)'
+        )
+    ),
+    'server_outage': EventTemplate(
+        description='⚠️ Отключение серверов! Трекер недоступен.',
+        choices=(
+            'Быстрый ремонт (+15 к доступности, -$25,000)',
+            'Покупка новых серверов (+30 к надежности, -$100,000)',
+            'Миграция в другой дата-центр (+25 к надежности, -$75,000)'
+        )
+    ),
+    'viral_growth': EventTemplate(
+        description='📈 Вирусный рост! Ваша платформа стала популярной!',
+        choices=(
+            'Увеличить серверы (+50 к активным пользователям, -$40,000)',
+            'Запустить рекламную кампанию (+80 к активным пользователям, -$60,000)',
+            'Сохранить текущую инфраструктуру (+20 к активным пользователям)'
+        )
+    ),
+    'competitor_launch': EventTemplate(
+        description='⚔️ Конкурент запустился! Новая платформа появилась на рынке.',
+        choices=(
+            'Улучшить функциональность (+15 к репутации, -$50,000)',
+            'Снизить цены на премиум (+10 к конверсии, -$20,000)',
+            'Не реагировать (0 изменений)'
+        )
+    ),
+    'regulatory_check': EventTemplate(
+        description='🏛️ Проверка регуляторов! Нужно срочно реагировать.',
+        choices=(
+            'Показать полную прозрачность (-15 к юридическому риску)',
+            'Нанять юристов (-10 к юридическому риску, -$40,000)',
+            'Скрыть информацию (+20 к юридическому риску)'
+        )
+    ),
+    'influencer_mention': EventTemplate(
+        description='🌟 Популярный инфлюенсер упомянул вашу платформу!',
+        choices=(
+            'Запустить промо-акцию (+40 к узнаваемости бренда, -$30,000)',
+            'Сотрудничать с инфлюенсером (+60 к активным пользователям, -$80,000)',
+            'Не использовать возможность (+10 к узнаваемости бренда)'
+        )
+    ),
+    'security_breach': EventTemplate(
+        description='🔓 Утечка данных! Безопасность под угрозой.',
+        choices=(
+            'Уведомить пользователей и усилить безопасность (+20 к доверию, -$60,000)',
+            'Скрыть факт утечки (+10 к риску, -$30,000)',
+            'Нанять экспертов по безопасности (+35 к безопасности, -$120,000)'
+        )
+    ),
+    'partnership_offer': EventTemplate(
+        description='🤝 Предложение партнерства от крупной компании.',
+        choices=(
+            'Принять предложение (+25 к доходам, +15 к доверию, -$10,000)',
+            'Отклонить вежливо (+5 к репутации)',
+            'Торговаться за лучшие условия (+35 к доходам, +20 к доверию, -$20,000)'
+        )
+    ),
+    'domain_blocked': EventTemplate(
+        description="🚫 **Домен заблокирован!** Ваш домен {domain} заблокирован по причине: {reason}",
+        choices=(
+            'Ввести новый домен вручную',
+            'Использовать генератор доменов',
+            'Перейти на зеркало из доступных'
+        )
+    )
+})
+
+# Случайные события (без событий, которые порождает сама игра)
+RANDOM_EVENT_TYPES = tuple(event_type for event_type in EVENT_CATALOG if event_type != 'domain_blocked')
+
+# Вероятность случайного события за ход
+RANDOM_EVENT_CHANCE = 0.3
+
+# Причины блокировки домена (параметр reason события domain_blocked)
+DOMAIN_BLOCK_REASONS = ('Роскомнадзор', 'Судебное решение', 'Жалоба правообладателей', 'Хостинг-провайдер')
+
+def render_description(event_type: str, params: Dict[str, Any]) -> str:
+    """Текст описания события с подставленными параметрами"""
+    template = EVENT_CATALOG.get(event_type)
+    if template is None:
+        return event_type
+    return template.description.format(**params) if params else template.description
+
+def get_choices(event_type: str) -> Tuple[str, ...]:
+    """Варианты выбора события"""
+    template = EVENT_CATALOG.get(event_type)
+    return template.choices if template is not None else ()
@@ -0,0 +1,140 @@
+# Выбор типа случайного события
+#
+# Вес события - его probability из Config.EVENTS, умноженная на поправки к
+# состоянию игры из Config.EVENT_MODIFIERS (юридический риск, уровень
+# безопасности, доступность). Каждый признак делится на корзины, и для
+# каждого сочетания корзин один раз строится таблица псевдонимов (метод
+# Воуза). Выбор по таблице - O(1) на одно равномерное число: целая часть
+# u * n дает столбец, дробная решает между ним и его псевдонимом. Пакетный
+# выбор делает то же самое для массивов NumPy.
+#
+# Поправки меняют и частоту событий: вероятность случайного события за ход
+# в сочетании корзин - RANDOM_EVENT_CHANCE, умноженная на отношение суммы
+# весов с поправками к сумме весов без них. При множителях 1 частота равна
+# RANDOM_EVENT_CHANCE, а, например, высокий юридический риск учащает проверки,
+# не делая остальные события реже.
+
+from bisect import bisect_right
+from itertools import product
+from typing import Any, Dict, List, Sequence, Tuple
+
+from game.event_catalog import RANDOM_EVENT_CHANCE, RANDOM_EVENT_TYPES
+
+# Признаки состояния, к которым привязываются поправки весов
+FEATURES = {
+    'legal_risk': lambda game_state: game_state.legal.risk_level,
+    'security_level': lambda game_state: game_state.infrastructure.security_level,
+    'uptime': lambda game_state: game_state.infrastructure.uptime
+}
+
+def build_alias_table(weights: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Таблица псевдонимов для весов: вероятности столбцов и псевдонимы"""
+    n = len(weights)
+    total = float(sum(weights))
+    if total <= 0:
+        raise ValueError("Сумма весов событий должна быть положительной")
+    scaled = [weight * n / total for weight in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = (scaled[more] + scaled[less]) - 1.0
+        (small if scaled[more] < 1.0 else large).append(more)
+    # Оставшиеся столбцы (включая остатки ошибок округления) берутся целиком
+    return prob, alias
+
+class EventSampler:
+    """Таблицы выбора типа события для всех сочетаний корзин состояния"""
+
+    def __init__(self, events: Dict[str, Dict[str, Any]], modifiers: Dict[str, Dict[str, Any]],
+                 event_types: Sequence[str] = RANDOM_EVENT_TYPES, base_chance: float = RANDOM_EVENT_CHANCE):
+        self.event_types = tuple(event_types)
+        self.features = []  # (имя, получение значения, функция номера корзины, число корзин)
+        for name, spec in modifiers.items():
+            if name not in FEATURES:
+                raise ValueError(f"Неизвестный признак поправки событий: {name}")
+            if 'levels' in spec:
+                levels = {level: index for index, level in enumerate(spec['levels'])}
+                bucket_of, count = (lambda value, levels=levels: levels.get(value, 0)), len(levels)
+            else:
+                bounds = list(spec['bounds'])
+                bucket_of, count = (lambda value, bounds=bounds: bisect_right(bounds, value)), len(bounds) + 1
+            self.features.append((name, FEATURES[name], bucket_of, count))
+
+        base = [events.get(event_type, {}).get('probability', 0.0) for event_type in self.event_types]
+        base_total = sum(base)
+        self.weights: List[List[float]] = []
+        self.chances: List[float] = []  # Вероятность случайного события за ход по сочетаниям корзин
+        self.prob: List[List[float]] = []
+        self.alias: List[List[int]] = []
+        for buckets in product(*(range(count) for _, _, _, count in self.features)):
+            weights = list(base)
+            for (name, _, _, _), bucket in zip(self.features, buckets):
+                for event_type, multipliers in modifiers[name].get('weights', {}).items():
+                    if event_type in self.event_types:
+                        weights[self.event_types.index(event_type)] *= multipliers[bucket]
+            prob, alias = build_alias_table(weights)
+            self.weights.append(weights)
+            self.chances.append(min(1.0, base_chance * sum(weights) / base_total))
+            self.prob.append(prob)
+            self.alias.append(alias)
+        self._arrays = None  # Таблицы в виде массивов для пакетного выбора
+
+    def bucket(self, game_state) -> int:
+        """Номер сочетания корзин для состояния игры"""
+        index = 0
+        for _, get_value, bucket_of, count in self.features:
+            index = index * count + bucket_of(get_value(game_state))
+        return index
+
+    def chance(self, game_state) -> float:
+        """Вероятность случайного события за ход для состояния игры"""
+        return self.chances[self.bucket(game_state)]
+
+    def sample_index(self, bucket: int, u: float) -> int:
+        """Номер типа события по равномерному числу u из [0, 1)"""
+        x = u * len(self.event_types)
+        column = int(x)
+        return column if x - column < self.prob[bucket][column] else self.alias[bucket][column]
+
+    def sample(self, game_state, u: float) -> str:
+        """Тип события для состояния игры по равномерному числу u"""
+        return self.event_types[self.sample_index(self.bucket(game_state), u)]
+
+    def probabilities(self, bucket: int) -> Dict[str, float]:
+        """Вероятности типов событий в сочетании корзин (для проверок и отладки)"""
+        weights = self.weights[bucket]
+        total = sum(weights)
+        return {event_type: weight / total for event_type, weight in zip(self.event_types, weights)}
+
+    # Пакетный выбор
+
+    def buckets(self, game_states: Sequence[Any]):
+        """Номера сочетаний корзин для пачки игр (массив NumPy)"""
+        import numpy as np
+        return np.fromiter((self.bucket(game_state) for game_state in game_states), dtype=np.int64,
+                           count=len(game_states))
+
+    def _tables(self):
+        """Таблицы в виде массивов NumPy: вероятности столбцов, псевдонимы, частоты событий"""
+        import numpy as np
+        if self._arrays is None:
+            self._arrays = (np.array(self.prob, dtype=np.float64), np.array(self.alias, dtype=np.int64),
+                            np.array(self.chances, dtype=np.float64))
+        return self._arrays
+
+    def chance_batch(self, buckets):
+        """Вероятности случайного события за ход для массива сочетаний корзин"""
+        return self._tables()[2][buckets]
+
+    def sample_batch(self, buckets, u):
+        """Номера типов событий для массивов сочетаний корзин и равномерных чисел"""
+        import numpy as np
+        prob, alias, _ = self._tables()
+        x = np.asarray(u, dtype=np.float64) * len(self.event_types)
+        column = x.astype(np.int64)
+        return np.where(x - column < prob[buckets, column], column, alias[buckets, column])
@@ -1,153 +1,181 @@
 # Игровой движок для симулятора файлового хаба
 
-import random
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime, timedelta
 import math
 
 from game.models import GameState, GameEvent, Staff, UserRole, InfrastructureLevel, HostingRegion
+from game.event_catalog import DOMAIN_BLOCK_REASONS
+from game.event_sampler import EventSampler
+from game.ledger import LedgerCategory, close_turn, post_entry
+from game import rng
+from game.pipeline import TurnContext, TurnPipeline
 from utils.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Версия игровых правил: увеличивается при любом изменении расчета хода,
+# чтобы сохраненные результаты симуляций не использовались повторно
+ENGINE_VERSION = 6
+
+# Секции состояния, которые меняет каждая метрика/эффект (для частичного сохранения)
+METRIC_SECTIONS = {
+    'retention_rate_30d': 'community',
+    'nps_score': 'marketing',
+    'brand_awareness': 'marketing',
+    'conversion_rate': 'marketing',
+    'legal_risk': 'legal',
+    'ad_revenue': 'revenue',
+    'donation_revenue': 'revenue',
+    'total_revenue': 'revenue',
+    'revenue': 'revenue',
+    'total_expenses': 'expenses',
+    'cash_flow': 'financial',
+    'uptime': 'infrastructure',
+    'security_level': 'infrastructure',
+    'server_level': 'infrastructure'
+}
+
 class GameEngine:
     """Основной игровой движок"""
     
     def __init__(self):
         self.config = Config()
-        self._event_descriptions = {
-            'ddos_attack': {
-                'description': '🔥 DDoS атака! Вашу платформу атакуют хакеры.',
-                'choices': [
-                    'Усилить защиту (+20 к безопасности, -$50,000)',
-                    'Переключиться на резервный сервер (+10 к доступности, -$30,000)',
-                    'Игнорировать атаку (-30 к популярности)'
-                ]
-            },
-            'server_outage': {
-                'description': '⚠️ Отключение серверов! Трекер недоступен.',
-                'choices': [
-                    'Быстрый ремонт (+15 к доступности, -$25,000)',
-                    'Покупка новых серверов (+30 к надежности, -$100,000)',
-                    'Миграция в другой дата-центр (+25 к надежности, -$75,000)'
-                ]
-            },
-            'viral_growth': {
-                'description': '📈 Вирусный рост! Ваша платформа стала популярной!',
-                'choices': [
-                    'Увеличить серверы (+50 к активным пользователям, -$40,000)',
-                    'Запустить рекламную кампанию (+80 к активным пользователям, -$60,000)',
-                    'Сохранить текущую инфраструктуру (+20 к активным пользователям)'
-                ]
-            },
-            'competitor_launch': {
-                'description': '⚔️ Конкурент запустился! Новая платформа появилась на рынке.',
-                'choices': [
-                    'Улучшить функциональность (+15 к репутации, -$50,000)',
-                    'Снизить цены на премиум (+10 к конверсии, -$20,000)',
-                    'Не реагировать (0 изменений)'
-                ]
-            },
-            'regulatory_check': {
-                'description': '🏛️ Проверка регуляторов! Нужно срочно реагировать.',
-                'choices': [
-                    'Показать полную прозрачность (-15 к юридическому риску)',
-                    'Нанять юристов (-10 к юридическому риску, -$40,000)',
-                    'Скрыть информацию (+20 к юридическому риску)'
-                ]
-            },
-            'influencer_mention': {
-                'description': '🌟 Популярный инфлюенсер упомянул вашу платформу!',
-                'choices': [
-                    'Запустить промо-акцию (+40 к узнаваемости бренда, -$30,000)',
-                    'Сотрудничать с инфлюенсером (+60 к активным пользователям, -$80,000)',
-                    'Не использовать возможность (+10 к узнаваемости бренда)'
-                ]
-            },
-            'security_breach': {
-                'description': '🔓 Утечка данных! Безопасность под угрозой.',
-                'choices': [
-                    'Уведомить пользователей и усилить безопасность (+20 к доверию, -$60,000)',
-                    'Скрыть факт утечки (+10 к риску, -$30,000)',
-                    'Нанять экспертов по безопасности (+35 к безопасности, -$120,000)'
-                ]
-            },
-            'partnership_offer': {
-                'description': '🤝 Предложение партнерства от крупной компании.',
-                'choices': [
-                    'Принять предложение (+25 к доходам, +15 к доверию, -$10,000)',
-                    'Отклонить вежливо (+5 к репутации)',
-                    'Торговаться за лучшие условия (+35 к доходам, +20 к доверию, -$20,000)'
-                ]
-            }
-        }
+        self._batch_engine = None  # Создается при первой пакетной обработке
+        self._event_sampler = None  # Таблицы выбора событий для конфигурации _event_sampler_config
+        self._event_sampler_config = None
+        
+        # Стадии хода (game/pipeline.py) в порядке выполнения
+        self.pipeline = TurnPipeline()
+        self.pipeline.add_stage('events', self._stage_events)
+        self.pipeline.add_stage('base_metrics', self._stage_base_metrics)
+        self.pipeline.add_stage('campaigns', self._stage_campaigns)
+        self.pipeline.add_stage('finances', self._stage_finances)
+        self.pipeline.add_stage('outcome', self._stage_outcome)
     
-    def process_turn(self, game_state: GameState) -> Dict[str, Any]:
-        """Обработка одного хода игры"""
+    def process_turn(self, game_state: GameState, force_event: bool = False) -> Dict[str, Any]:
+        """Обработка одного хода игры
+        
+        force_event=True - случайное событие хода наступает наверняка (момент
+        события уже выбран при догонянии пропущенных ходов, game/idle.py).
+        """
         try:
-            turn_results = {
-                'events': [],
-                'metrics_changed': {},
-                'new_events': [],
-                'status': 'success'
-            }
-            
-            # Генерируем события для текущего хода
-            events = self._generate_events(game_state)
-            for event in events:
-                game_state.recent_events.append(event)
-                turn_results['new_events'].append(event)
-                game_state.last_event = event
-            
-            # Рассчитываем изменения метрик
-            metrics_changes = self._calculate_base_metrics_change(game_state)
-            turn_results['metrics_changed'] = metrics_changes
-            self._apply_metrics_changes(game_state, metrics_changes)
+            return self.pipeline.run(TurnContext(game_state, force_event)).results
             
-            # Обрабатываем активные маркетинговые кампании
-            campaign_effects = self._process_marketing_campaigns(game_state)
-            turn_results['metrics_changed'].update(campaign_effects)
-            self._apply_metrics_changes(game_state, campaign_effects)
+        except Exception as e:
+            logger.error(f"Ошибка обработки хода: {e}")
+            return {'status': 'error', 'message': str(e)}
+    
+    @property
+    def event_sampler(self) -> EventSampler:
+        """Таблицы выбора событий (перестраиваются, если конфигурацию заменили)"""
+        if self._event_sampler is None or self._event_sampler_config is not self.config:
+            self._event_sampler = EventSampler(self.config.EVENTS, self.config.EVENT_MODIFIERS)
+            self._event_sampler_config = self.config
+        return self._event_sampler
+    
+    # Стадии хода
+    
+    def _stage_events(self, context: TurnContext):
+        """Генерация событий хода"""
+        game_state = context.game_state
+        new_events = context.results['new_events']
+        for event in self._generate_events(game_state, context.force_event):
+            game_state.record_event(event)
+            new_events.append(event)
+    
+    def _apply_stage_changes(self, context: TurnContext, calculate: Callable):
+        """Расчет изменений стадии в общий словарь контекста и их применение"""
+        changes = context.changes
+        changes.clear()
+        calculate(context.game_state, changes)
+        context.results['metrics_changed'].update(changes)
+        self._apply_metrics_changes(context.game_state, changes)
+    
+    def _stage_base_metrics(self, context: TurnContext):
+        """Базовые изменения метрик"""
+        self._apply_stage_changes(context, self._calculate_base_metrics_change)
+    
+    def _stage_campaigns(self, context: TurnContext):
+        """Эффекты активных маркетинговых кампаний"""
+        self._apply_stage_changes(context, self._process_marketing_campaigns)
+    
+    def _stage_finances(self, context: TurnContext):
+        """Доходы и расходы; ход закрывается в финансовом журнале"""
+        self._apply_stage_changes(context, self._calculate_financial_changes)
+        changes = context.changes
+        close_turn(context.game_state, changes['ad_revenue'], changes['donation_revenue'])
+    
+    def _stage_outcome(self, context: TurnContext):
+        """Проверка условий победы/поражения"""
+        game_state = context.game_state
+        if self._check_win_conditions(game_state):
+            context.results['status'] = 'win'
+        elif self._check_lose_conditions(game_state):
+            context.results['status'] = 'lose'
+    
+    def process_turn_batch(self, game_states: List[GameState],
+                           collect_results: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """Обработка одного хода для многих игр сразу
+        
+        Метрики всех игр считаются векторно (game/batch_engine.py). Игры со
+        слишком большими величинами обрабатываются скалярным process_turn.
+        Случайные величины берутся из потоков игр, поэтому результат совпадает
+        со скалярным путем. Пакетный расчет повторяет полный конвейер хода,
+        поэтому при отключенных стадиях все игры идут скалярным путем.
+        """
+        # NumPy нужен только пакетной обработке, бот без нее его не загружает
+        from game.batch_engine import BatchTurnEngine
+        
+        try:
+            if not self.pipeline.all_enabled:
+                results = [self.process_turn(game_state) for game_state in game_states]
+                return results if collect_results else None
             
-            # Рассчитываем доходы и расходы
-            financial_changes = self._calculate_financial_changes(game_state)
-            turn_results['metrics_changed'].update(financial_changes)
-            self._apply_metrics_changes(game_state, financial_changes)
+            if self._batch_engine is None or self._batch_engine.config is not self.config:
+                self._batch_engine = BatchTurnEngine(self.config, self.event_sampler)
             
-            # Проверяем условия победы/поражения
-            win_status = self._check_win_conditions(game_state)
-            lose_status = self._check_lose_conditions(game_state)
+            batch_indexes = [i for i, game_state in enumerate(game_states) if BatchTurnEngine.is_safe(game_state)]
+            if len(batch_indexes) == len(game_states):
+                return self._batch_engine.process(game_states, collect_results)
             
-            if win_status:
-                turn_results['status'] = 'win'
-            elif lose_status:
-                turn_results['status'] = 'lose'
+            results = [None] * len(game_states)
+            batch_results = self._batch_engine.process([game_states[i] for i in batch_indexes], collect_results)
+            if batch_results is not None:
+                for i, result in zip(batch_indexes, batch_results):
+                    results[i] = result
             
-            return turn_results
+            batch_set = set(batch_indexes)
+            for i, game_state in enumerate(game_states):
+                if i not in batch_set:
+                    results[i] = self.process_turn(game_state)
+            return results if collect_results else None
             
         except Exception as e:
-            logger.error(f"Ошибка обработки хода: {e}")
-            return {'status': 'error', 'message': str(e)}
+            logger.error(f"Ошибка пакетной обработки хода для {len(game_states)} игр: {e}")
+            error = {'status': 'error', 'message': str(e)}
+            return [dict(error) for _ in game_states] if collect_results else None
     
-    def _generate_events(self, game_state: GameState) -> List[GameEvent]:
-        """Генерация случайных событий для хода"""
+    def _generate_events(self, game_state: GameState, force_event: bool = False) -> List[GameEvent]:
+        """Генерация случайных событий для хода (force_event - случайное событие наступает наверняка)"""
         events = []
         
-        # Базовая вероятность события в 30%
-        if random.random() < 0.3:
-            event_type = random.choice(list(self._event_descriptions.keys()))
-            event_config = self._event_descriptions[event_type]
+        seed, turn = game_state.rng_seed, game_state.current_turn
+        
+        # Вероятность события и его тип зависят от состояния (game/event_sampler.py)
+        sampler = self.event_sampler
+        bucket = sampler.bucket(game_state)
+        if force_event or rng.turn_random(seed, turn, rng.SLOT_EVENT_ROLL) < sampler.chances[bucket]:
+            event_type = sampler.event_types[sampler.sample_index(bucket, rng.turn_random(seed, turn, rng.SLOT_EVENT_TYPE))]
             
             event = GameEvent(
                 event_type=event_type,
-                description=event_config['description'],
                 impact=self.config.get_event_impact(event_type),
                 duration_hours=self.config.EVENTS.get(event_type, {}).get('duration', 0),
                 probability=self.config.get_event_probability(event_type),
                 timestamp=datetime.now(),
-                resolved=False,
-                choices=event_config['choices']
+                resolved=False
             )
             events.append(event)
         
@@ -173,54 +201,56 @@ class GameEngine:
         legal_risk_multiplier = game_state.legal.risk_level / 100.0
         final_probability = base_block_probability * (1 + legal_risk_multiplier)
         
-        if random.random() < final_probability:
+        seed, turn = game_state.rng_seed, game_state.current_turn
+        next_check = rng.turn_randint(seed, turn, rng.SLOT_BLOCK_NEXT_CHECK, 3, 7)
+        
+        if rng.turn_random(seed, turn, rng.SLOT_BLOCK_ROLL) < final_probability:
             # Блокируем текущий домен
             game_state.current_domain_blocked = True
             game_state.last_domain_block_turn = game_state.current_turn
-            game_state.next_domain_check_turn = game_state.current_turn + random.randint(3, 7)  # Следующая проверка через 3-7 ходов
+            game_state.next_domain_check_turn = game_state.current_turn + next_check  # Следующая проверка через 3-7 ходов
             
             # Добавляем в историю блокировок
             block_record = {
                 'domain': game_state.domain_name,
                 'blocked_turn': game_state.current_turn,
-                'reason': random.choice(['Роскомнадзор', 'Судебное решение', 'Жалоба правообладателей', 'Хостинг-провайдер'])
+                'reason': rng.turn_choice(seed, turn, rng.SLOT_BLOCK_REASON, DOMAIN_BLOCK_REASONS)
             }
-            game_state.domain_block_history.append(block_record)
+            game_state.record_domain_block(block_record)
             
             # Создаем событие блокировки
             domain_block_event = GameEvent(
                 event_type='domain_blocked',
-                description=f"🚫 **Домен заблокирован!** Ваш домен {game_state.domain_name} заблокирован по причине: {block_record['reason']}",
                 impact=20,
                 duration_hours=0,
                 probability=1.0,
                 timestamp=datetime.now(),
                 resolved=False,
-                choices=[
-                    'Ввести новый домен вручную',
-                    'Использовать генератор доменов',
-                    'Перейти на зеркало из доступных'
-                ]
+                params={'domain': block_record['domain'], 'reason': block_record['reason']}
             )
             
             return domain_block_event
         
         # Если блокировки не было, планируем следующую проверку
-        game_state.next_domain_check_turn = game_state.current_turn + random.randint(3, 7)
+        game_state.next_domain_check_turn = game_state.current_turn + next_check
+        game_state.touch('core')
         return None
     
-    def _calculate_base_metrics_change(self, game_state: GameState) -> Dict[str, Any]:
-        """Расчет базовых изменений метрик за ход"""
-        changes = {}
+    def _calculate_base_metrics_change(self, game_state: GameState,
+                                       changes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Расчет базовых изменений метрик за ход (в словарь changes, если он передан)"""
+        changes = {} if changes is None else changes
+        seed, turn = game_state.rng_seed, game_state.current_turn
         
         # Влияние размера команды на рост
-        staff_bonus = len([s for s in game_state.staff.values() if s.hired]) * 0.05
+        derived = game_state.derived()
+        staff_bonus = derived.staff_count * 0.05
         
         # Влияние инфраструктуры на рост
-        infra_multiplier = self._get_infrastructure_multiplier(game_state.infrastructure)
+        infra_multiplier = derived.infra_multiplier
         
         # Базовый рост пользователей (2-5%)
-        base_growth = random.uniform(0.02, 0.05)
+        base_growth = rng.turn_uniform(seed, turn, rng.SLOT_GROWTH, 0.02, 0.05)
         user_growth = base_growth * (1 + staff_bonus) * infra_multiplier
         
         changes['active_users'] = int(game_state.active_users * user_growth)
@@ -229,49 +259,46 @@ class GameEngine:
         changes['mau'] = int(game_state.mau * (1 + user_growth * 0.8))
         
         # Изменение удержания пользователей
-        retention_change = random.uniform(-0.02, 0.03)
+        retention_change = rng.turn_uniform(seed, turn, rng.SLOT_RETENTION, -0.02, 0.03)
         changes['retention_rate_30d'] = max(0, min(100, 
             game_state.community.retention_rate_30d + retention_change * 100))
         
         # Изменение NPS
-        nps_change = random.uniform(-2, 4)
+        nps_change = rng.turn_uniform(seed, turn, rng.SLOT_NPS, -2, 4)
         changes['nps_score'] = max(-100, min(100, 
             game_state.marketing.nps_score + nps_change))
         
         # Изменение юридического риска
-        legal_risk_change = random.uniform(-1, 3)
+        legal_risk_change = rng.turn_uniform(seed, turn, rng.SLOT_LEGAL_RISK, -1, 3)
         changes['legal_risk'] = max(0, min(100,
             game_state.legal.risk_level + legal_risk_change))
         
         return changes
     
-    def _process_marketing_campaigns(self, game_state: GameState) -> Dict[str, Any]:
-        """Обработка активных маркетинговых кампаний"""
-        changes = {}
+    def _process_marketing_campaigns(self, game_state: GameState,
+                                     changes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Обработка активных маркетинговых кампаний (в словарь changes, если он передан)"""
+        changes = {} if changes is None else changes
         current_turn = game_state.current_turn
         
-        for campaign_key, campaign in game_state.marketing.campaigns.items():
-            start_turn = campaign.get('start_turn', 0)
-            duration = campaign.get('duration', 0)
+        for campaign_key, campaign in game_state.marketing.active_campaigns(current_turn):
+            campaign_type = campaign.get('type', '')
+            level = campaign.get('level', 'small')
             
-            if start_turn <= current_turn <= start_turn + duration:
-                # Кампания активна
-                campaign_type = campaign.get('type', '')
-                level = campaign.get('level', 'small')
-                
-                if campaign_type == 'social_media':
-                    changes['active_users'] = changes.get('active_users', 0) + int(500 * self._get_level_multiplier(level))
-                elif campaign_type == 'paid_ads':
-                    changes['active_users'] = changes.get('active_users', 0) + int(800 * self._get_level_multiplier(level))
-                    changes['brand_awareness'] = changes.get('brand_awareness', 0) + int(5 * self._get_level_multiplier(level))
-                elif campaign_type == 'content_marketing':
-                    changes['nps_score'] = changes.get('nps_score', 0) + int(2 * self._get_level_multiplier(level))
+            if campaign_type == 'social_media':
+                changes['active_users'] = changes.get('active_users', 0) + int(500 * self._get_level_multiplier(level))
+            elif campaign_type == 'paid_ads':
+                changes['active_users'] = changes.get('active_users', 0) + int(800 * self._get_level_multiplier(level))
+                changes['brand_awareness'] = changes.get('brand_awareness', 0) + int(5 * self._get_level_multiplier(level))
+            elif campaign_type == 'content_marketing':
+                changes['nps_score'] = changes.get('nps_score', 0) + int(2 * self._get_level_multiplier(level))
         
         return changes
     
-    def _calculate_financial_changes(self, game_state: GameState) -> Dict[str, Any]:
-        """Расчет финансовых изменений"""
-        changes = {}
+    def _calculate_financial_changes(self, game_state: GameState,
+                                     changes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Расчет финансовых изменений (в словарь changes, если он передан)"""
+        changes = {} if changes is None else changes
         
         # Доходы от рекламы
         base_cpm = self.config.AD_METRICS['base_cpm']
@@ -294,11 +321,7 @@ class GameEngine:
         changes['total_revenue'] = ad_revenue + donation_revenue
         
         # Общие расходы
-        total_expenses = (game_state.expenses.staff_cost + 
-                         game_state.expenses.marketing_cost +
-                         game_state.expenses.legal_cost +
-                         game_state.expenses.infrastructure_cost +
-                         game_state.expenses.hosting_cost)
+        total_expenses = game_state.derived().expenses
         
         changes['total_expenses'] = total_expenses
         
@@ -337,21 +360,8 @@ class GameEngine:
         
         # Обновляем MAU
         game_state.mau = int(game_state.active_users * 1.2)
-    
-    def _get_infrastructure_multiplier(self, infrastructure) -> float:
-        """Получение множителя инфраструктуры"""
-        multipliers = {
-            InfrastructureLevel.BASIC: 1.0,
-            InfrastructureLevel.ADVANCED: 1.15,
-            InfrastructureLevel.ENTERPRISE: 1.35
-        }
-        
-        server_mult = multipliers.get(infrastructure.server_level, 1.0)
-        bandwidth_mult = multipliers.get(infrastructure.bandwidth_level, 1.0)
-        storage_mult = multipliers.get(infrastructure.storage_level, 1.0)
-        security_mult = multipliers.get(infrastructure.security_level, 1.0)
         
-        return (server_mult + bandwidth_mult + storage_mult + security_mult) / 4
+        game_state.touch('core', *{METRIC_SECTIONS[m] for m in changes if m in METRIC_SECTIONS})
     
     def _get_level_multiplier(self, level: str) -> float:
         """Получение множителя для уровня"""
@@ -393,8 +403,9 @@ class GameEngine:
                 return {'success': False, 'message': 'Неверный выбор'}
             
             choice = game_state.last_event.choices[choice_index]
-            game_state.last_event.selected_choice = choice
+            game_state.last_event.choice_index = choice_index
             game_state.last_event.resolved = True
+            game_state.record_event_choice(game_state.last_event)
             
             # Применяем эффект выбора
             effect = self._apply_event_effect(game_state, game_state.last_event.event_type, choice_index)
@@ -454,17 +465,21 @@ class GameEngine:
             ]
         }
         
+        # Выбор по событию уже изменил состояние, даже если эффекта нет
         if event_type not in effects or choice_index >= len(effects[event_type]):
+            game_state.touch('core', 'recent_events')
             return {}
         
         effect = effects[event_type][choice_index]
+        derived = game_state.derived()
+        game_state.touch('core', 'recent_events', *{METRIC_SECTIONS[k] for k in effect if k in METRIC_SECTIONS})
         applied_effects = {}
         
         for key, value in effect.items():
             applied_effects[key] = value
             
             if key == 'budget':
-                game_state.budget += value
+                post_entry(game_state, LedgerCategory.EVENTS, value, f"event:{event_type}")
             elif key == 'active_users':
                 game_state.active_users = max(0, game_state.active_users + value)
             elif key == 'nps_score':
@@ -491,8 +506,11 @@ class GameEngine:
             elif key == 'conversion_rate':
                 game_state.marketing.conversion_rate = max(0, min(100, game_state.marketing.conversion_rate + value))
             elif key == 'revenue':
-                game_state.revenue.total_revenue += value * 1000
+                # Разовый доход по событию (в тысячах)
+                post_entry(game_state, LedgerCategory.OTHER_INCOME, value * 1000, f"event:{event_type}")
         
+        if 'security_level' in effect or 'server_level' in effect:
+            derived.infrastructure_changed(game_state.infrastructure)
         return applied_effects
     
     def calculate_score(self, game_state: GameState) -> int:
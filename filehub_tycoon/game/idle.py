@@ -0,0 +1,338 @@
+# Догоняние ходов, пропущенных игроком в режиме реального времени
+#
+# Пока игрока нет, игра идет по ходу в tick_hours часов, но никто не
+# обрабатывает ее по ходам: при следующем обращении пропущенные ходы
+# применяются разом. Ходы без событий, проверок домена и смены набора
+# кампаний складываются в отрезки, и отрезок считается в замкнутом виде:
+# рост пользователей - произведение множителей хода, случайные части -
+# одна выборка суммы за отрезок (логнормальный множитель роста и нормальные
+# приращения NPS, удержания и юридического риска). Момент случайного события
+# выбирается по геометрическому распределению с вероятностью события для
+# состояния в начале отрезка (EventSampler.chance), а ход с событием или проверкой
+# домена обрабатывается движком обычным process_turn. Догоняние, как и
+# /next N, останавливается на нерешенном событии, победе или поражении.
+#
+# Значения за отрезок приближенные (округление и ограничения метрик
+# учитываются в конце отрезка), зато стоимость не зависит от числа
+# пропущенных ходов. Случайные величины берутся из потока игры по первому
+# ходу отрезка, поэтому повтор действия 'catch_up' из журнала дает тот же
+# результат.
+
+import math
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Optional, Dict, Any, Tuple
+
+from game import rng
+from game.actions import advance_turn, fire_turn_timers, progress_metrics
+from game.ledger import close_turn
+from game.models import GameState
+
+# Рост пользователей за ход (GameEngine._calculate_base_metrics_change и
+# _apply_metrics_changes): u' = u * (1 + g) + mau * (1 + 0.8 g), mau = 1.2 u,
+# то есть u' = (GROWTH_BASE + GROWTH_SLOPE * g) * u
+MAU_RATIO = 1.2
+GROWTH_BASE = 1 + MAU_RATIO
+GROWTH_SLOPE = 1 + MAU_RATIO * 0.8
+BASE_GROWTH_RANGE = (0.02, 0.05)
+
+# Случайные приращения за ход: (минимум, максимум)
+RETENTION_STEP = (-2.0, 3.0)
+NPS_STEP = (-2.0, 4.0)
+LEGAL_RISK_STEP = (-1.0, 3.0)
+
+MAX_EXPONENT = 700.0  # Ограничение показателя степени (переполнение float)
+VALUE_LIMIT = 2 ** 63 - 1  # Наибольшее целое, которое хранит база данных
+NORMAL = NormalDist()
+
+def elapsed_turns(game_state: GameState, now: datetime, tick_hours: float) -> int:
+    """Количество полных ходов, прошедших с последнего хода"""
+    if tick_hours <= 0:
+        return 0
+    return max(0, int((now - game_state.last_turn_date) / timedelta(hours=tick_hours)))
+
+def _normal(u: float) -> float:
+    """Стандартная нормальная величина из равномерной в [0, 1)"""
+    return NORMAL.inv_cdf(min(max(u, 1e-12), 1 - 1e-12))
+
+def _power(base: float, exponent: float) -> float:
+    return math.exp(min(exponent * math.log(base), MAX_EXPONENT))
+
+def _uniform_moments(low: float, high: float) -> Tuple[float, float]:
+    """Среднее и дисперсия равномерного распределения"""
+    return (low + high) / 2, (high - low) ** 2 / 12
+
+def _log_uniform_moments(low: float, high: float) -> Tuple[float, float]:
+    """Среднее и дисперсия log(y) для y, равномерного на [low, high]"""
+    def first(y):
+        return y * (math.log(y) - 1)
+
+    def second(y):
+        log_y = math.log(y)
+        return y * (log_y * log_y - 2 * log_y + 2)
+
+    width = high - low
+    mean = (first(high) - first(low)) / width
+    return mean, max(0.0, (second(high) - second(low)) / width - mean * mean)
+
+def _first_true(predicate, low: int, high: int) -> Optional[int]:
+    """Первое j в [low, high], для которого монотонный предикат истинен"""
+    if high < low or not predicate(high):
+        return None
+    while low < high:
+        middle = (low + high) // 2
+        if predicate(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def _to_int(value: float) -> int:
+    """Целое значение метрики с ограничением по модулю VALUE_LIMIT"""
+    return int(_clamp(value, -VALUE_LIMIT, VALUE_LIMIT))
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+class Segment:
+    """Отрезок ходов без событий и смены набора кампаний
+
+    Средняя траектория (значения через j ходов) нужна для поиска хода, на
+    котором наступают условия победы или поражения; итог отрезка считается
+    с выборкой случайных частей.
+    """
+
+    def __init__(self, engine, game_state: GameState):
+        config = engine.config
+        self.engine = engine
+        self.game_state = game_state
+
+        derived = game_state.derived()
+        staff_bonus = derived.staff_count * 0.05
+        scale = (1 + staff_bonus) * derived.infra_multiplier
+        growth_low, growth_high = (value * scale for value in BASE_GROWTH_RANGE)
+        self.mean_growth = (growth_low + growth_high) / 2
+        self.log_mean, self.log_var = _log_uniform_moments(GROWTH_BASE + GROWTH_SLOPE * growth_low,
+                                                           GROWTH_BASE + GROWTH_SLOPE * growth_high)
+        self.factor = math.exp(self.log_mean)
+
+        # Эффекты активных кампаний за ход (как GameEngine._process_marketing_campaigns)
+        campaigns = engine._process_marketing_campaigns(game_state)
+        self.campaign_users = campaigns.get('active_users', 0)
+        self.campaign_nps = campaigns.get('nps_score')  # Кампания задает NPS, а не прибавляет
+        self.campaign_awareness = campaigns.get('brand_awareness', 0)
+
+        # Первый ход отрезка: mau может еще не быть равным 1.2 * active_users
+        self.first_users = (game_state.active_users * (1 + self.mean_growth) +
+                            game_state.mau * (1 + 0.8 * self.mean_growth) + self.campaign_users)
+
+        self.revenue_scale = config.AD_METRICS['base_cpm'] * 0.001
+        self.nps_bonus = config.AD_METRICS['nps_bonus']
+        self.retention_bonus = config.AD_METRICS['retention_bonus']
+        self.donations = int(game_state.community.donations_monthly * 0.8)
+        self.expenses = derived.expenses
+
+    # Средняя траектория через j >= 1 ходов
+
+    def _geometric(self, turns: int) -> float:
+        """Сумма factor^i для i от 0 до turns - 1"""
+        if abs(self.factor - 1) < 1e-12:
+            return float(turns)
+        return (_power(self.factor, turns) - 1) / (self.factor - 1)
+
+    def users(self, j: int) -> float:
+        return (_power(self.factor, j - 1) * self.first_users +
+                self.campaign_users * self._geometric(j - 1))
+
+    def users_sum(self, j: int) -> float:
+        """Сумма пользователей после каждого из j ходов"""
+        total = self.first_users * self._geometric(j)
+        if self.campaign_users and abs(self.factor - 1) >= 1e-12:
+            total += self.campaign_users * (self._geometric(j) - j) / (self.factor - 1)
+        return total
+
+    def nps(self, j: int) -> float:
+        if self.campaign_nps is not None:
+            return self.campaign_nps
+        return _clamp(self.game_state.marketing.nps_score + j * _uniform_moments(*NPS_STEP)[0], -100, 100)
+
+    def retention(self, j: int) -> float:
+        return _clamp(self.game_state.community.retention_rate_30d + j * _uniform_moments(*RETENTION_STEP)[0], 0, 100)
+
+    def legal_risk(self, j: int) -> float:
+        return _clamp(self.game_state.legal.risk_level + j * _uniform_moments(*LEGAL_RISK_STEP)[0], 0, 100)
+
+    def revenue_per_user(self, nps: float, retention: float) -> float:
+        return self.revenue_scale * (1 + nps * self.nps_bonus + retention * self.retention_bonus / 100)
+
+    def cash_flow(self, j: int) -> float:
+        return self.users(j) * self.revenue_per_user(self.nps(j), self.retention(j)) + self.donations - self.expenses
+
+    def budget(self, j: int) -> float:
+        # Доход на пользователя берется по концу отрезка: сумма определяется последними ходами
+        return (self.game_state.budget + self.users_sum(j) * self.revenue_per_user(self.nps(j), self.retention(j)) +
+                j * (self.donations - self.expenses))
+
+    def outcome_turn(self, turns: int) -> Optional[int]:
+        """Первый ход отрезка (1..turns), на котором средняя траектория дает победу или поражение"""
+        candidates = []
+
+        # Поражение: пользователи только растут, риск растет, бюджет сначала
+        # падает (пока денежный поток отрицателен), затем растет
+        if self.users(1) < 100:
+            candidates.append(1)
+        legal_loss = _first_true(lambda j: self.legal_risk(j) >= 100, 1, turns)
+        if legal_loss is not None:
+            candidates.append(legal_loss)
+        lowest = (_first_true(lambda j: self.cash_flow(j) >= 0, 1, turns) or turns + 1) - 1
+        if lowest >= 1:
+            bankrupt = _first_true(lambda j: self.budget(j) <= 0, 1, lowest)
+            if bankrupt is not None:
+                candidates.append(bankrupt)
+
+        # Победа: все условия монотонны, риск должен еще оставаться низким
+        firsts = [
+            _first_true(lambda j: self.users(j) >= 1000000, 1, turns),
+            _first_true(lambda j: self.nps(j) >= 70, 1, turns),
+            _first_true(lambda j: self.cash_flow(j) > 0, 1, turns)
+        ]
+        if None not in firsts and self.legal_risk(max(firsts)) <= 40:
+            candidates.append(max(firsts))
+
+        return min(candidates) if candidates else None
+
+    def apply(self, turns: int) -> Dict[str, Any]:
+        """Применение отрезка к состоянию с выборкой случайных частей (возвращает сводку журнала)"""
+        game_state = self.game_state
+        seed, turn = game_state.rng_seed, game_state.current_turn
+
+        # Рост: сумма логарифмов множителей ходов после первого
+        spread = math.sqrt(max(0, turns - 1) * self.log_var)
+        log_growth = (turns - 1) * self.log_mean + spread * _normal(rng.turn_random(seed, turn, rng.SLOT_IDLE_GROWTH))
+        users = (math.exp(min(log_growth, MAX_EXPONENT)) * self.first_users +
+                 self.campaign_users * self._geometric(turns - 1))
+        users_sum = self.users_sum(turns) * (users / self.users(turns) if self.users(turns) else 1)
+
+        def walk(value: float, step: Tuple[float, float], slot: int, low: float, high: float) -> float:
+            mean, var = _uniform_moments(*step)
+            noise = math.sqrt(turns * var) * _normal(rng.turn_random(seed, turn, slot))
+            return _clamp(value + turns * mean + noise, low, high)
+
+        retention = walk(game_state.community.retention_rate_30d, RETENTION_STEP, rng.SLOT_IDLE_RETENTION, 0, 100)
+        nps = self.campaign_nps
+        if nps is None:
+            nps = walk(game_state.marketing.nps_score, NPS_STEP, rng.SLOT_IDLE_NPS, -100, 100)
+        legal_risk = walk(game_state.legal.risk_level, LEGAL_RISK_STEP, rng.SLOT_IDLE_LEGAL, 0, 100)
+
+        revenue_per_user = self.revenue_per_user(nps, retention)
+        ad_revenue = _to_int(users * revenue_per_user)
+        total_ad_revenue = _to_int(users_sum * revenue_per_user)
+
+        game_state.active_users = _to_int(users)
+        game_state.mau = _to_int(game_state.active_users * MAU_RATIO)
+        game_state.community.retention_rate_30d = retention
+        game_state.marketing.nps_score = nps
+        game_state.marketing.brand_awareness += self.campaign_awareness * turns
+        game_state.legal.risk_level = legal_risk
+        game_state.revenue.ad_revenue = ad_revenue
+        game_state.revenue.donation_revenue = self.donations
+        game_state.revenue.total_revenue = ad_revenue + self.donations
+        game_state.expenses.total_expenses = self.expenses
+        game_state.financial.cash_flow = ad_revenue + self.donations - self.expenses
+        game_state.budget += total_ad_revenue + turns * (self.donations - self.expenses)
+        # Отрезок закрывается в журнале одной сводкой
+        rollup = close_turn(game_state, total_ad_revenue, turns * self.donations, turns)
+        game_state.current_turn += turns
+        game_state.actions_remaining = 3
+        game_state.touch('core', 'community', 'marketing', 'legal', 'revenue', 'expenses', 'financial')
+        return rollup
+
+def _turns_to_event(game_state: GameState, chance: float) -> int:
+    """Сколько ходов пройдет без случайного события (геометрическое распределение)"""
+    if chance >= 1.0:
+        return 0
+    u = rng.turn_random(game_state.rng_seed, game_state.current_turn, rng.SLOT_IDLE_EVENT)
+    return int(math.log1p(-u) / math.log1p(-chance))
+
+def _turns_to_campaign_change(game_state: GameState) -> Optional[int]:
+    """Через сколько ходов изменится набор активных кампаний"""
+    turn = game_state.current_turn
+    changes = []
+    for campaign in game_state.marketing.campaigns.values():
+        start = campaign.get('start_turn', 0)
+        end = start + campaign.get('duration', 0)
+        changes.extend(boundary - turn for boundary in (start, end + 1) if boundary > turn)
+    return min(changes) if changes else None
+
+def _turns_to_domain_check(game_state: GameState) -> Optional[int]:
+    if not game_state.setup_complete:
+        return None
+    return max(0, game_state.next_domain_check_turn - game_state.current_turn)
+
+def catch_up(game_state: GameState, engine, turns: int, tick_hours: float) -> Dict[str, Any]:
+    """Применение turns пропущенных ходов (сводка в формате actions.fast_forward)
+
+    Время последнего хода сдвигается на turns * tick_hours часов - остаток
+    времени до следующего хода сохраняется. При остановке раньше игра ждет
+    игрока: время до остановки тоже считается прошедшим.
+    """
+    summary = {
+        'turns': 0,
+        'start': progress_metrics(game_state),
+        'end': None,
+        'total_revenue': 0,
+        'total_expenses': 0,
+        'cash_flow': 0,
+        'new_events': [],
+        'status': 'success',
+        'stop_reason': None
+    }
+    last_turn_date = game_state.last_turn_date + timedelta(hours=tick_hours * turns)
+
+    def add(rollup: Dict[str, Any], count: int):
+        summary['turns'] += count
+        summary['total_revenue'] += rollup['revenue']
+        summary['total_expenses'] += rollup['expenses']
+        summary['cash_flow'] += rollup['cash_flow']
+
+    while summary['turns'] < turns:
+        if game_state.last_event and not game_state.last_event.resolved:
+            summary['stop_reason'] = 'event'
+            break
+
+        remaining = turns - summary['turns']
+        event_in = _turns_to_event(game_state, engine.event_sampler.chance(game_state))
+        domain_in = _turns_to_domain_check(game_state)
+        campaign_in = _turns_to_campaign_change(game_state)
+
+        # Ходы, которые можно посчитать отрезком, и нужен ли после них обычный ход
+        quiet = min(value for value in (remaining, event_in, domain_in, campaign_in) if value is not None)
+        exact = quiet < remaining and quiet in (event_in, domain_in)
+        if quiet:
+            segment = Segment(engine, game_state)
+            outcome = segment.outcome_turn(quiet)
+            if outcome is not None:
+                # Исход решает обычный ход
+                quiet, exact = outcome - 1, True
+            if quiet:
+                add(segment.apply(quiet), quiet)
+        if not exact:
+            continue
+
+        turn_results = engine.process_turn(game_state, force_event=quiet == event_in)
+        if turn_results['status'] == 'error':
+            summary['status'] = summary['stop_reason'] = 'error'
+            break
+        add(game_state.ledger.last_rollup(), 1)
+        summary['new_events'].extend(turn_results['new_events'])
+        summary['status'] = turn_results['status']
+        advance_turn(game_state, last_turn_date)
+        if turn_results['status'] in ('win', 'lose'):
+            summary['stop_reason'] = turn_results['status']
+            break
+
+    game_state.last_turn_date = last_turn_date
+    game_state.touch('core')
+    fire_turn_timers(game_state)
+    summary['end'] = progress_metrics(game_state)
+    return summary
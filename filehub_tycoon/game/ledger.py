@@ -0,0 +1,146 @@
+# Финансовый журнал игры
+#
+# Все движения денег проходят через журнал. Разовые операции - покупки
+# игрока, последствия событий, сборы сообщества - записываются сразу как
+# (категория, сумма, источник) и тут же меняют бюджет; доход положительный,
+# расход отрицательный. Регулярные доходы и расходы хода движок считает
+# один раз за ход и закрывает ими ход: записи открытого хода сворачиваются
+# в компактную сводку, которую читают движок, дашборд и /report. Итоги по
+# категориям за всю игру обновляются за O(1) на запись.
+
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+LEDGER_WINDOW = 24  # Сводок последних ходов в состоянии игры
+SOURCE_TURN = "turn"  # Источник регулярных доходов и расходов хода
+
+class LedgerCategory(str, Enum):
+    """Категории записей журнала"""
+    AD_REVENUE = "ad_revenue"          # Реклама
+    DONATIONS = "donations"            # Пожертвования
+    OTHER_INCOME = "other_income"      # Прочие доходы (события)
+    STAFF = "staff"                    # Зарплаты и найм
+    MARKETING = "marketing"            # Кампании
+    LEGAL = "legal"                    # Юристы и юридические действия
+    INFRASTRUCTURE = "infrastructure"  # Содержание и апгрейды инфраструктуры
+    HOSTING = "hosting"                # Хостинг и новые регионы
+    COMMUNITY = "community"            # Мероприятия сообщества
+    EVENTS = "events"                  # Ответы на события
+
+INCOME_CATEGORIES = (LedgerCategory.AD_REVENUE, LedgerCategory.DONATIONS, LedgerCategory.OTHER_INCOME)
+
+# Статьи регулярных расходов (поля Expenses) и их категории
+EXPENSE_CATEGORIES = {
+    'staff_cost': LedgerCategory.STAFF.value,
+    'marketing_cost': LedgerCategory.MARKETING.value,
+    'legal_cost': LedgerCategory.LEGAL.value,
+    'infrastructure_cost': LedgerCategory.INFRASTRUCTURE.value,
+    'hosting_cost': LedgerCategory.HOSTING.value
+}
+
+class Ledger(BaseModel):
+    """Журнал: записи открытого хода, итоги по категориям и сводки ходов"""
+    entries: List[Tuple[str, int, str]] = Field(default_factory=list)  # Разовые операции открытого хода
+    period: Dict[str, int] = Field(default_factory=dict)  # Их итоги по категориям
+    totals: Dict[str, int] = Field(default_factory=dict)  # Итоги за всю игру по категориям
+    rollups: List[Dict[str, Any]] = Field(default_factory=list)  # Сводки последних LEDGER_WINDOW ходов
+
+    def post(self, category: LedgerCategory, amount: int, source: str):
+        """Разовая операция открытого хода"""
+        category = LedgerCategory(category).value
+        self.entries.append((category, amount, source))
+        self.period[category] = self.period.get(category, 0) + amount
+        self.totals[category] = self.totals.get(category, 0) + amount
+
+    def close(self, turn: int, turns: int, flows: Dict[str, int], budget: int) -> Dict[str, Any]:
+        """Закрытие хода (turns > 1 - сразу нескольких ходов, заканчивая ходом turn)
+
+        flows - регулярные доходы и расходы хода по категориям, budget - бюджет
+        после них. Разовые операции открытого хода входят в сводку и очищаются.
+        """
+        categories = dict(self.period)
+        revenue = expenses = 0
+        for category, amount in flows.items():
+            if not amount:
+                continue
+            categories[category] = categories.get(category, 0) + amount
+            self.totals[category] = self.totals.get(category, 0) + amount
+            if amount > 0:
+                revenue += amount
+            else:
+                expenses -= amount
+
+        rollup = {
+            'turn': turn,
+            'turns': turns,
+            'revenue': revenue,
+            'expenses': expenses,
+            'cash_flow': revenue - expenses,
+            'one_off': sum(self.period.values()),
+            'budget': budget,
+            'categories': categories
+        }
+        self.rollups.append(rollup)
+        del self.rollups[:-LEDGER_WINDOW]
+        self.entries = []
+        self.period = {}
+        return rollup
+
+    def last_rollup(self) -> Optional[Dict[str, Any]]:
+        """Сводка последнего закрытого хода (None - ходов еще не было)"""
+        return self.rollups[-1] if self.rollups else None
+
+    def total(self, category: LedgerCategory) -> int:
+        """Итог категории за всю игру"""
+        return self.totals.get(LedgerCategory(category).value, 0)
+
+    def split_totals(self) -> Tuple[int, int]:
+        """Доходы и расходы за всю игру"""
+        income = sum(amount for amount in self.totals.values() if amount > 0)
+        return income, income - sum(self.totals.values())
+
+def post_entry(game_state, category: LedgerCategory, amount: int, source: str) -> bool:
+    """Разовая операция: запись в журнал и изменение бюджета"""
+    game_state.ledger.post(category, amount, source)
+    game_state.budget += amount
+    game_state.touch('core', 'ledger')
+    return True
+
+def turn_flows(expenses, ad_revenue: int, donation_revenue: int, turns: int = 1) -> Dict[str, int]:
+    """Регулярные доходы и расходы по категориям (доходы - суммы за все turns ходов)"""
+    flows = {
+        LedgerCategory.AD_REVENUE.value: ad_revenue,
+        LedgerCategory.DONATIONS.value: donation_revenue
+    }
+    for field, category in EXPENSE_CATEGORIES.items():
+        amount = getattr(expenses, field)
+        if amount:
+            flows[category] = flows.get(category, 0) - amount * turns
+    return flows
+
+def update_indicators(financial, rollup: Dict[str, Any]):
+    """Скорость сжигания, запас в ходах и рентабельность по сводке хода"""
+    turns = rollup['turns']
+    cash_flow = rollup['cash_flow'] // turns
+    if cash_flow < 0:
+        financial.burn_rate = -cash_flow
+        financial.runway_months = max(0.0, rollup['budget'] / financial.burn_rate)
+    else:
+        financial.burn_rate = 0
+        financial.runway_months = 999
+    if rollup['revenue'] > 0:
+        financial.profit_margin = max(-100.0, min(100.0, rollup['cash_flow'] / rollup['revenue'] * 100))
+
+def close_turn(game_state, ad_revenue: int, donation_revenue: int, turns: int = 1) -> Dict[str, Any]:
+    """Закрытие хода после того, как движок применил его доходы и расходы к бюджету
+
+    Вызывается на последнем ходе отрезка из turns ходов (до перехода к
+    следующему ходу); ad_revenue и donation_revenue - суммы за отрезок.
+    """
+    flows = turn_flows(game_state.expenses, ad_revenue, donation_revenue, turns)
+    rollup = game_state.ledger.close(game_state.current_turn + turns - 1, turns, flows, game_state.budget)
+    update_indicators(game_state.financial, rollup)
+    game_state.touch('ledger', 'financial')
+    return rollup
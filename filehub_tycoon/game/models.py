@@ -1,9 +1,16 @@
 # Модели данных для симулятора файлового хаба
 
-from typing import Dict, List, Optional, Any, Tuple
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Any, Tuple, Callable, Union, get_args, get_origin
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, model_validator
 from datetime import datetime, timedelta
 from enum import Enum
+import copy
+
+from game.event_catalog import render_description, get_choices
+from game.rng import new_seed, misc_random
+from game.derived import DerivedMetrics, consistency_check_enabled
+from game.ledger import Ledger
+from utils.timer_wheel import TimerWheel
 
 class UserRole(str, Enum):
     """Роли пользователей в команде"""
@@ -54,13 +61,62 @@ class Hosting(BaseModel):
     failover_enabled: bool = False
     backup_frequency: int = 24  # Часы между резервными копиями
 
+# Прирост пользователей за ход активной кампании по типу и множители уровня
+# (как в GameEngine._process_marketing_campaigns)
+CAMPAIGN_USERS_PER_TURN = {'social_media': 500, 'paid_ads': 800}
+CAMPAIGN_LEVEL_MULTIPLIERS = {'small': 1.0, 'medium': 2.0, 'large': 5.0}
+
+def campaign_end_turn(campaign: Dict[str, Any]) -> int:
+    """Последний ход, на котором кампания действует"""
+    return campaign.get('start_turn', 0) + campaign.get('duration', 0)
+
 class Marketing(BaseModel):
     """Модель маркетинга"""
-    campaigns: Dict[str, Any] = Field(default_factory=dict)
+    campaigns: Dict[str, Any] = Field(default_factory=dict)  # Идущие кампании в порядке окончания
+    campaign_seq: int = 0  # Номер для ключа следующей кампании
+    campaign_totals: Dict[str, Dict[str, int]] = Field(default_factory=dict)  # Итоги завершенных по типу
     ad_spend: int = 0
     conversion_rate: float = Field(default=2.5, ge=0, le=100)
     brand_awareness: float = Field(default=10.0, ge=0, le=100)
     nps_score: float = Field(default=50.0, ge=-100, le=100)  # Net Promoter Score
+    
+    def add_campaign(self, campaign: Dict[str, Any]) -> str:
+        """Добавление кампании с уникальным ключом, сохраняя порядок по ходу окончания"""
+        self.campaign_seq += 1
+        key = f"{campaign.get('type', '')}_{campaign.get('level', '')}_{self.campaign_seq}"
+        end_turn = campaign_end_turn(campaign)
+        if self.campaigns and campaign_end_turn(next(reversed(self.campaigns.values()))) > end_turn:
+            # Кампания заканчивается раньше уже идущих - словарь пересобирается
+            ordered = list(self.campaigns.items()) + [(key, campaign)]
+            ordered.sort(key=lambda item: campaign_end_turn(item[1]))
+            self.campaigns = dict(ordered)
+        else:
+            self.campaigns[key] = campaign
+        return key
+    
+    def active_campaigns(self, turn: int):
+        """Кампании, действующие на ходу turn (закончившиеся в начале словаря пропускаются)"""
+        for key, campaign in self.campaigns.items():
+            if campaign_end_turn(campaign) < turn:
+                continue
+            if campaign.get('start_turn', 0) <= turn:
+                yield key, campaign
+    
+    def retire_campaign(self, key: str) -> bool:
+        """Перенос завершенной кампании в итоги по ее типу"""
+        campaign = self.campaigns.pop(key, None)
+        if campaign is None:
+            return False
+        campaign_type = campaign.get('type', '')
+        turns = campaign.get('duration', 0) + 1
+        users = int(CAMPAIGN_USERS_PER_TURN.get(campaign_type, 0) *
+                    CAMPAIGN_LEVEL_MULTIPLIERS.get(campaign.get('level', 'small'), 1.0)) * turns
+        totals = self.campaign_totals.setdefault(campaign_type, {'count': 0, 'spend': 0, 'users': 0, 'turns': 0})
+        totals['count'] += 1
+        totals['spend'] += campaign.get('cost', 0)
+        totals['users'] += users
+        totals['turns'] += turns
+        return True
 
 class Community(BaseModel):
     """Модель сообщества"""
@@ -111,16 +167,68 @@ class FinancialMetrics(BaseModel):
     customer_acquisition_cost: float = Field(default=0.0, ge=0)
 
 class GameEvent(BaseModel):
-    """Модель игрового события"""
+    """Модель игрового события
+    
+    Тексты описания и вариантов выбора не хранятся в событии, а берутся
+    из общего каталога EVENT_CATALOG по типу события и параметрам.
+    """
     event_type: str
-    description: str
     impact: int
     duration_hours: int = 0
     probability: float
     timestamp: datetime
     resolved: bool = False
-    choices: List[str] = Field(default_factory=list)
-    selected_choice: Optional[str] = None
+    params: Dict[str, Any] = Field(default_factory=dict)  # Параметры текста (например, домен и причина блокировки)
+    choice_index: Optional[int] = None  # Номер выбранного варианта
+    
+    @model_validator(mode='before')
+    @classmethod
+    def _upgrade_stored_text(cls, data: Any) -> Any:
+        """Перевод событий старого формата (с копией текстов) в ссылки на каталог"""
+        if isinstance(data, dict) and 'choice_index' not in data and data.get('selected_choice'):
+            choices = list(data.get('choices') or get_choices(data.get('event_type')))
+            if data['selected_choice'] in choices:
+                data = dict(data, choice_index=choices.index(data['selected_choice']))
+        return data
+    
+    @property
+    def description(self) -> str:
+        return render_description(self.event_type, self.params)
+    
+    @property
+    def choices(self) -> Tuple[str, ...]:
+        return get_choices(self.event_type)
+    
+    @property
+    def selected_choice(self) -> Optional[str]:
+        if self.choice_index is None or self.choice_index >= len(self.choices):
+            return None
+        return self.choices[self.choice_index]
+
+# Секции состояния игры, которые сохраняются отдельно друг от друга.
+# Все остальные поля GameState относятся к секции "core".
+CORE_SECTION = "core"
+STATE_SECTIONS = (
+    "staff", "infrastructure", "hosting", "marketing", "community", "legal",
+    "revenue", "expenses", "financial", "recent_events", "domain_block_history", "ledger"
+)
+ALL_SECTIONS = (CORE_SECTION,) + STATE_SECTIONS
+
+# Размеры окон истории внутри состояния; полная история хранится в таблице events
+RECENT_EVENTS_WINDOW = 10
+DOMAIN_HISTORY_WINDOW = 5
+AVAILABLE_DOMAINS_WINDOW = 10
+
+# Виды записей журнала событий
+LOG_EVENT = "event"                # Сгенерированное событие
+LOG_EVENT_CHOICE = "event_choice"  # Выбор игрока в событии
+LOG_DOMAIN_BLOCK = "domain_block"  # Блокировка домена
+LOG_DOMAIN = "domain"              # Новый доступный домен
+LOG_ACTION = "action"              # Действие игрока (повторяется при восстановлении игры)
+
+# Виды таймеров (utils/timer_wheel.py)
+TIMER_CAMPAIGN_END = "campaign_end"  # Окончание кампании (по ходам игры)
+TIMER_EVENT_EXPIRY = "event_expiry"  # Истечение срока ответа на событие (по времени)
 
 class GameState(BaseModel):
     """Основное состояние игры"""
@@ -155,6 +263,7 @@ class GameState(BaseModel):
     revenue: Revenue = Field(default_factory=Revenue)
     expenses: Expenses = Field(default_factory=Expenses)
     financial: FinancialMetrics = Field(default_factory=FinancialMetrics)
+    ledger: Ledger = Field(default_factory=Ledger)  # Финансовый журнал (game/ledger.py)
     
     # Игровая механика
     actions_remaining: int = 3
@@ -168,8 +277,346 @@ class GameState(BaseModel):
     auto_save: bool = True
     notifications_enabled: bool = True
     
+    # Случайность игры (game/rng.py): зерно и счетчик потока вне хода
+    rng_seed: int = Field(default_factory=new_seed)
+    rng_counter: int = 0
+    
+    # Версия состояния - растет при каждом изменении
+    version: int = 0
+    log_seq: int = 0  # Номер последней записи журнала событий
+    _persisted_version: int = PrivateAttr(default=-1)  # Версия, записанная в базу данных
+    _section_versions: Dict[str, int] = PrivateAttr(default_factory=dict)  # Версия последнего изменения секции
+    _pending_log: List[Tuple[int, int, str, Any]] = PrivateAttr(default_factory=list)  # Незаписанный журнал: (ход, номер, вид, данные)
+    _snapshot_turn: int = PrivateAttr(default=-1)  # Ход последнего записанного снимка (режим журнала)
+    _turn_timers: Optional[TimerWheel] = PrivateAttr(default=None)  # Таймеры по ходам (строятся из состояния)
+    _derived: Optional[DerivedMetrics] = PrivateAttr(default=None)  # Производные метрики (game/derived.py)
+    
     class Config:
         use_enum_values = True
+    
+    def touch(self, *sections: str) -> int:
+        """Отметка изменения состояния (увеличивает версию)
+        
+        Без аргументов считаются измененными все секции.
+        """
+        version = self.version + 1
+        self.version = version
+        section_versions = self._section_versions  # Доступ к приватному атрибуту pydantic небыстрый
+        for section in sections or ALL_SECTIONS:
+            section_versions[section] = version
+        return version
+    
+    def misc_random(self):
+        """Генератор для одного действия вне хода (продвигает счетчик потока)"""
+        rng = misc_random(self.rng_seed, self.rng_counter)
+        self.rng_counter += 1
+        self.touch(CORE_SECTION)
+        return rng
+    
+    @property
+    def is_dirty(self) -> bool:
+        """Есть ли изменения или записи журнала, не записанные в базу данных"""
+        return self.version != self._persisted_version or bool(self._pending_log)
+    
+    def mark_persisted(self, version: int):
+        """Отметка записи указанной версии в базу данных"""
+        self._persisted_version = max(self._persisted_version, version)
+    
+    def dirty_sections(self) -> List[str]:
+        """Секции, измененные после последней записи в базу данных"""
+        if self._persisted_version < 0:
+            return list(ALL_SECTIONS)  # Игра еще ни разу не записана целиком
+        return [section for section, version in self._section_versions.items()
+                if version > self._persisted_version]
+    
+    def dump_sections(self, sections: List[str]) -> Dict[str, Any]:
+        """Сериализация указанных секций состояния"""
+        data = self.model_dump(include={s for s in sections if s != CORE_SECTION})
+        if CORE_SECTION in sections:
+            data[CORE_SECTION] = self.model_dump(exclude=set(STATE_SECTIONS))
+        return data
+    
+    def _log(self, kind: str, data: Any, turn: Optional[int] = None):
+        """Добавление записи в журнал событий (записывается вместе с состоянием)"""
+        self.log_seq += 1
+        self._pending_log.append((self.current_turn if turn is None else turn, self.log_seq, kind, data))
+    
+    def record_event(self, event: GameEvent):
+        """Добавление нового события: в журнал и в окно последних событий"""
+        self.recent_events.append(event)
+        del self.recent_events[:-RECENT_EVENTS_WINDOW]
+        self.last_event = event
+        self._log(LOG_EVENT, event.model_dump())
+        self.touch(CORE_SECTION, 'recent_events')
+    
+    def record_event_choice(self, event: GameEvent):
+        """Запись выбора игрока в событии"""
+        self._log(LOG_EVENT_CHOICE, {'event_type': event.event_type, 'choice_index': event.choice_index})
+        self.touch(CORE_SECTION)
+    
+    def record_domain_block(self, record: Dict[str, Any]):
+        """Добавление блокировки домена в журнал и в окно истории блокировок"""
+        self.domain_block_history.append(record)
+        del self.domain_block_history[:-DOMAIN_HISTORY_WINDOW]
+        self._log(LOG_DOMAIN_BLOCK, record, record.get('blocked_turn'))
+        self.touch(CORE_SECTION, 'domain_block_history')
+    
+    def add_domain(self, domain: str):
+        """Добавление домена в список доступных (последние AVAILABLE_DOMAINS_WINDOW)"""
+        if domain in self.available_domains:
+            return
+        self.available_domains.append(domain)
+        del self.available_domains[:-AVAILABLE_DOMAINS_WINDOW]
+        self._log(LOG_DOMAIN, domain)
+        self.touch(CORE_SECTION)
+    
+    def record_action(self, action: str, params: Dict[str, Any]):
+        """Запись действия игрока в журнал"""
+        self._log(LOG_ACTION, {'action': action, 'params': params})
+        self.touch(CORE_SECTION)  # log_seq хранится в основной секции
+    
+    def snapshot_due(self, interval: int) -> bool:
+        """Нужен ли новый снимок состояния (раз в interval ходов)"""
+        return self._snapshot_turn < 0 or self.current_turn - self._snapshot_turn >= interval
+    
+    def mark_snapshot(self, turn: int):
+        """Отметка записи снимка состояния на указанном ходу"""
+        self._snapshot_turn = max(self._snapshot_turn, turn)
+    
+    def derived(self) -> DerivedMetrics:
+        """Производные метрики; при первом обращении и после сброса пересчитываются"""
+        derived = self._derived
+        if derived is None:
+            derived = self._derived = DerivedMetrics.compute(self)
+        elif consistency_check_enabled():
+            derived.verify(self)
+        return derived
+    
+    def drop_derived(self):
+        """Сброс производных метрик после изменения исходных полей в обход действий"""
+        self._derived = None
+    
+    def turn_timers(self) -> TimerWheel:
+        """Таймеры игры по ходам; при первом обращении строятся из состояния"""
+        if self._turn_timers is None:
+            self._turn_timers = TimerWheel(now=self.current_turn)
+            for key in self.marketing.campaigns:
+                self.schedule_campaign_end(key)
+        return self._turn_timers
+    
+    def schedule_campaign_end(self, key: str):
+        """Таймер окончания кампании: первый ход, на котором она уже не действует"""
+        end_turn = campaign_end_turn(self.marketing.campaigns[key]) + 1
+        self.turn_timers().schedule((TIMER_CAMPAIGN_END, key), end_turn, key)
+    
+    def link_last_event(self):
+        """Восстановление связи last_event с последним событием окна после загрузки
+        
+        В памяти это один объект (выбор в событии отмечается и в окне), а при
+        сериализации он записывается дважды.
+        """
+        if self.recent_events and self.last_event is not None and self.last_event == self.recent_events[-1]:
+            self.last_event = self.recent_events[-1]
+    
+    def take_log(self) -> List[Tuple[int, int, str, Any]]:
+        """Извлечение незаписанных записей журнала"""
+        log, self._pending_log = self._pending_log, []
+        return log
+    
+    def restore_log(self, log: List[Tuple[int, int, str, Any]]):
+        """Возврат записей журнала после неудачной записи"""
+        self._pending_log[:0] = log
+    
+    def pending_log(self) -> List[Tuple[int, int, str, Any]]:
+        """Записи журнала, еще не записанные в базу"""
+        return list(self._pending_log)
+    
+    def compact_history(self) -> bool:
+        """Перенос истории из состояний старого формата в журнал
+        
+        До появления журнала история хранилась в состоянии целиком. Она
+        переносится в журнал, а в состоянии остаются только окна.
+        """
+        if self.log_seq or not (self.recent_events or self.domain_block_history or len(self.available_domains) > 1):
+            return False
+        
+        for event in self.recent_events:
+            self._log(LOG_EVENT, event.model_dump(), 0)  # Ход старых событий неизвестен
+            if event.resolved and event.choice_index is not None:
+                self._log(LOG_EVENT_CHOICE, {'event_type': event.event_type, 'choice_index': event.choice_index}, 0)
+        for record in self.domain_block_history:
+            self._log(LOG_DOMAIN_BLOCK, record, record.get('blocked_turn', 0))
+        for domain in self.available_domains:
+            self._log(LOG_DOMAIN, domain, 0)
+        
+        del self.recent_events[:-RECENT_EVENTS_WINDOW]
+        del self.domain_block_history[:-DOMAIN_HISTORY_WINDOW]
+        del self.available_domains[:-AVAILABLE_DOMAINS_WINDOW]
+        self.touch(CORE_SECTION, 'recent_events', 'domain_block_history')
+        return True
+    
+    @staticmethod
+    def merge_sections(sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Сборка данных состояния из сохраненных секций"""
+        data = dict(sections.get(CORE_SECTION) or {})
+        data.update((section, value) for section, value in sections.items() if section != CORE_SECTION)
+        return data
+
+_section_adapters: Dict[str, TypeAdapter] = {}
+
+def parse_section(section: str, data: Any) -> Any:
+    """Валидация данных одной секции состояния"""
+    adapter = _section_adapters.get(section)
+    if adapter is None:
+        adapter = TypeAdapter(GameState.model_fields[section].annotation)
+        _section_adapters[section] = adapter
+    return adapter.validate_python(data)
+
+class GameStateView:
+    """Частично загруженное состояние игры для экранов только для чтения
+    
+    Содержит поля секции "core" (если она загружена) и загруженные секции.
+    Обращение к незагруженной секции вызывает AttributeError.
+    """
+    
+    def __init__(self, sections: Dict[str, Any]):
+        self.__dict__.update(sections.get(CORE_SECTION) or {})
+        for section, data in sections.items():
+            if section != CORE_SECTION:
+                self.__dict__[section] = parse_section(section, data)
+
+# Доверенная сборка моделей без валидации.
+# Используется для записей, созданных нашими же кодеками: данные уже прошли
+# валидацию при создании, поэтому достаточно восстановить типы (модели,
+# перечисления, даты, кортежи). Для импорта и миграций остается полная валидация.
+
+_converters: Dict[Any, Optional[Callable[[Any], Any]]] = {}
+
+def _build_converter(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """Построение функции восстановления типа для аннотации (None - значение не меняется)"""
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin is Union:
+        inner = [_get_converter(arg) for arg in args if arg is not type(None)]
+        convert = inner[0] if len(inner) == 1 else None
+        if convert is None:
+            return None
+        return lambda value: None if value is None else convert(value)
+
+    if origin in (list, List):
+        convert = _get_converter(args[0]) if args else None
+        if convert is None:
+            return None
+        return lambda value: [convert(item) for item in value]
+
+    if origin in (tuple, Tuple):
+        converts = [_get_converter(arg) for arg in args]
+        if not any(converts):
+            return tuple
+        return lambda value: tuple(c(item) if c else item for c, item in zip(converts, value))
+
+    if origin in (dict, Dict):
+        convert_key = _get_converter(args[0]) if args else None
+        convert_value = _get_converter(args[1]) if args else None
+        if convert_key is None and convert_value is None:
+            return None
+        convert_key = convert_key or (lambda key: key)
+        convert_value = convert_value or (lambda value: value)
+        return lambda value: {convert_key(k): convert_value(v) for k, v in value.items()}
+
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            return lambda value: value if isinstance(value, annotation) else construct_trusted(annotation, value)
+        if issubclass(annotation, Enum):
+            return lambda value: value if isinstance(value, annotation) else annotation(value)
+        if issubclass(annotation, datetime):
+            return lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+
+    return None
+
+def _get_converter(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """Кэшированная функция восстановления типа"""
+    if annotation not in _converters:
+        _converters[annotation] = None  # Защита от рекурсии при построении
+        _converters[annotation] = _build_converter(annotation)
+    return _converters[annotation]
+
+# Для каждой модели: поля, требующие восстановления типа, и полный набор имен полей
+_model_plans: Dict[type, Tuple[List[Tuple[str, Callable[[Any], Any]]], frozenset]] = {}
+
+def construct_trusted(model: type, data: Dict[str, Any]) -> Any:
+    """Рекурсивная сборка модели из доверенных данных без валидации
+
+    Словарь data используется как __dict__ модели и изменяется на месте,
+    поэтому передавать нужно только свежедекодированные данные.
+    """
+    plan = _model_plans.get(model)
+    if plan is None:
+        converters = []
+        for name, field in model.model_fields.items():
+            convert = _get_converter(field.annotation)
+            if convert is not None:
+                converters.append((name, convert))
+        plan = (converters, frozenset(model.model_fields))
+        _model_plans[model] = plan
+    converters, names = plan
+
+    if data.keys() != names:
+        # Запись другой версии схемы - ее приводит к текущей полная валидация
+        return model.model_validate(data)
+
+    for name, convert in converters:
+        value = data[name]
+        if value is not None:
+            data[name] = convert(value)
+
+    instance = model.__new__(model)
+    object.__setattr__(instance, '__dict__', data)
+    object.__setattr__(instance, '__pydantic_fields_set__', set(names))
+    object.__setattr__(instance, '__pydantic_extra__', None)
+    if model.__pydantic_post_init__:
+        instance.model_post_init(None)  # Инициализация приватных атрибутов
+    else:
+        object.__setattr__(instance, '__pydantic_private__', None)
+    return instance
+
+_IMMUTABLE_TYPES = (int, float, str, bool, type(None), Enum, datetime, tuple, frozenset)
+
+def _clone_value(value: Any) -> Any:
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, BaseModel):
+        return _clone_model(value)
+    if isinstance(value, dict):
+        return {key: _clone_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone_value(item) for item in value]
+    return copy.deepcopy(value)
+
+def _clone_model(model: BaseModel) -> BaseModel:
+    instance = model.__class__.__new__(model.__class__)
+    object.__setattr__(instance, '__dict__', {name: _clone_value(value) for name, value in model.__dict__.items()})
+    object.__setattr__(instance, '__pydantic_fields_set__', set(model.__pydantic_fields_set__))
+    object.__setattr__(instance, '__pydantic_extra__', None)
+    private = model.__pydantic_private__
+    if private is not None:
+        # Списки и словари копируются, кэши (таймеры, производные метрики) строятся заново
+        private = {name: (value.copy() if isinstance(value, (dict, list)) else
+                          value if isinstance(value, _IMMUTABLE_TYPES) else None)
+                   for name, value in private.items()}
+    object.__setattr__(instance, '__pydantic_private__', private)
+    return instance
+
+def clone_game_state(game_state: GameState) -> GameState:
+    """Быстрая независимая копия состояния игры (без валидации и deepcopy)
+
+    Для расчетов на копиях: поиска плана, прогнозов. Кэши копии строятся
+    заново при первом обращении.
+    """
+    clone = _clone_model(game_state)
+    clone.link_last_event()
+    return clone
 
 class GameAction(BaseModel):
     """Модель игрового действия"""
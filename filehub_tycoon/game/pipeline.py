@@ -0,0 +1,122 @@
+# Конвейер хода игры
+#
+# Ход - последовательность именованных стадий, которые читают и пишут общий
+# контекст хода. Стадии можно отключать для экспериментов и бенчмарков.
+# Замер времени включается отдельно: без него конвейер не обращается к
+# таймеру, с ним по каждой стадии копятся число вызовов, суммарное время и
+# гистограмма длительностей по степеням двойки в микросекундах.
+
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+HISTOGRAM_BUCKETS = 24  # Последняя корзина - от 2^22 мкс (~4 с) и дольше
+
+class TurnContext:
+    """Общий контекст одного хода"""
+
+    __slots__ = ('game_state', 'force_event', 'results', 'changes')
+
+    def __init__(self, game_state, force_event: bool = False):
+        self.game_state = game_state
+        self.force_event = force_event
+        self.results = {
+            'events': [],
+            'metrics_changed': {},
+            'new_events': [],
+            'status': 'success'
+        }
+        self.changes: Dict[str, Any] = {}  # Изменения текущей стадии (очищается перед каждой)
+
+class StageStats:
+    """Счетчики времени одной стадии"""
+
+    __slots__ = ('calls', 'total', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0  # Секунды
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.total += seconds
+        microseconds = seconds * 1e6
+        bucket = math.frexp(microseconds)[1] if microseconds >= 1 else 0
+        self.histogram[min(bucket, HISTOGRAM_BUCKETS - 1)] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'total_ms': self.total * 1e3,
+            'mean_us': self.total / self.calls * 1e6 if self.calls else 0.0,
+            'histogram': {f"<{1 << bucket}us": count for bucket, count in enumerate(self.histogram) if count}
+        }
+
+class TurnPipeline:
+    """Упорядоченные стадии хода с отключением и замером времени"""
+
+    def __init__(self):
+        self._stages: List[tuple] = []  # (имя, функция стадии)
+        self._active: List[tuple] = []  # Включенные стадии в порядке выполнения
+        self.disabled = set()
+        self.stats: Dict[str, StageStats] = {}
+        self.profiling = False
+
+    def add_stage(self, name: str, func: Callable[[TurnContext], None], before: Optional[str] = None):
+        """Регистрация стадии в конце конвейера или перед стадией before"""
+        if any(stage_name == name for stage_name, _ in self._stages):
+            raise ValueError(f"Стадия {name} уже зарегистрирована")
+        index = len(self._stages)
+        if before is not None:
+            index = self.stage_names().index(before)
+        self._stages.insert(index, (name, func))
+        self._refresh()
+
+    def stage_names(self) -> List[str]:
+        return [name for name, _ in self._stages]
+
+    def set_enabled(self, name: str, enabled: bool = True):
+        """Включение или отключение стадии"""
+        if name not in self.stage_names():
+            raise ValueError(f"Неизвестная стадия хода: {name}")
+        if enabled:
+            self.disabled.discard(name)
+        else:
+            self.disabled.add(name)
+        self._refresh()
+
+    @property
+    def all_enabled(self) -> bool:
+        return not self.disabled
+
+    def _refresh(self):
+        self._active = [(name, func) for name, func in self._stages if name not in self.disabled]
+
+    def enable_profiling(self, enabled: bool = True):
+        """Включение замера времени стадий (счетчики при этом сбрасываются)"""
+        self.profiling = enabled
+        self.stats = {}
+
+    def run(self, context: TurnContext) -> TurnContext:
+        """Выполнение включенных стадий по порядку"""
+        if not self.profiling:
+            for _, func in self._active:
+                func(context)
+            return context
+
+        perf_counter = time.perf_counter
+        stats = self.stats
+        for name, func in self._active:
+            start = perf_counter()
+            func(context)
+            elapsed = perf_counter() - start
+            stage_stats = stats.get(name)
+            if stage_stats is None:
+                stage_stats = stats[name] = StageStats()
+            stage_stats.add(elapsed)
+        return context
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Собранные счетчики по стадиям в порядке выполнения"""
+        return {name: self.stats[name].as_dict() for name in self.stage_names() if name in self.stats}
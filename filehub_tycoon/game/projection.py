@@ -0,0 +1,119 @@
+# Прогноз покупки перед подтверждением
+#
+# Для покупки из меню /upgrade и /marketing считается распределение бюджета
+# и пользователей через несколько ходов - с покупкой и без нее. Из состояния
+# делаются две опорные копии (clone_game_state), к одной применяется
+# покупка, и каждая размножается на K будущих. Будущее k в обеих ветках
+# получает одно и то же зерно из отдельного потока, поэтому разница веток -
+# эффект покупки, а не разные случайности; настоящее будущее игры прогноз
+# не видит. Все 2K копий считаются пакетным ходом (process_turn_batch),
+# закончившиеся партии выбывают. Неотвеченные события остаются как есть.
+#
+# Прогнозы запоминаются по (игрок, версия состояния, покупка): повторное
+# открытие той же покупки без изменений игры считается один раз.
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from game import rng
+from game.advisor import Action, apply_action
+from game.models import GameState, clone_game_state
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_STREAM = 0xA54FF53A5F1D36F1  # Сдвиг зерна для будущих прогноза
+QUANTILES = (0.1, 0.5, 0.9)
+CACHE_LIMIT = 1000                      # Запомненных прогнозов
+
+def quantiles(values: List[float]) -> List[float]:
+    """Квантили QUANTILES выборки (ближайший ранг)"""
+    ordered = sorted(values)
+    return [ordered[round(q * (len(ordered) - 1))] for q in QUANTILES]
+
+def _summary(game_states: List[GameState], outcomes: List[str]) -> Dict[str, Any]:
+    """Распределение итогов одной ветки прогноза"""
+    futures = len(game_states)
+    return {
+        'budget': quantiles([game_state.budget for game_state in game_states]),
+        'users': quantiles([game_state.active_users for game_state in game_states]),
+        'win_rate': outcomes.count('win') / futures,
+        'lose_rate': outcomes.count('lose') / futures
+    }
+
+def project_purchase(engine, game_state: GameState, action: Action, futures: int = 64,
+                     turns: int = 10) -> Optional[Dict[str, Any]]:
+    """Прогноз на turns ходов по futures будущим без покупки и с ней
+
+    None - покупка недоступна (не хватает бюджета или неизвестное действие).
+    """
+    start = time.perf_counter()
+    purchased = clone_game_state(game_state)
+    if not apply_action(purchased, engine.config, action):
+        return None
+
+    branches = []
+    for base in (game_state, purchased):
+        branch = []
+        for future in range(futures):
+            clone = clone_game_state(base)
+            clone.rng_seed = rng.stream_value(game_state.rng_seed ^ PROJECTION_STREAM, future)
+            branch.append(clone)
+        branches.append(branch)
+
+    states = branches[0] + branches[1]
+    outcomes = ['success'] * len(states)
+    alive = list(range(len(states)))
+    for _ in range(turns):
+        results = engine.process_turn_batch([states[index] for index in alive])
+        still_alive = []
+        for index, result in zip(alive, results):
+            status = result.get('status')
+            if status == 'success':
+                # Переход к следующему ходу как в симуляторе: кампании копий отбираются
+                # по номеру хода, переносить их в итоги не нужно
+                states[index].current_turn += 1
+                still_alive.append(index)
+            else:
+                outcomes[index] = status
+        alive = still_alive
+        if not alive:
+            break
+
+    return {
+        'action': action,
+        'turns': turns,
+        'futures': futures,
+        'base': _summary(branches[0], outcomes[:futures]),
+        'purchase': _summary(branches[1], outcomes[futures:]),
+        'elapsed_ms': (time.perf_counter() - start) * 1000
+    }
+
+class PurchaseProjector:
+    """Прогнозы покупок с запоминанием по версии состояния"""
+
+    def __init__(self, engine, futures: int = 64, turns: int = 10):
+        self.engine = engine
+        self.futures = futures
+        self.turns = turns
+        self._cache: Dict[Tuple[int, int, Action], Optional[Dict[str, Any]]] = {}
+        self.stats = {'projections': 0, 'cache_hits': 0}
+
+    def projection(self, game_state: GameState, action: Action) -> Optional[Dict[str, Any]]:
+        """Прогноз покупки для текущего состояния игры (None - покупка недоступна или ошибка)"""
+        key = (game_state.user_id, game_state.version, action)
+        if key in self._cache:
+            self.stats['cache_hits'] += 1
+            return self._cache[key]
+
+        try:
+            result = project_purchase(self.engine, game_state, action, self.futures, self.turns)
+        except Exception as e:
+            logger.error(f"Ошибка прогноза покупки {action} для пользователя {game_state.user_id}: {e}")
+            return None
+
+        self.stats['projections'] += 1
+        self._cache[key] = result
+        if len(self._cache) > CACHE_LIMIT:
+            self._cache.pop(next(iter(self._cache)))
+        return result
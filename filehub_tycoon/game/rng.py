@@ -0,0 +1,105 @@
+# Детерминированные случайные числа отдельной игры
+#
+# У каждой игры свое зерно (GameState.rng_seed). Случайные величины хода -
+# элементы потока SplitMix64 с номером turn * TURN_SLOTS + slot: каждая
+# величина хода имеет свой фиксированный слот, поэтому любой ход можно
+# воспроизвести по зерну и номеру хода, не повторяя предыдущие, а скалярный
+# и пакетный движки получают одни и те же значения. Пакетный путь считает
+# блок величин для всех игр сразу (turn_block).
+#
+# Случайность вне хода (генерация названий) берется из отдельного потока по
+# счетчику GameState.rng_counter.
+
+import random
+import secrets
+from typing import Sequence, Any
+
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+MISC_STREAM = 0x6A09E667F3BCC909  # Сдвиг зерна для потока вне хода
+
+# Слоты величин хода; новые величины добавляются в свободные слоты
+SLOT_EVENT_ROLL = 0        # Наступит ли случайное событие
+SLOT_EVENT_TYPE = 1        # Тип случайного события
+SLOT_BLOCK_ROLL = 2        # Блокировка домена
+SLOT_BLOCK_NEXT_CHECK = 3  # Через сколько ходов следующая проверка блокировки
+SLOT_BLOCK_REASON = 4      # Причина блокировки
+SLOT_GROWTH = 5            # Базовый рост пользователей
+SLOT_RETENTION = 6         # Изменение удержания
+SLOT_NPS = 7               # Изменение NPS
+SLOT_LEGAL_RISK = 8        # Изменение юридического риска
+# Догоняние пропущенных ходов (game/idle.py): величины отрезка, начинающегося с хода
+SLOT_IDLE_EVENT = 9        # Через сколько ходов случайное событие
+SLOT_IDLE_GROWTH = 10      # Суммарный рост пользователей
+SLOT_IDLE_RETENTION = 11   # Суммарное изменение удержания
+SLOT_IDLE_NPS = 12         # Суммарное изменение NPS
+SLOT_IDLE_LEGAL = 13       # Суммарное изменение юридического риска
+TURN_SLOTS = 16
+
+def new_seed() -> int:
+    """Зерно новой игры (63 бита - помещается в INTEGER SQLite)"""
+    return secrets.randbits(63)
+
+def mix64(z: int) -> int:
+    """Финальное перемешивание SplitMix64"""
+    z = ((z ^ (z >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    return z ^ (z >> 31)
+
+def stream_value(seed: int, index: int) -> int:
+    """64-битный элемент потока SplitMix64 с заданным номером"""
+    return mix64((seed + (index + 1) * GAMMA) & MASK64)
+
+def to_unit(value: int) -> float:
+    """Равномерное число в [0, 1) из 64-битного значения"""
+    return (value >> 11) * (1.0 / (1 << 53))
+
+def turn_random(seed: int, turn: int, slot: int) -> float:
+    """Случайное число в [0, 1) для слота хода"""
+    return to_unit(stream_value(seed, turn * TURN_SLOTS + slot))
+
+def turn_uniform(seed: int, turn: int, slot: int, low: float, high: float) -> float:
+    """Равномерное число в [low, high) для слота хода"""
+    return low + (high - low) * turn_random(seed, turn, slot)
+
+def turn_randint(seed: int, turn: int, slot: int, low: int, high: int) -> int:
+    """Целое число в [low, high] для слота хода"""
+    return low + int(turn_random(seed, turn, slot) * (high - low + 1))
+
+def turn_choice(seed: int, turn: int, slot: int, options: Sequence[Any]) -> Any:
+    """Случайный элемент последовательности для слота хода"""
+    return options[int(turn_random(seed, turn, slot) * len(options))]
+
+def turn_block(seeds: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    """Все слоты хода для пачки игр: массив (игр, TURN_SLOTS) чисел в [0, 1)
+
+    Значения совпадают с turn_random для тех же зерна, хода и слота.
+    """
+    seeds = np.asarray(seeds, dtype=np.uint64)
+    turns = np.asarray(turns, dtype=np.uint64)
+    index = turns[:, None] * np.uint64(TURN_SLOTS) + np.arange(1, TURN_SLOTS + 1, dtype=np.uint64)
+    z = seeds[:, None] + index * np.uint64(GAMMA)  # Арифметика uint64 по модулю 2^64
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+def block_uniform(block: np.ndarray, slot: int, low: float, high: float) -> np.ndarray:
+    """Равномерные числа в [low, high) из блока (как turn_uniform)"""
+    return low + (high - low) * block[:, slot]
+
+def block_randint(block: np.ndarray, slot: int, low: int, high: int) -> np.ndarray:
+    """Целые числа в [low, high] из блока (как turn_randint)"""
+    return low + (block[:, slot] * (high - low + 1)).astype(np.int64)
+
+def misc_seed(seed: int, counter: int) -> int:
+    """Зерно для случайности вне хода с номером counter"""
+    return stream_value(seed ^ MISC_STREAM, counter)
+
+def misc_random(seed: int, counter: int) -> random.Random:
+    """Генератор для одного действия вне хода (например, генерации названий)"""
+    return random.Random(misc_seed(seed, counter))
@@ -0,0 +1,350 @@
+# Симулятор партий для проверки игрового баланса
+#
+# Партии играются без бота и базы данных: движок GameEngine плюс политика
+# игрока (сценарий действий). Партии делятся на пачки, каждая пачка играется
+# в отдельном процессе со своим зерном генераторов, результаты пачек
+# складываются в общую сводку по мере готовности.
+#
+# По умолчанию партии доигрываются до последнего хода, как в боте: бот не
+# останавливает игру при победе или поражении. Начальная партия (2-3
+# пользователя) формально проиграна уже на первом ходу (меньше 100
+# пользователей), поэтому поражением считается только проигрышное состояние
+# в конце партии; игра, выбравшаяся из него, поражением не считается.
+
+import math
+import random
+from multiprocessing import Pool
+from typing import Optional, Dict, Any, List, Callable, Iterator
+
+import numpy as np
+
+from game import actions
+from game.game_engine import GameEngine
+from game.models import GameState
+from utils.config import Config
+
+SUMMARY_VERSION = 2  # Смысл полей сводки; входит в ключи сохраненных результатов (game/tuning.py)
+
+# Границы гистограмм: значения хранятся в знаковой логарифмической шкале,
+# BINS_PER_DECADE корзин на порядок, от -10^MAX_DECADE до 10^MAX_DECADE
+BINS_PER_DECADE = 10
+MAX_DECADE = 15
+HISTOGRAM_BINS = 2 * BINS_PER_DECADE * MAX_DECADE + 1
+
+def to_bin(value: float) -> int:
+    """Номер корзины знаковой логарифмической гистограммы"""
+    if -1 < value < 1:
+        return BINS_PER_DECADE * MAX_DECADE
+    offset = min(BINS_PER_DECADE * MAX_DECADE, int(math.log10(abs(value)) * BINS_PER_DECADE) + 1)
+    return BINS_PER_DECADE * MAX_DECADE + (offset if value > 0 else -offset)
+
+def to_bins(values: np.ndarray) -> np.ndarray:
+    """Векторный вариант to_bin"""
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    offset = np.zeros(values.shape, dtype=np.int64)
+    large = magnitude >= 1
+    offset[large] = np.minimum(BINS_PER_DECADE * MAX_DECADE,
+                               (np.log10(magnitude[large]) * BINS_PER_DECADE).astype(np.int64) + 1)
+    return BINS_PER_DECADE * MAX_DECADE + np.where(values < 0, -offset, offset)
+
+def bin_value(index: int) -> float:
+    """Нижняя граница корзины (для оценки квантилей)"""
+    offset = index - BINS_PER_DECADE * MAX_DECADE
+    if offset == 0:
+        return 0.0
+    magnitude = 10 ** ((abs(offset) - 1) / BINS_PER_DECADE)
+    return magnitude if offset > 0 else -magnitude
+
+def histogram_quantile(histogram: np.ndarray, q: float) -> Optional[float]:
+    """Приближенный квантиль по гистограмме"""
+    total = histogram.sum()
+    if total == 0:
+        return None
+    index = int(np.searchsorted(np.cumsum(histogram), q * total, side='left'))
+    return bin_value(min(index, len(histogram) - 1))
+
+# Политики игрока: вызываются перед каждым ходом и тратят действия хода
+
+def idle_policy(game_state: GameState, config: Config, rng: random.Random):
+    """Игрок только нажимает /next"""
+
+def random_policy(game_state: GameState, config: Config, rng: random.Random):
+    """Случайные доступные действия"""
+    options = [
+        lambda: actions.buy_staff(game_state, config, rng.choice(list(config.STAFF_SALARIES))),
+        lambda: actions.buy_upgrade(game_state, config, rng.choice(list(actions.UPGRADE_COST_KEYS)), 'advanced'),
+        lambda: actions.buy_campaign(game_state, config, rng.choice(list(config.MARKETING_COSTS)),
+                                     rng.choice(['small', 'medium', 'large'])),
+        lambda: actions.buy_hosting(game_state, config, rng.choice(list(config.HOSTING_COSTS)))
+    ]
+    while game_state.actions_remaining > 0:
+        game_state.actions_remaining -= 1
+        if rng.random() < 0.5:
+            rng.choice(options)()
+
+def greedy_policy(game_state: GameState, config: Config, rng: random.Random):
+    """Сценарий: команда, затем инфраструктура, затем маркетинг при запасе бюджета"""
+    plan = [
+        lambda: actions.buy_staff(game_state, config, 'CTO'),
+        lambda: actions.buy_staff(game_state, config, 'CMO'),
+        lambda: actions.buy_upgrade(game_state, config, 'server', 'advanced'),
+        lambda: actions.buy_upgrade(game_state, config, 'bandwidth', 'advanced'),
+        lambda: actions.buy_staff(game_state, config, 'CLO'),
+        lambda: actions.buy_upgrade(game_state, config, 'security', 'advanced')
+    ]
+    reserve = 3 * game_state.expenses.total_expenses  # Запас на несколько ходов расходов
+    for step in plan:
+        if game_state.actions_remaining <= 0 or game_state.budget <= reserve:
+            return
+        if step():
+            game_state.actions_remaining -= 1
+            reserve = 3 * game_state.expenses.total_expenses
+
+    if game_state.actions_remaining > 0 and game_state.budget > reserve + config.get_marketing_cost('social_media', 'medium'):
+        if actions.buy_campaign(game_state, config, 'social_media', 'medium'):
+            game_state.actions_remaining -= 1
+
+POLICIES: Dict[str, Callable[[GameState, Config, random.Random], None]] = {
+    'idle': idle_policy,
+    'random': random_policy,
+    'greedy': greedy_policy
+}
+
+class SimulationSummary:
+    """Сводка результатов партий (складывается из сводок пачек)"""
+
+    LOSE_REASONS = ('budget', 'legal', 'users')
+
+    def __init__(self, turns: int):
+        self.turns = turns
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.lose_reasons = {reason: 0 for reason in self.LOSE_REASONS}
+        self.win_turns = np.zeros(turns + 1, dtype=np.int64)          # Ход первой победы
+        self.lose_turns = np.zeros(turns + 1, dtype=np.int64)         # Ход поражения (с доигрыванием - начало последней серии)
+        self.bankruptcy_turns = np.zeros(turns + 1, dtype=np.int64)   # Ход, когда бюджет впервые <= 0
+        self.score_histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.score_sum = 0
+        self.score_max = 0
+        self.alive = np.zeros(turns + 1, dtype=np.int64)              # Партий, сыгравших ход
+        self.budget_histograms = np.zeros((turns + 1, HISTOGRAM_BINS), dtype=np.int64)
+
+    def merge(self, other: "SimulationSummary"):
+        """Добавление сводки другой пачки"""
+        self.games += other.games
+        self.wins += other.wins
+        self.losses += other.losses
+        for reason, count in other.lose_reasons.items():
+            self.lose_reasons[reason] += count
+        self.win_turns += other.win_turns
+        self.lose_turns += other.lose_turns
+        self.bankruptcy_turns += other.bankruptcy_turns
+        self.score_histogram += other.score_histogram
+        self.score_sum += other.score_sum
+        self.score_max = max(self.score_max, other.score_max)
+        self.alive += other.alive
+        self.budget_histograms += other.budget_histograms
+
+    def record_turn(self, turn: int, budgets: List[int]):
+        """Учет бюджетов партий после хода"""
+        self.alive[turn] += len(budgets)
+        np.add.at(self.budget_histograms[turn], to_bins(budgets), 1)
+
+    def record_game(self, score: int, win_turn: Optional[int], lose_turn: Optional[int],
+                    lose_reason: Optional[str], bankruptcy_turn: Optional[int]):
+        """Учет завершенной партии"""
+        self.games += 1
+        if win_turn is not None:
+            self.wins += 1
+            self.win_turns[win_turn] += 1
+        if lose_turn is not None:
+            self.losses += 1
+            self.lose_turns[lose_turn] += 1
+            self.lose_reasons[lose_reason] += 1
+        if bankruptcy_turn is not None:
+            self.bankruptcy_turns[bankruptcy_turn] += 1
+        self.score_histogram[to_bin(score)] += 1
+        self.score_sum += score
+        self.score_max = max(self.score_max, score)
+
+    @staticmethod
+    def _mean_turn(histogram: np.ndarray) -> Optional[float]:
+        total = histogram.sum()
+        return float((histogram * np.arange(len(histogram))).sum() / total) if total else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сводка в виде словаря (для вывода и сохранения в JSON)"""
+        checkpoints = sorted({t for t in (1, 10, 25, 50, 75, self.turns) if 1 <= t <= self.turns})
+        return {
+            'games': self.games,
+            'win_rate': self.wins / self.games if self.games else 0.0,
+            'lose_rate': self.losses / self.games if self.games else 0.0,
+            'lose_reasons': dict(self.lose_reasons),
+            'mean_win_turn': self._mean_turn(self.win_turns),
+            'mean_lose_turn': self._mean_turn(self.lose_turns),
+            'bankruptcy_rate': int(self.bankruptcy_turns.sum()) / self.games if self.games else 0.0,
+            'mean_bankruptcy_turn': self._mean_turn(self.bankruptcy_turns),
+            'score': {
+                'mean': self.score_sum / self.games if self.games else 0.0,
+                'p10': histogram_quantile(self.score_histogram, 0.1),
+                'p50': histogram_quantile(self.score_histogram, 0.5),
+                'p90': histogram_quantile(self.score_histogram, 0.9),
+                'max': self.score_max
+            },
+            'budget': {
+                turn: {
+                    'games': int(self.alive[turn]),
+                    'p10': histogram_quantile(self.budget_histograms[turn], 0.1),
+                    'p50': histogram_quantile(self.budget_histograms[turn], 0.5),
+                    'p90': histogram_quantile(self.budget_histograms[turn], 0.9)
+                }
+                for turn in checkpoints
+            }
+        }
+
+def lose_reason(game_state: GameState) -> str:
+    """Причина поражения (в порядке проверки GameEngine._check_lose_conditions)"""
+    if game_state.budget <= 0:
+        return 'budget'
+    if game_state.legal.risk_level >= 100:
+        return 'legal'
+    return 'users'
+
+def new_game(user_id: int, turns: int, rng_seed: int) -> GameState:
+    """Начальное состояние партии (как после /start и выбора названия)"""
+    return GameState(
+        user_id=user_id,
+        rng_seed=rng_seed,
+        tracker_name="Симуляция",
+        site_name="Симуляция",
+        domain_name="simulation.com",
+        setup_complete=True,
+        name_setup_step="complete",
+        total_turns=turns
+    )
+
+def simulate_chunk(games: int, turns: int, seed: int, policy: str = 'random', engine: str = 'batch',
+                   play_through: bool = True, config: Optional[Config] = None) -> SimulationSummary:
+    """Симуляция пачки партий в текущем процессе
+
+    С play_through (по умолчанию) партия доигрывается до последнего хода, как
+    в боте, и поражение - ходы подряд со статусом 'lose' в конце партии. Без
+    него партия заканчивается первой победой или поражением (новая партия
+    проигрывает на первом ходу, если политика не наберет 100 пользователей).
+    """
+    config = config or Config()
+    game_engine = GameEngine()
+    game_engine.config = config
+    policy_func = POLICIES[policy]
+
+    # Зерна партий (ходы считаются по ним, game/rng.py) и отдельный поток игрока
+    sequence = np.random.SeedSequence(seed)
+    game_seeds = (sequence.generate_state(games, dtype=np.uint64) >> np.uint64(1)).tolist()
+    player_rng = random.Random(int(sequence.spawn(1)[0].generate_state(1)[0]))
+
+    summary = SimulationSummary(turns)
+    states = [new_game(index, turns, game_seed) for index, game_seed in enumerate(game_seeds)]
+    outcome = [{'win': None, 'lose': None, 'reason': None, 'bankrupt': None} for _ in range(games)]
+    alive = list(range(games))
+
+    for turn in range(1, turns + 1):
+        playing = [states[index] for index in alive]
+
+        # Ход игрока: ответ на событие и действия
+        for game_state in playing:
+            event = game_state.last_event
+            if event and not event.resolved:
+                game_engine.handle_event_choice(game_state, player_rng.randrange(len(event.choices)))
+            policy_func(game_state, config, player_rng)
+
+        if engine == 'batch':
+            results = game_engine.process_turn_batch(playing)
+        else:
+            results = [game_engine.process_turn(game_state) for game_state in playing]
+
+        still_alive = []
+        for index, game_state, result in zip(alive, playing, results):
+            record = outcome[index]
+            if record['bankrupt'] is None and game_state.budget <= 0:
+                record['bankrupt'] = turn
+            if result['status'] == 'win' and record['win'] is None:
+                record['win'] = turn
+            if result['status'] == 'lose':
+                if record['lose'] is None:
+                    record['lose'] = turn
+                    record['reason'] = lose_reason(game_state)
+            elif play_through:
+                # Игра выбралась из проигрышного состояния
+                record['lose'] = record['reason'] = None
+
+            finished = record['win'] is not None or record['lose'] is not None
+            if finished and not play_through:
+                summary.record_game(game_engine.calculate_score(game_state), record['win'], record['lose'],
+                                    record['reason'], record['bankrupt'])
+            else:
+                still_alive.append(index)
+
+            # Переход к следующему ходу (как advance_turn); журнал событий не нужен
+            game_state.current_turn += 1
+            game_state.actions_remaining = 3
+            game_state.take_log()
+
+        summary.record_turn(turn, [game_state.budget for game_state in playing])
+        alive = still_alive
+        if not alive:
+            break
+
+    for index in alive:
+        record = outcome[index]
+        summary.record_game(game_engine.calculate_score(states[index]), record['win'], record['lose'],
+                            record['reason'], record['bankrupt'])
+    return summary
+
+def chunk_tasks(games: int, turns: int, seed: int = 0, policy: str = 'random', engine: str = 'batch',
+                play_through: bool = True, chunk_size: int = 500, config: Optional[Config] = None) -> List[tuple]:
+    """Разбиение партий на пачки с аргументами simulate_chunk
+
+    Зерна пачек - префикс одной последовательности: при увеличении числа
+    партий первые пачки остаются теми же.
+    """
+    chunk_seeds = np.random.SeedSequence(seed).generate_state(math.ceil(games / chunk_size))
+    tasks = []
+    for chunk, chunk_seed in enumerate(chunk_seeds):
+        chunk_games = min(chunk_size, games - chunk * chunk_size)
+        tasks.append((chunk_games, turns, int(chunk_seed), policy, engine, play_through, config))
+    return tasks
+
+def _simulate_task(item: tuple) -> tuple:
+    """Точка входа процесса пула"""
+    key, task = item
+    return key, simulate_chunk(*task)
+
+def map_chunks(items: List[tuple], workers: Optional[int] = None) -> Iterator[tuple]:
+    """Симуляция пачек на пуле процессов
+
+    items - пары (ключ, аргументы simulate_chunk); пары (ключ, сводка)
+    возвращаются по мере готовности.
+    """
+    if workers == 1:
+        for item in items:
+            yield _simulate_task(item)
+        return
+
+    with Pool(processes=workers) as pool:
+        yield from pool.imap_unordered(_simulate_task, items)
+
+def run_simulation(games: int, turns: int, seed: int = 0, policy: str = 'random', engine: str = 'batch',
+                   play_through: bool = True, workers: Optional[int] = None, chunk_size: int = 500,
+                   config: Optional[Config] = None) -> Iterator[SimulationSummary]:
+    """Симуляция партий на пуле процессов
+
+    Возвращает итератор по накопленной сводке после каждой готовой пачки.
+    Результат определяется зерном и размером пачки и не зависит от числа процессов.
+    """
+    tasks = chunk_tasks(games, turns, seed, policy, engine, play_through, chunk_size, config)
+    total = SimulationSummary(turns)
+    for _, summary in map_chunks(list(enumerate(tasks)), workers):
+        total.merge(summary)
+        yield total
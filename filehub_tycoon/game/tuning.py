@@ -0,0 +1,266 @@
+# Подбор балансовых констант Config по результатам симуляции партий
+#
+# Кандидат - набор значений выбранных полей Config (например
+# "EVENTS.ddos_attack.probability" или "AD_METRICS.base_cpm"). Кандидаты
+# оцениваются симуляцией партий (game/simulator.py) и сравниваются по целевой
+# функции. Сводки пачек сохраняются на диск по хэшу конфигурации и версии
+# движка, поэтому повторный запуск досчитывает только новые точки.
+
+import copy
+import hashlib
+import itertools
+import json
+import math
+import pickle
+import random
+import sqlite3
+from typing import Optional, Dict, Any, List, NamedTuple, Iterator
+
+from game.game_engine import ENGINE_VERSION
+from game.simulator import SUMMARY_VERSION, SimulationSummary, chunk_tasks, map_chunks
+from utils.config import Config
+
+# Поля Config, влияющие на игру (входят в хэш конфигурации)
+BALANCE_FIELDS = (
+    'GAME_CONFIG', 'MIRROR_REGIONS', 'STAFF_SALARIES', 'INFRASTRUCTURE_COSTS',
+    'MARKETING_COSTS', 'HOSTING_COSTS', 'LEGAL_RISKS', 'AD_METRICS', 'EVENTS', 'EVENT_MODIFIERS'
+)
+
+DEFAULT_GRID_POINTS = 5  # Точек сетки для диапазона без явного количества
+
+class ParamSpace(NamedTuple):
+    """Пространство значений одного поля: список значений или диапазон"""
+    path: str
+    values: Optional[List[Any]] = None
+    low: Optional[float] = None
+    high: Optional[float] = None
+    points: int = DEFAULT_GRID_POINTS
+    integer: bool = False
+
+    def grid(self) -> List[Any]:
+        """Значения для перебора по сетке"""
+        if self.values is not None:
+            return list(self.values)
+        if self.points == 1:
+            return [self._cast(self.low)]
+        step = (self.high - self.low) / (self.points - 1)
+        return [self._cast(self.low + step * i) for i in range(self.points)]
+
+    def sample(self, rng: random.Random) -> Any:
+        """Случайное значение"""
+        if self.values is not None:
+            return rng.choice(self.values)
+        return self._cast(rng.uniform(self.low, self.high))
+
+    def _cast(self, value: float):
+        return int(round(value)) if self.integer else value
+
+class Candidate(NamedTuple):
+    """Проверяемая конфигурация"""
+    params: Dict[str, Any]
+    config: Config
+    config_hash: str
+
+def get_value(config: Config, path: str) -> Any:
+    """Значение поля Config по пути вида 'EVENTS.ddos_attack.probability'"""
+    field, *keys = path.split('.')
+    if field not in BALANCE_FIELDS:
+        raise ValueError(f"Поле {field} не относится к балансу игры")
+    value = getattr(config, field)
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            raise ValueError(f"Неизвестный параметр {path}")
+        value = value[key]
+    return value
+
+def set_value(config: Config, path: str, value: Any):
+    """Замена значения поля Config по пути"""
+    get_value(config, path)  # Проверка пути
+    field, *keys = path.split('.')
+    if not keys:
+        setattr(config, field, value)
+        return
+    target = getattr(config, field)
+    for key in keys[:-1]:
+        target = target[key]
+    target[keys[-1]] = value
+
+def parse_param(spec: str, config: Config) -> ParamSpace:
+    """Разбор описания параметра: 'ПУТЬ=a,b,c' или 'ПУТЬ=мин:макс[:точек]'"""
+    path, sep, values = spec.partition('=')
+    if not sep or not values:
+        raise ValueError(f"Ожидается ПУТЬ=значения, получено: {spec}")
+    current = get_value(config, path)
+    if isinstance(current, bool) or not isinstance(current, (int, float)):
+        raise ValueError(f"Параметр {path} не числовой")
+    integer = isinstance(current, int)
+    number = int if integer else float
+
+    try:
+        if ':' in values:
+            parts = values.split(':')
+            if len(parts) not in (2, 3):
+                raise ValueError
+            points = int(parts[2]) if len(parts) == 3 else DEFAULT_GRID_POINTS
+            if points < 1:
+                raise ValueError
+            return ParamSpace(path, low=float(parts[0]), high=float(parts[1]), points=points, integer=integer)
+        return ParamSpace(path, values=[number(value) for value in values.split(',')], integer=integer)
+    except ValueError:
+        raise ValueError(f"Некорректные значения параметра {path}: {values}")
+
+def config_hash(config: Config) -> str:
+    """Хэш балансовых полей конфигурации, версии движка и версии сводки симуляции"""
+    snapshot = {field: getattr(config, field) for field in BALANCE_FIELDS}
+    payload = json.dumps({'engine': ENGINE_VERSION, 'summary': SUMMARY_VERSION, 'config': snapshot}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def make_candidate(params: Dict[str, Any], base: Optional[Config] = None) -> Candidate:
+    """Копия конфигурации с подставленными значениями"""
+    config = copy.deepcopy(base or Config())
+    for path, value in params.items():
+        set_value(config, path, value)
+    return Candidate(params, config, config_hash(config))
+
+def grid_candidates(spaces: List[ParamSpace], base: Optional[Config] = None) -> List[Candidate]:
+    """Все сочетания значений сетки"""
+    paths = [space.path for space in spaces]
+    return [make_candidate(dict(zip(paths, values)), base)
+            for values in itertools.product(*(space.grid() for space in spaces))]
+
+def random_candidates(spaces: List[ParamSpace], samples: int, seed: int = 0,
+                      base: Optional[Config] = None) -> List[Candidate]:
+    """Случайные точки пространства (без повторов)"""
+    rng = random.Random(seed)
+    candidates = {}
+    for _ in range(samples * 10):
+        if len(candidates) >= samples:
+            break
+        candidate = make_candidate({space.path: space.sample(rng) for space in spaces}, base)
+        candidates.setdefault(candidate.config_hash, candidate)
+    return list(candidates.values())
+
+# Целевые функции: меньше - лучше
+
+def objective_loss(report: Dict[str, Any], objective: str, target_win_rate: float = 0.5) -> float:
+    """Значение целевой функции по сводке симуляции"""
+    if objective == 'win_rate':
+        return -report['win_rate']
+    if objective == 'target_win_rate':
+        return abs(report['win_rate'] - target_win_rate)
+    if objective == 'score':
+        return -report['score']['mean']
+    raise ValueError(f"Неизвестная целевая функция: {objective}")
+
+OBJECTIVES = ('target_win_rate', 'win_rate', 'score')
+
+class ResultCache:
+    """Сводки пачек партий на диске (SQLite)
+
+    Ключ - хэш конфигурации (с версией движка) и параметры пачки, поэтому
+    результат пачки переиспользуется любым запуском с той же конфигурацией.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, summary BLOB NOT NULL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def chunk_key(config_hash: str, task: tuple) -> str:
+        """Ключ пачки: конфигурация и все аргументы simulate_chunk, кроме самой конфигурации"""
+        games, turns, seed, policy, engine, play_through, _ = task
+        return f"{config_hash}:{games}:{turns}:{seed}:{policy}:{engine}:{int(play_through)}"
+
+    def get(self, key: str) -> Optional[SimulationSummary]:
+        row = self.connection.execute("SELECT summary FROM chunks WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key: str, summary: SimulationSummary):
+        self.connection.execute("INSERT OR REPLACE INTO chunks (key, summary) VALUES (?, ?)",
+                                (key, pickle.dumps(summary, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def evaluate(candidates: List[Candidate], games: int, turns: int, seed: int = 0, policy: str = 'random',
+             engine: str = 'batch', play_through: bool = True, chunk_size: int = 500,
+             workers: Optional[int] = None, cache: Optional[ResultCache] = None) -> List[SimulationSummary]:
+    """Симуляция партий для всех кандидатов на одном пуле процессов
+
+    Все кандидаты играют партии с одними и теми же зернами, поэтому разница
+    результатов определяется конфигурацией, а не случайностью.
+    """
+    summaries = [SimulationSummary(turns) for _ in candidates]
+    items = []
+    for index, candidate in enumerate(candidates):
+        for task in chunk_tasks(games, turns, seed, policy, engine, play_through, chunk_size, candidate.config):
+            key = ResultCache.chunk_key(candidate.config_hash, task)
+            cached = cache.get(key) if cache else None
+            if cached is not None:
+                summaries[index].merge(cached)
+            else:
+                items.append(((index, key), task))
+
+    for (index, key), summary in map_chunks(items, workers):
+        if cache:
+            cache.put(key, summary)
+        summaries[index].merge(summary)
+    return summaries
+
+def rung_sizes(min_games: int, max_games: int, eta: int) -> List[int]:
+    """Количество партий на каждом круге последовательного отсева"""
+    if eta <= 1 or min_games >= max_games:
+        return [max_games]
+    sizes = []
+    games = min_games
+    while games < max_games:
+        sizes.append(games)
+        games *= eta
+    sizes.append(max_games)
+    return sizes
+
+def search(candidates: List[Candidate], objective: str = 'target_win_rate', target_win_rate: float = 0.5,
+           min_games: int = 500, max_games: int = 5000, eta: int = 3, turns: int = 100, seed: int = 0,
+           policy: str = 'random', engine: str = 'batch', play_through: bool = True,
+           chunk_size: int = 500, workers: Optional[int] = None,
+           cache: Optional[ResultCache] = None) -> Iterator[Dict[str, Any]]:
+    """Последовательный отсев (successive halving)
+
+    На каждом круге кандидаты играют больше партий, а в следующий круг
+    проходит лучшая 1/eta часть - явно плохие конфигурации отсеиваются по
+    малой выборке. С eta=1 все кандидаты сразу играют max_games партий.
+    Если у всех кандидатов круга одинаковые потери (tied), отсев по ним был
+    бы произвольным - в следующий круг проходят все.
+    Возвращает итератор по итогам кругов: отсортированные результаты.
+    """
+    alive = list(candidates)
+    sizes = rung_sizes(min_games, max_games, eta)
+    for rung, games in enumerate(sizes):
+        summaries = evaluate(alive, games, turns, seed, policy, engine, play_through, chunk_size, workers, cache)
+        results = []
+        for candidate, summary in zip(alive, summaries):
+            report = summary.to_dict()
+            results.append({
+                'params': candidate.params,
+                'config_hash': candidate.config_hash,
+                'games': games,
+                'loss': objective_loss(report, objective, target_win_rate),
+                'report': report,
+                'candidate': candidate
+            })
+        results.sort(key=lambda result: result['loss'])
+        tied = len(results) > 1 and results[0]['loss'] == results[-1]['loss']
+        yield {'rung': rung, 'games': games, 'results': results, 'tied': tied}
+
+        if rung + 1 < len(sizes) and not tied:
+            keep = max(1, math.ceil(len(results) / eta))
+            alive = [result['candidate'] for result in results[:keep]]
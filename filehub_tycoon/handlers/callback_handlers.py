@@ -4,17 +4,53 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from game.models import UserRole, InfrastructureLevel, HostingRegion
+from game.models import InfrastructureLevel, HostingRegion
+from game.actions import UPGRADE_COST_KEYS
+from game.advisor import NEXT_LEVEL, describe_action
+from game.ledger import LedgerCategory
 from utils.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Сообщения об апгрейде компонента: заголовок, эффект, пояснение
+UPGRADE_MESSAGES = {
+    'server': ("🖥️ **Серверы обновлены", "⚡ Увеличена производительность",
+               "Это улучшит рост пользователей и стабильность работы трекера."),
+    'bandwidth': ("⚡ **Пропускная способность увеличена", "🌐 Больше пользователей могут одновременно использовать трекер",
+                  "Снизится нагрузка на серверы во время пикового трафика."),
+    'storage': ("💾 **Хранилище расширено", "📦 Больше места для каталога раздач",
+                "Трекер выдержит рост числа пользователей и файлов."),
+    'security': ("🛡️ **Безопасность улучшена", "🔒 Защита от кибератак и утечек данных",
+                 "Уменьшатся риски и увеличится доверие пользователей.")
+}
+
+CAMPAIGN_NAMES = {
+    'social_media': 'Социальные сети',
+    'paid_ads': 'Рекламные кампании',
+    'content_marketing': 'Контент-маркетинг',
+    'influencer_partnership': 'Партнерство с инфлюенсером'
+}
+
+CAMPAIGN_LEVEL_NAMES = {
+    'small': 'малый масштаб',
+    'medium': 'средний масштаб',
+    'large': 'большой масштаб'
+}
+
+# Действия /community (кнопки без общего префикса)
+COMMUNITY_ACTIONS = {
+    'host_community_event': {'cost': 25000, 'effect': 'event', 'description': 'Проведение мероприятия для сообщества'},
+    'request_donations': {'cost': 0, 'effect': 'donations', 'description': 'Запрос пожертвований у сообщества'},
+    'hire_community_manager': {'cost': 80000, 'effect': 'manager', 'description': 'Найм менеджера сообщества'}
+}
+
 class CallbackHandlers:
     """Класс обработчиков callback-запросов"""
     
-    def __init__(self, state_manager, game_engine):
+    def __init__(self, state_manager, game_engine, projector=None):
         self.state_manager = state_manager
         self.game_engine = game_engine
+        self.projector = projector  # Прогноз покупок перед подтверждением (game/projection.py)
         self.config = Config()
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -26,7 +62,7 @@ class CallbackHandlers:
             await query.answer()
             
             # Получаем текущее состояние игры
-            game_state = self.state_manager.get_game_state(user_id)
+            game_state = await self.state_manager.get_game_state(user_id)
             if not game_state:
                 await query.edit_message_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
                 return
@@ -34,7 +70,15 @@ class CallbackHandlers:
             # Разбираем callback_data
             data = query.data
             
-            if data.startswith("dashboard_"):
+            if data in self.config.LEGAL_ACTIONS:
+                # Кнопки /law и /community называются по действию ("hire_lawyers"),
+                # поэтому проверяются до префиксов
+                await self._handle_legal_callback(query, game_state, data)
+            elif data in COMMUNITY_ACTIONS:
+                await self._handle_community_callback(query, game_state, data)
+            elif data.startswith("preview_"):
+                await self._handle_preview_callback(query, game_state, data)
+            elif data.startswith("dashboard_"):
                 await self._handle_dashboard_callback(query, game_state, data)
             elif data.startswith("hire_"):
                 await self._handle_hire_callback(query, game_state, data)
@@ -85,19 +129,16 @@ class CallbackHandlers:
         }
         
         names_list = names.get(role, ['Иван Специалистов'])
-        name = names_list[hash(game_state.user_id + role) % len(names_list)]
+        name = names_list[hash((game_state.user_id, role)) % len(names_list)]
         
         # Нанимаем сотрудника
-        success = self.state_manager.hire_staff(
+        success = self.state_manager.buy_staff(
             user_id=game_state.user_id,
-            role=UserRole(role),
-            name=name,
-            salary=salary
+            role=role,
+            name=name
         )
         
         if success:
-            self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - salary})
-            
             # Формируем сообщение об успешном найме
             message = f"""
 ✅ **{name} принят на должность {role}!**
@@ -106,7 +147,7 @@ class CallbackHandlers:
 📈 Влияние на бизнес:
 {self._get_role_impact_description(role)}
 
-💵 Оставшийся бюджет: ${game_state.budget - salary:,}
+💵 Оставшийся бюджет: ${game_state.budget:,}
 
 Используйте /next для продолжения развития хаба.
 """
@@ -114,98 +155,118 @@ class CallbackHandlers:
         else:
             await query.edit_message_text("❌ Ошибка при найме сотрудника.")
     
-    async def _handle_upgrade_callback(self, query, game_state, data):
-        """Обработка апгрейдов инфраструктуры"""
-        if data == "upgrade_server_advanced":
-            cost = self.config.get_infrastructure_cost('server_upgrade', 'advanced')
-            if game_state.budget < cost:
-                await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
-                return
-            
-            success = self.state_manager.upgrade_infrastructure(
-                user_id=game_state.user_id,
-                upgrade_type='server',
-                level='advanced'
-            )
-            
-            if success:
-                self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - cost})
-                
-                message = f"""
-🖥️ **Серверы обновлены до Advanced!**
-
-⚡ Увеличена производительность на 25%
-💰 Стоимость: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+    def _parse_purchase(self, data: str):
+        """Действие (как в game/advisor.py) и стоимость покупки по callback_data
+
+        None - данные не описывают известный апгрейд или кампанию.
+        """
+        kind, _, rest = data.partition('_')
+        item, _, level = rest.rpartition('_')
+        if kind == 'upgrade' and item in UPGRADE_COST_KEYS and level in NEXT_LEVEL.values():
+            return ('upgrade', item, level), self.config.get_infrastructure_cost(UPGRADE_COST_KEYS[item], level)
+        if kind == 'campaign' and self.config.get_marketing_cost(item, level):
+            return ('campaign', item, level), self.config.get_marketing_cost(item, level)
+        return None
+    
+    async def _handle_preview_callback(self, query, game_state, data):
+        """Прогноз покупки с подтверждением"""
+        if data == "preview_cancel":
+            await query.edit_message_text("❌ Покупка отменена.")
+            return
+        
+        purchase_data = data.replace("preview_", "", 1)
+        purchase = self._parse_purchase(purchase_data)
+        if purchase is None:
+            await query.edit_message_text("❌ Неизвестная покупка.")
+            return
+        
+        action, cost = purchase
+        if game_state.budget < cost:
+            await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
+            return
+        
+        projection = self.projector.projection(game_state, action) if self.projector else None
+        message = f"""
+🛒 **{describe_action(action, self.config)}**
 
-Это улучшит рост пользователей и стабильность работы трекера.
+💵 Бюджет после покупки: ${game_state.budget - cost:,}
+{self._format_projection(projection) if projection else "🔮 Прогноз недоступен."}
 """
-                await query.edit_message_text(message, parse_mode='Markdown')
-            else:
-                await query.edit_message_text("❌ Ошибка апгрейда серверов.")
-                
-        elif data == "upgrade_bandwidth_advanced":
-            cost = self.config.get_infrastructure_cost('bandwidth_increase', 'advanced')
-            if game_state.budget < cost:
-                await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
-                return
-            
-            success = self.state_manager.upgrade_infrastructure(
-                user_id=game_state.user_id,
-                upgrade_type='bandwidth',
-                level='advanced'
-            )
-            
-            if success:
-                self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - cost})
-                
-                message = f"""
-⚡ **Пропускная способность увеличена до Advanced!**
+        keyboard = [
+            [InlineKeyboardButton("✅ Купить", callback_data=purchase_data)],
+            [InlineKeyboardButton("❌ Отмена", callback_data="preview_cancel")]
+        ]
+        await query.edit_message_text(message, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    def _format_projection(self, projection) -> str:
+        """Форматирование прогноза покупки: медианы и разброс без покупки и с ней"""
+        base, purchase = projection['base'], projection['purchase']
+        
+        def spread(values, prefix=""):
+            low, median, high = values
+            return f"{prefix}{median:,} ({prefix}{low:,} – {prefix}{high:,})"
+        
+        return f"""
+🔮 **Прогноз на {projection['turns']} ходов** (вариантов будущего: {projection['futures']})
 
-🌐 Больше пользователей могут одновременно использовать трекер
-💰 Стоимость: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+💰 Бюджет, медиана (10–90%):
+• Без покупки: {spread(base['budget'], "$")}
+• С покупкой: {spread(purchase['budget'], "$")}
 
-Снизится нагрузка на серверы во время пикового трафика.
+👥 Пользователи, медиана (10–90%):
+• Без покупки: {spread(base['users'])}
+• С покупкой: {spread(purchase['users'])}
+
+🏁 Победа / поражение:
+• Без покупки: {base['win_rate']:.0%} / {base['lose_rate']:.0%}
+• С покупкой: {purchase['win_rate']:.0%} / {purchase['lose_rate']:.0%}
 """
-                await query.edit_message_text(message, parse_mode='Markdown')
-            else:
-                await query.edit_message_text("❌ Ошибка увеличения пропускной способности.")
-                
-        elif data == "upgrade_security_advanced":
-            cost = self.config.get_infrastructure_cost('security_enhancement', 'advanced')
-            if game_state.budget < cost:
-                await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
-                return
-            
-            success = self.state_manager.upgrade_infrastructure(
-                user_id=game_state.user_id,
-                upgrade_type='security',
-                level='advanced'
-            )
-            
-            if success:
-                self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - cost})
-                
-                message = f"""
-🛡️ **Безопасность улучшена до Advanced!**
+    
+    async def _handle_upgrade_callback(self, query, game_state, data):
+        """Обработка апгрейдов инфраструктуры"""
+        purchase = self._parse_purchase(data)
+        if purchase is None:
+            await query.edit_message_text("❌ Неизвестный апгрейд.")
+            return
+        
+        (_, upgrade_type, level), cost = purchase
+        # Кнопка подтверждения остается в чате - апгрейд мог уже состояться
+        if NEXT_LEVEL.get(getattr(game_state.infrastructure, f"{upgrade_type}_level")) != level:
+            await query.edit_message_text("❌ Этот апгрейд уже недоступен.")
+            return
+        if game_state.budget < cost:
+            await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
+            return
+        
+        success = self.state_manager.buy_upgrade(
+            user_id=game_state.user_id,
+            upgrade_type=upgrade_type,
+            level=level
+        )
+        
+        if success:
+            title, effect, note = UPGRADE_MESSAGES[upgrade_type]
+            message = f"""
+{title} до {level.capitalize()}!**
 
-🔒 Защита от кибератак и утечек данных
+{effect}
 💰 Стоимость: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+💵 Оставшийся бюджет: ${game_state.budget:,}
 
-Уменьшатся риски и увеличится доверие пользователей.
+{note}
 """
-                await query.edit_message_text(message, parse_mode='Markdown')
-            else:
-                await query.edit_message_text("❌ Ошибка улучшения безопасности.")
+            await query.edit_message_text(message, parse_mode='Markdown')
+        else:
+            await query.edit_message_text("❌ Ошибка апгрейда инфраструктуры.")
     
     async def _handle_marketing_callback(self, query, game_state, data):
         """Обработка маркетинговых кампаний"""
-        # Парсим данные кампании
-        campaign_type, level = data.replace("campaign_", "").split('_')
+        purchase = self._parse_purchase(data)
+        if purchase is None:
+            await query.edit_message_text("❌ Неизвестная кампания.")
+            return
         
-        cost = self.config.get_marketing_cost(campaign_type, level)
+        (_, campaign_type, level), cost = purchase
         
         if game_state.budget < cost:
             await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
@@ -219,14 +280,8 @@ class CallbackHandlers:
         )
         
         if success:
-            campaign_names = {
-                'social_small': 'Социальные сети (малый масштаб)',
-                'ads_medium': 'Рекламные кампании (средний масштаб)',
-                'content_small': 'Контент-маркетинг (малый масштаб)',
-                'influencer_large': 'Партнерство с инфлюенсером (большой масштаб)'
-            }
-            
-            campaign_name = campaign_names.get(data.replace("campaign_", "campaign_"), 'Маркетинговая кампания')
+            campaign_name = (f"{CAMPAIGN_NAMES.get(campaign_type, 'Маркетинговая кампания')} "
+                             f"({CAMPAIGN_LEVEL_NAMES.get(level, level)})")
             
             message = f"""
 📢 **{campaign_name} запущена!**
@@ -238,7 +293,7 @@ class CallbackHandlers:
 
 ⏱️ Длительность: 3 хода
 💰 Инвестиции: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+💵 Оставшийся бюджет: ${game_state.budget:,}
 
 Используйте /next чтобы увидеть результаты кампании.
 """
@@ -255,15 +310,13 @@ class CallbackHandlers:
             await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
             return
         
-        success = self.state_manager.add_hosting_region(
+        success = self.state_manager.buy_hosting(
             user_id=game_state.user_id,
             region=region,
             level='basic'
         )
         
         if success:
-            self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - cost})
-            
             region_names = {
                 'russia': 'Россия',
                 'netherlands': 'Нидерланды',
@@ -279,7 +332,7 @@ class CallbackHandlers:
 🗺️ Географическое покрытие увеличено
 🪞 Создано зеркало в новом регионе
 💰 Стоимость: ${cost:,}/месяц
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+💵 Оставшийся бюджет: ${game_state.budget:,}
 
 Это улучшит скорость доступа для пользователей из этого региона.
 """
@@ -292,7 +345,7 @@ class CallbackHandlers:
         choice_index = int(data.replace("event_choice_", ""))
         
         # Обрабатываем выбор
-        result = self.game_engine.handle_event_choice(game_state, choice_index)
+        result = self.state_manager.choose_event(game_state.user_id, choice_index)
         
         if result['success']:
             choice = result['choice']
@@ -355,13 +408,7 @@ class CallbackHandlers:
     
     async def _handle_legal_callback(self, query, game_state, data):
         """Обработка юридических действий"""
-        actions = {
-            'hire_lawyers': {'cost': 40000, 'effect': -15, 'description': 'Снижение юридического риска на 15 пунктов'},
-            'increase_transparency': {'cost': 20000, 'effect': -10, 'description': 'Снижение юридического риска на 10 пунктов'},
-            'cooperate_rights_holders': {'cost': 30000, 'effect': -12, 'description': 'Снижение юридического риска на 12 пунктов'}
-        }
-        
-        action_info = actions.get(data)
+        action_info = self.config.LEGAL_ACTIONS.get(data)
         if not action_info:
             await query.edit_message_text("❌ Неизвестное юридическое действие")
             return
@@ -371,20 +418,18 @@ class CallbackHandlers:
             await query.edit_message_text(f"❌ Недостаточно средств! Нужно ${cost:,}")
             return
         
-        # Применяем эффект
-        new_risk = max(0, game_state.legal.risk_level + action_info['effect'])
-        self.state_manager.update_state(game_state.user_id, {
-            'budget': game_state.budget - cost,
-            'legal_risk': new_risk
-        })
+        old_risk = game_state.legal.risk_level
+        if not self.state_manager.buy_legal(game_state.user_id, data):
+            await query.edit_message_text("❌ Ошибка юридического действия.")
+            return
         
         message = f"""
 ⚖️ **Юридическое действие выполнено!**
 
 ✅ {action_info['description']}
 💰 Стоимость: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
-⚠️ Юридический риск: {game_state.legal.risk_level:.1f} → {new_risk:.1f}
+💵 Оставшийся бюджет: ${game_state.budget:,}
+⚠️ Юридический риск: {old_risk:.1f} → {game_state.legal.risk_level:.1f}
 
 Отличная работа по соблюдению требований!
 """
@@ -392,13 +437,7 @@ class CallbackHandlers:
     
     async def _handle_community_callback(self, query, game_state, data):
         """Обработка действий с сообществом"""
-        actions = {
-            'host_community_event': {'cost': 25000, 'effect': 'event', 'description': 'Проведение мероприятия для сообщества'},
-            'request_donations': {'cost': 0, 'effect': 'donations', 'description': 'Запрос пожертвований у сообщества'},
-            'hire_community_manager': {'cost': 80000, 'effect': 'manager', 'description': 'Найм менеджера сообщества'}
-        }
-        
-        action_info = actions.get(data)
+        action_info = COMMUNITY_ACTIONS.get(data)
         if not action_info:
             await query.edit_message_text("❌ Неизвестное действие с сообществом")
             return
@@ -411,29 +450,31 @@ class CallbackHandlers:
         if action_info['effect'] == 'donations':
             # Запрос пожертвований
             donation_amount = max(1000, int(game_state.active_users * 10))
-            self.state_manager.update_state(game_state.user_id, {
-                'donations_monthly': game_state.community.donations_monthly + donation_amount,
-                'budget': game_state.budget + donation_amount
-            })
+            if not self.state_manager.request_donations(game_state.user_id, donation_amount):
+                await query.edit_message_text("❌ Ошибка обращения к сообществу.")
+                return
             
             message = f"""
 👥 **Обращение к сообществу выполнено!**
 
 💝 Сообщество откликнулось и собрало ${donation_amount:,}
-💵 Общий бюджет: ${game_state.budget + donation_amount:,}
+💵 Общий бюджет: ${game_state.budget:,}
 
 Спасибо за поддержку от ваших пользователей!
 """
             
         else:
             # Другие действия
-            self.state_manager.update_state(game_state.user_id, {'budget': game_state.budget - cost})
+            if not self.state_manager.post_ledger_entry(game_state.user_id, LedgerCategory.COMMUNITY.value,
+                                                        -cost, f"community:{data}"):
+                await query.edit_message_text("❌ Ошибка действия с сообществом.")
+                return
             
             message = f"""
 👥 **{action_info['description']}**
 
 💰 Стоимость: ${cost:,}
-💵 Оставшийся бюджет: ${game_state.budget - cost:,}
+💵 Оставшийся бюджет: ${game_state.budget:,}
 
 Это улучшит здоровье и вовлеченность сообщества!
 """
@@ -513,7 +554,7 @@ class CallbackHandlers:
         
         if success:
             # Обновляем состояние в базе
-            self.state_manager.save_game(game_state.user_id)
+            await self.state_manager.save_game(game_state.user_id)
             
             message = f"""
 ✅ **Трекер успешно настроен!**
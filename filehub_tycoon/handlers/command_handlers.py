@@ -5,17 +5,44 @@ from typing import Optional, Dict, Any
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from game.models import UserRole, InfrastructureLevel, HostingRegion
+from game.models import UserRole, HostingRegion
+from game.actions import UPGRADE_COST_KEYS
+from game.advisor import NEXT_LEVEL, describe_action
+from game.ledger import INCOME_CATEGORIES, LedgerCategory
 from utils.config import Config
 
 logger = logging.getLogger(__name__)
 
+LEDGER_CATEGORY_NAMES = {
+    LedgerCategory.AD_REVENUE.value: '📺 Реклама',
+    LedgerCategory.DONATIONS.value: '💝 Пожертвования',
+    LedgerCategory.OTHER_INCOME.value: '🎁 Прочие доходы',
+    LedgerCategory.STAFF.value: '👨‍💼 Команда',
+    LedgerCategory.MARKETING.value: '📢 Маркетинг',
+    LedgerCategory.LEGAL.value: '⚖️ Юридические расходы',
+    LedgerCategory.INFRASTRUCTURE.value: '🔧 Инфраструктура',
+    LedgerCategory.HOSTING.value: '🌍 Хостинг',
+    LedgerCategory.COMMUNITY.value: '👥 Сообщество',
+    LedgerCategory.EVENTS.value: '⚡ События'
+}
+# Подписи типов кампаний: кнопки /marketing и списки кампаний
+# (ключи типов с "_" ломают разметку Markdown)
+CAMPAIGN_LABELS = {
+    'social_media': "📱 Соц. сети",
+    'paid_ads': "🎯 Реклама",
+    'content_marketing': "📝 Контент-маркетинг",
+    'influencer_partnership': "🌟 Партнерство с инфлюенсером"
+}
+REPORT_TREND_TURNS = 5   # Ходов в динамике /report
+REPORT_ENTRIES = 10      # Последних разовых операций открытого хода в /report
+
 class CommandHandlers:
     """Класс обработчиков команд бота"""
     
-    def __init__(self, state_manager, game_engine):
+    def __init__(self, state_manager, game_engine, advisor=None):
         self.state_manager = state_manager
         self.game_engine = game_engine
+        self.advisor = advisor  # Поиск плана для /plan (game/advisor.py)
         self.config = Config()
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -23,11 +50,11 @@ class CommandHandlers:
         user = update.effective_user
         
         # Проверяем, есть ли у пользователя активная игра
-        game_state = self.state_manager.load_game(user.id)
+        game_state = await self.state_manager.load_game(user.id)
         
         if not game_state:
             # Создаем новую игру
-            game_state = self.state_manager.create_new_game(
+            game_state = await self.state_manager.create_new_game(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -95,7 +122,7 @@ class CommandHandlers:
     async def dashboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /dashboard"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -117,7 +144,7 @@ class CommandHandlers:
     async def plan_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /plan"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -125,6 +152,9 @@ class CommandHandlers:
         
         # Анализ текущего состояния и рекомендации
         analysis = self._analyze_current_state(game_state)
+        plan = await self.advisor.plan(game_state) if self.advisor else None
+        if plan and plan['depth']:
+            self._apply_search_plan(analysis, plan)
         
         plan_text = f"""
 🎯 **Стратегический план**
@@ -153,7 +183,7 @@ class CommandHandlers:
     async def hire_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /hire"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -171,7 +201,7 @@ class CommandHandlers:
 👥 **Найм персонала**
 
 💰 Бюджет: ${game_state.budget:,}
-👨‍💼 Нанято сотрудников: {len([s for s in game_state.staff.values() if s.hired])}
+👨‍💼 Нанято сотрудников: {game_state.derived().staff_count}
 
 **Доступные роли:**
 
@@ -202,7 +232,7 @@ class CommandHandlers:
     async def upgrade_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /upgrade"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -224,18 +254,19 @@ class CommandHandlers:
         
         keyboard = []
         
-        # Добавляем кнопки для апгрейда серверов
-        server_cost = self.config.get_infrastructure_cost('server_upgrade', 'advanced')
-        if game_state.infrastructure.server_level == InfrastructureLevel.BASIC:
-            keyboard.append([InlineKeyboardButton(f"🔧 Апгрейд серверов до Advanced (${server_cost:,})", callback_data="upgrade_server_advanced")])
-        
-        bandwidth_cost = self.config.get_infrastructure_cost('bandwidth_increase', 'advanced')
-        if game_state.infrastructure.bandwidth_level == InfrastructureLevel.BASIC:
-            keyboard.append([InlineKeyboardButton(f"⚡ Увеличить пропускную способность до Advanced (${bandwidth_cost:,})", callback_data="upgrade_bandwidth_advanced")])
-        
-        security_cost = self.config.get_infrastructure_cost('security_enhancement', 'advanced')
-        if game_state.infrastructure.security_level == InfrastructureLevel.BASIC:
-            keyboard.append([InlineKeyboardButton(f"🛡️ Улучшить безопасность до Advanced (${security_cost:,})", callback_data="upgrade_security_advanced")])
+        # Кнопки апгрейда компонентов до следующего уровня (покупка - после прогноза)
+        upgrade_buttons = {
+            'server': "🔧 Апгрейд серверов",
+            'bandwidth': "⚡ Увеличить пропускную способность",
+            'storage': "💾 Расширить хранилище",
+            'security': "🛡️ Улучшить безопасность"
+        }
+        for component, label in upgrade_buttons.items():
+            level = NEXT_LEVEL.get(getattr(game_state.infrastructure, f"{component}_level"))
+            if level:
+                cost = self.config.get_infrastructure_cost(UPGRADE_COST_KEYS[component], level)
+                keyboard.append([InlineKeyboardButton(f"{label} до {level.capitalize()} (${cost:,})",
+                                                      callback_data=f"preview_upgrade_{component}_{level}")])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -244,7 +275,7 @@ class CommandHandlers:
     async def marketing_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /marketing"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -261,15 +292,21 @@ class CommandHandlers:
 
 **Активные кампании:**
 {self._format_active_campaigns(game_state.marketing.campaigns)}
-
+{self._format_campaign_totals(game_state.marketing.campaign_totals)}
 **Доступные кампании:**
 """
         
+        campaign_buttons = [
+            ('social_media', 'small'),
+            ('paid_ads', 'medium'),
+            ('content_marketing', 'small'),
+            ('influencer_partnership', 'large')
+        ]
         keyboard = [
-            [InlineKeyboardButton("📱 Соц. сети (small $20k)", callback_data="campaign_social_small")],
-            [InlineKeyboardButton("🎯 Реклама (medium $75k)", callback_data="campaign_ads_medium")],
-            [InlineKeyboardButton("📝 Контент-маркетинг (small $35k)", callback_data="campaign_content_small")],
-            [InlineKeyboardButton("🌟 Партнерство с инфлюенсером (large $150k)", callback_data="campaign_influencer_large")]
+            [InlineKeyboardButton(f"{self._campaign_label(campaign_type)} "
+                                  f"({level} ${self.config.get_marketing_cost(campaign_type, level) // 1000}k)",
+                                  callback_data=f"preview_campaign_{campaign_type}_{level}")]
+            for campaign_type, level in campaign_buttons
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -278,7 +315,7 @@ class CommandHandlers:
     async def hosting_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /hosting"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -312,7 +349,7 @@ class CommandHandlers:
     async def law_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /law"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_sections(user_id, ['legal'])
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -344,7 +381,7 @@ class CommandHandlers:
     async def community_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /community"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_sections(user_id, ['core', 'community'])
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -370,10 +407,21 @@ class CommandHandlers:
         
         await update.message.reply_text(community_text, parse_mode='Markdown', reply_markup=reply_markup)
     
+    async def report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /report"""
+        user_id = update.effective_user.id
+        game_state = await self.state_manager.get_game_state(user_id)
+        
+        if not game_state:
+            await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
+            return
+        
+        await update.message.reply_text(self._format_report(game_state), parse_mode='Markdown')
+    
     async def next_turn_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик команды /next"""
+        """Обработчик команды /next (/next N - пропуск до N ходов)"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state:
             await update.message.reply_text("❌ Игра не найдена. Используйте /start для создания новой игры.")
@@ -387,8 +435,19 @@ class CommandHandlers:
             )
             return
         
+        args = context.args or []
+        if args:
+            if not args[0].isdigit() or int(args[0]) < 1:
+                await update.message.reply_text("❌ Укажите количество ходов, например: /next 10")
+                return
+            
+            turns = min(int(args[0]), self.config.GAME_CONFIG['MAX_FAST_FORWARD_TURNS'])
+            if turns > 1:
+                await self._fast_forward(update, game_state, turns)
+                return
+        
         # Обрабатываем ход
-        turn_results = self.game_engine.process_turn(game_state)
+        turn_results = self.state_manager.play_turn(user_id)
         
         # Формируем отчет о ходе
         turn_report = f"""
@@ -417,13 +476,51 @@ class CommandHandlers:
         
         # Переходим к следующему ходу
         self.state_manager.advance_turn(user_id)
-        self.state_manager.save_game(user_id)
+        await self.state_manager.save_game(user_id)
+    
+    async def _fast_forward(self, update: Update, game_state, turns: int):
+        """Пропуск нескольких ходов с одним сохранением и одним отчетом"""
+        user_id = game_state.user_id
+        summary = self.state_manager.fast_forward(user_id, turns)
+        if summary is None:
+            await update.message.reply_text("❌ Ошибка обработки ходов.")
+            return
+        
+        start, end = summary['start'], summary['end']
+        report = f"""
+⏩ **Пропущено ходов: {summary['turns']}** (ход {start['turn']} → {end['turn']})
+
+📊 **Итоги:**
+• Пользователи: {start['active_users']:,} → {end['active_users']:,}
+• Бюджет: ${start['budget']:,} → ${end['budget']:,}
+• NPS: {start['nps_score']:.1f} → {end['nps_score']:.1f}
+• Юридический риск: {start['legal_risk']:.1f} → {end['legal_risk']:.1f}
+
+💰 **Финансы за период:**
+• Доходы: ${summary['total_revenue']:,}
+• Расходы: ${summary['total_expenses']:,}
+• Денежный поток: ${summary['cash_flow']:,}
+
+🎯 **События:**
+{self._format_event_info(summary['new_events'])}
+
+{self._get_fast_forward_status(summary)}
+"""
+        
+        # Последний ход принес событие - показываем кнопки для решения
+        if game_state.last_event and not game_state.last_event.resolved:
+            reply_markup = self._create_event_keyboard(game_state.last_event)
+            await update.message.reply_text(report, parse_mode='Markdown', reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(report, parse_mode='Markdown')
+        
+        await self.state_manager.save_game(user_id)
     
     async def save_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /save"""
         user_id = update.effective_user.id
         
-        if self.state_manager.save_game(user_id):
+        if await self.state_manager.save_game(user_id, durable=True):
             await update.message.reply_text("✅ Игра сохранена!")
         else:
             await update.message.reply_text("❌ Ошибка сохранения игры.")
@@ -431,7 +528,7 @@ class CommandHandlers:
     async def load_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /load"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.load_game(user_id)
+        game_state = await self.state_manager.load_game(user_id)
         
         if game_state:
             await update.message.reply_text("✅ Игра загружена! Используйте /dashboard для просмотра состояния.")
@@ -444,7 +541,7 @@ class CommandHandlers:
         
         # Проверяем, есть ли у пользователя активная игра
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         # Если игра есть и настройка не завершена, обрабатываем как настройку
         if game_state and not game_state.setup_complete:
@@ -459,12 +556,12 @@ class CommandHandlers:
         elif 'продолжить' in text or 'next' in text:
             await self.next_turn_command(update, context)
         else:
-            await update.message.reply_text("💡 Используйте команды: /dashboard, /plan, /hire, /upgrade, /marketing, /hosting, /law, /community, /next")
+            await update.message.reply_text("💡 Используйте команды: /dashboard, /plan, /hire, /upgrade, /marketing, /hosting, /law, /community, /report, /next")
     
     async def _handle_setup_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка текстовых сообщений для настройки"""
         user_id = update.effective_user.id
-        game_state = self.state_manager.get_game_state(user_id)
+        game_state = await self.state_manager.get_game_state(user_id)
         
         if not game_state or game_state.setup_complete:
             return
@@ -499,7 +596,7 @@ class CommandHandlers:
                 
                 if name_success and domain_success:
                     # Сохраняем игру
-                    self.state_manager.save_game(user_id)
+                    await self.state_manager.save_game(user_id)
                     
                     message = f"""
 ✅ **Трекер успешно настроен!**
@@ -541,13 +638,21 @@ class CommandHandlers:
     
     def _format_dashboard(self, game_state) -> str:
         """Форматирование дашборда"""
+        rollup = game_state.ledger.last_rollup()
+        if rollup:
+            turns = rollup['turns']
+            finances = f"""• Доходы: ${rollup['revenue'] // turns:,}/ход
+• Расходы: ${rollup['expenses'] // turns:,}/ход
+• Денежный поток: ${rollup['cash_flow'] // turns:,}/ход
+• Разовые операции: ${rollup['one_off']:,}"""
+        else:
+            finances = "• Первый ход еще не сыгран"
         return f"""
 📊 **Дашборд файлообменника "{game_state.tracker_name}"**
 
 💰 **Финансы:**
 • Бюджет: ${game_state.budget:,}
-• Денежный поток: ${game_state.financial.cash_flow:,}/ход
-• Расходы: ${game_state.expenses.total_expenses:,}/ход
+{finances}
 
 👥 **Пользователи:**
 • Активные: {game_state.active_users:,}
@@ -555,7 +660,7 @@ class CommandHandlers:
 • Удержание 30д: {game_state.community.retention_rate_30d:.1f}%
 
 🏢 **Команда:**
-• Сотрудников: {len([s for s in game_state.staff.values() if s.hired])}
+• Сотрудников: {game_state.derived().staff_count}
 
 🔧 **Инфраструктура:**
 • Уровень серверов: {game_state.infrastructure.server_level.value}
@@ -566,6 +671,55 @@ class CommandHandlers:
 • Юридический риск: {game_state.legal.risk_level:.1f}/100
 
 ⚡ Действий осталось: {game_state.actions_remaining}
+"""
+    
+    def _format_report(self, game_state) -> str:
+        """Форматирование финансового отчета по журналу (game/ledger.py)"""
+        ledger = game_state.ledger
+        rollup = ledger.last_rollup()
+        if rollup is None:
+            return "📒 **Финансовый отчет**\n\nПервый ход еще не сыгран - отчет появится после /next."
+        
+        def category_lines(amounts: Dict[str, int]) -> str:
+            # Сначала доходы, затем расходы по убыванию суммы
+            ordered = sorted((item for item in amounts.items() if item[1]),
+                             key=lambda item: (item[0] not in INCOME_CATEGORIES, -abs(item[1])))
+            return "\n".join(f"• {LEDGER_CATEGORY_NAMES.get(category, category)}: ${amount:+,}"
+                             for category, amount in ordered) or "• Нет операций"
+        
+        turn = rollup['turn']
+        period = f"Ход {turn}" if rollup['turns'] == 1 else f"Ходы {turn - rollup['turns'] + 1}-{turn}"
+        income, expenses = ledger.split_totals()
+        trend = "\n".join(f"• Ход {item['turn']}: ${item['cash_flow']:+,} → бюджет ${item['budget']:,}"
+                          for item in ledger.rollups[-REPORT_TREND_TURNS:])
+        # Источники без "_": сообщение размечено Markdown
+        entries = "\n".join(f"• {LEDGER_CATEGORY_NAMES.get(category, category)}: ${amount:+,} "
+                            f"({source.replace('_', ' ')})"
+                            for category, amount, source in ledger.entries[-REPORT_ENTRIES:])
+        
+        return f"""
+📒 **Финансовый отчет "{game_state.tracker_name}"**
+
+📅 **{period}:**
+{category_lines(rollup['categories'])}
+
+• Доходы: ${rollup['revenue']:,}
+• Регулярные расходы: ${rollup['expenses']:,}
+• Денежный поток: ${rollup['cash_flow']:+,}
+• Разовые операции: ${rollup['one_off']:+,}
+
+🧾 **Текущий ход:**
+{entries or "• Разовых операций нет"}
+
+📈 **Динамика:**
+{trend}
+
+🏦 **За всю игру:**
+{category_lines(ledger.totals)}
+
+• Всего доходов: ${income:,}
+• Всего расходов: ${expenses:,}
+💵 Бюджет: ${game_state.budget:,}
 """
     
     def _format_active_campaigns(self, campaigns: Dict) -> str:
@@ -574,11 +728,28 @@ class CommandHandlers:
             return "• Нет активных кампаний"
         
         campaign_list = []
-        for name, campaign in campaigns.items():
-            campaign_list.append(f"• {name} (запуск в ходу {campaign.get('start_turn', 0)})")
+        for campaign in campaigns.values():
+            end_turn = campaign.get('start_turn', 0) + campaign.get('duration', 0)
+            campaign_list.append(f"• {self._campaign_label(campaign.get('type', ''))} {campaign.get('level', '')} "
+                                 f"(ходы {campaign.get('start_turn', 0)}-{end_turn})")
         
         return "\n".join(campaign_list)
     
+    def _campaign_label(self, campaign_type: str) -> str:
+        """Подпись типа кампании (без "_": сообщения размечены Markdown)"""
+        return CAMPAIGN_LABELS.get(campaign_type, campaign_type.replace('_', ' '))
+    
+    def _format_campaign_totals(self, totals: Dict) -> str:
+        """Форматирование итогов завершенных кампаний"""
+        if not totals:
+            return ""
+        
+        lines = ["\n**Завершенные кампании:**"]
+        for campaign_type, stats in totals.items():
+            lines.append(f"• {self._campaign_label(campaign_type)}: {stats['count']} шт., ${stats['spend']:,}, +{stats['users']:,} польз.")
+        
+        return "\n".join(lines) + "\n"
+    
     def _get_role_skill_effect(self, role: str) -> str:
         """Получение эффекта роли"""
         effects = {
@@ -624,6 +795,24 @@ class CommandHandlers:
         
         return analysis
     
+    def _apply_search_plan(self, analysis: Dict[str, str], plan: Dict[str, Any]):
+        """Рекомендации и приоритеты по плану советника"""
+        steps = [f"{turn}. {describe_action(action, self.config)}" for turn, action in enumerate(plan['plan'], 1)]
+        analysis['recommendations'] = (f"План на {plan['depth']} ход(а) "
+                                      f"(просчитано {plan['nodes']:,} ходов за {plan['elapsed_ms']:.0f} мс):\n"
+                                      + "\n".join(steps))
+        if plan['alternatives']:
+            analysis['recommendations'] += "\n\nДругие варианты первого хода:\n" + "\n".join(
+                f"• {describe_action(action, self.config)}" for action, _ in plan['alternatives'])
+        
+        # Кнопки приоритетов - по видам действий плана
+        buttons = {'hire': 'hire_staff', 'upgrade': 'upgrade_infrastructure', 'campaign': 'start_marketing'}
+        kinds = [buttons[action[0]] for action in plan['plan'] if action[0] in buttons]
+        if kinds:
+            analysis['priority_1_action'] = kinds[0]
+        if len(kinds) > 1 and kinds[1] != kinds[0]:
+            analysis['priority_2_action'] = kinds[1]
+    
     def _get_legal_status(self, risk_level: float) -> str:
         """Получение статуса юридических рисков"""
         if risk_level >= 80:
@@ -669,6 +858,14 @@ class CommandHandlers:
         else:
             return "➡️ Готов к следующему ходу. Используйте /next"
     
+    def _get_fast_forward_status(self, summary: Dict[str, Any]) -> str:
+        """Причина остановки пропуска ходов"""
+        if summary['stop_reason'] == 'event':
+            return "⚠️ Пропуск остановлен: новое событие требует решения"
+        elif summary['stop_reason'] == 'error':
+            return "❌ Пропуск остановлен из-за ошибки обработки хода"
+        return self._get_turn_status(summary['status'])
+    
     def _create_event_keyboard(self, event) -> InlineKeyboardMarkup:
         """Создание клавиатуры для события"""
         keyboard = []
@@ -692,7 +889,9 @@ class CommandHandlers:
 /hosting - Управление регионами хостинга
 /law - Юридические вопросы и риски
 /community - Развитие сообщества пользователей
+/report - Финансовый отчет по категориям
 /next - Переход к следующему ходу
+/next N - Пропуск до N ходов (до первого события)
 /save - Сохранение игры
 /load - Загрузка сохраненной игры
 
@@ -9,12 +9,15 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 
 from utils.config import Config
-from utils.database import Database
+from utils.database import Database, AsyncDatabase
 from utils.state_manager import StateManager
 from handlers.command_handlers import CommandHandlers
 from handlers.callback_handlers import CallbackHandlers
 from game.game_engine import GameEngine
 from game.models import GameState
+from game import derived
+from game.advisor import PlanAdvisor
+from game.projection import PurchaseProjector
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,21 +29,57 @@ shutdown_flag = False
 class TorrentTrackerBot:
     def __init__(self):
         self.config = Config()
-        self.db = Database()
-        self.state_manager = StateManager(self.db)
+        derived.set_consistency_check(self.config.DERIVED_METRICS_CHECK)
+        self.db = Database(
+            db_path=self.config.DB_PATH,
+            pool_size=self.config.DB_POOL_SIZE,
+            cache_size_kb=self.config.DB_CACHE_SIZE_KB,
+            mmap_size=self.config.DB_MMAP_SIZE,
+            codec=self.config.DB_CODEC
+        )
         self.game_engine = GameEngine()
+        self.storage = AsyncDatabase(self.db, queue_size=self.config.DB_WRITE_QUEUE_SIZE)
+        self.state_manager = StateManager(
+            self.storage,
+            save_batch_size=self.config.SAVE_BATCH_SIZE,
+            save_flush_interval=self.config.SAVE_FLUSH_INTERVAL,
+            trusted_load=self.config.DB_TRUSTED_LOAD,
+            cache_size=self.config.STATE_CACHE_SIZE,
+            cache_ttl=self.config.STATE_CACHE_TTL,
+            negative_ttl=self.config.STATE_NEGATIVE_TTL,
+            engine=self.game_engine,
+            journal=self.config.STATE_STORAGE == 'journal',
+            snapshot_interval=self.config.SNAPSHOT_INTERVAL,
+            idle_tick_hours=self.config.GAME_CONFIG['TICK_DURATION'] if self.config.IDLE_CATCH_UP else 0,
+            timer_interval=self.config.TIMER_INTERVAL
+        )
+        
+        # Советник /plan ищет планы в отдельном процессе
+        self.advisor = PlanAdvisor(
+            budget_ms=self.config.PLAN_BUDGET_MS,
+            max_depth=self.config.PLAN_MAX_DEPTH,
+            samples=self.config.PLAN_SAMPLES,
+            workers=self.config.PLAN_WORKERS
+        )
+        
+        # Прогноз покупок из /upgrade и /marketing перед подтверждением
+        self.projector = PurchaseProjector(
+            self.game_engine,
+            futures=self.config.PROJECTION_FUTURES,
+            turns=self.config.PROJECTION_TURNS
+        )
         
         # Инициализация приложения бота
         self.application = Application.builder().token(
             self.config.BOT_TOKEN
-        ).build()
+        ).post_init(self._post_init).post_shutdown(self._post_shutdown).build()
         
         self._setup_handlers()
     
     def _setup_handlers(self):
         """Настройка обработчиков команд и callback-запросов"""
-        command_handlers = CommandHandlers(self.state_manager, self.game_engine)
-        callback_handlers = CallbackHandlers(self.state_manager, self.game_engine)
+        command_handlers = CommandHandlers(self.state_manager, self.game_engine, self.advisor)
+        callback_handlers = CallbackHandlers(self.state_manager, self.game_engine, self.projector)
         
         # Обработчики команд
         self.application.add_handler(CommandHandler("start", command_handlers.start_command))
@@ -63,6 +102,16 @@ class TorrentTrackerBot:
         # Обработчик текстовых сообщений
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, command_handlers.handle_text))
     
+    async def _post_init(self, application: Application):
+        """Запуск фоновых задач после инициализации приложения"""
+        await self.state_manager.start()
+    
+    async def _post_shutdown(self, application: Application):
+        """Сохранение всех изменений при остановке приложения"""
+        self.advisor.shutdown()
+        await self.state_manager.shutdown()
+        self.storage.close()
+    
     def run(self):
         """Запуск бота"""
         print("🚀 Запуск Torrent Tracker Tycoon Bot...")
@@ -83,6 +132,13 @@ class TorrentTrackerBot:
         shutdown_flag = True
         if self.application:
             self.application.stop()
+        
+        # Сохраняем отложенные изменения, дописываем очередь записи и закрываем базу данных
+        try:
+            self.state_manager.flush_pending()
+        except Exception as e:
+            print(f"❌ Ошибка сохранения игр при завершении: {e}")
+        self.storage.close()
         sys.exit(0)
 
 def main():
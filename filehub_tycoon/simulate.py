@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Симуляция партий FileHub Tycoon для проверки баланса
+
+Пример:
+    python simulate.py --games 100000 --policy greedy --workers 8
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from game.simulator import POLICIES, run_simulation
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция партий FileHub Tycoon")
+    parser.add_argument('--games', type=int, default=10000, help="Количество партий")
+    parser.add_argument('--turns', type=int, default=100, help="Максимум ходов в партии")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random', help="Стратегия игрока")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов (по умолчанию - число ядер)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Партий в одной пачке")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора случайных чисел")
+    parser.add_argument('--engine', choices=['batch', 'scalar'], default='batch', help="Движок обработки ходов")
+    parser.add_argument('--stop-at-outcome', action='store_true',
+                        help="Заканчивать партию первой победой или поражением. По умолчанию партии "
+                             "доигрываются до последнего хода, как в боте, а поражение - проигрышное "
+                             "состояние в конце партии: новая партия (3 пользователя) формально "
+                             "проиграна уже на первом ходу")
+    parser.add_argument('--json', action='store_true', help="Вывести сводку в формате JSON")
+    return parser.parse_args(argv)
+
+def _format(value) -> str:
+    return "-" if value is None else f"{value:,.0f}"
+
+def print_summary(report: dict, elapsed: float):
+    """Вывод сводки в консоль"""
+    games = report['games']
+    print(f"Партий: {games:,} за {elapsed:.1f} с ({games / max(elapsed, 1e-9):,.0f} партий/с)")
+    print(f"Побед: {report['win_rate']:.1%}, средний ход победы: {_format(report['mean_win_turn'])}")
+    print(f"Поражений: {report['lose_rate']:.1%}, средний ход поражения: {_format(report['mean_lose_turn'])}")
+    reasons = ", ".join(f"{reason}: {count:,}" for reason, count in report['lose_reasons'].items())
+    print(f"Причины поражений: {reasons}")
+    print(f"Банкротств: {report['bankruptcy_rate']:.1%}, средний ход: {_format(report['mean_bankruptcy_turn'])}")
+
+    score = report['score']
+    print(f"Очки: среднее {_format(score['mean'])}, p10 {_format(score['p10'])}, "
+          f"медиана {_format(score['p50'])}, p90 {_format(score['p90'])}, максимум {_format(score['max'])}")
+
+    print("Бюджет по ходам:")
+    for turn, budget in report['budget'].items():
+        print(f"  ход {turn:>3}: партий {budget['games']:>8,}, p10 {_format(budget['p10']):>16}, "
+              f"медиана {_format(budget['p50']):>16}, p90 {_format(budget['p90']):>16}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+
+    summary = None
+    for summary in run_simulation(args.games, args.turns, seed=args.seed, policy=args.policy,
+                                  engine=args.engine, play_through=not args.stop_at_outcome,
+                                  workers=args.workers, chunk_size=args.chunk_size):
+        if not args.json:
+            print(f"\rСыграно партий: {summary.games:,} / {args.games:,}", end='', file=sys.stderr, flush=True)
+    if not args.json:
+        print(file=sys.stderr)
+
+    if summary is None:
+        print("Нет партий для симуляции", file=sys.stderr)
+        return 1
+
+    report = summary.to_dict()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_summary(report, time.perf_counter() - started)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Подбор балансовых констант FileHub Tycoon по результатам симуляции
+
+Пример:
+    python tune.py --param AD_METRICS.base_cpm=20:100:5 \\
+                   --param STAFF_SALARIES.CTO=100000,150000,200000 \\
+                   --objective target_win_rate --target-win-rate 0.4
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from game.simulator import POLICIES
+from game.tuning import (OBJECTIVES, ResultCache, parse_param, grid_candidates, random_candidates, search)
+from utils.config import Config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор балансовых констант по симуляции партий")
+    parser.add_argument('--param', action='append', required=True,
+                        help="ПУТЬ=a,b,c или ПУТЬ=мин:макс[:точек], например EVENTS.ddos_attack.probability=0.05:0.3")
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid', help="Способ выбора кандидатов")
+    parser.add_argument('--samples', type=int, default=20, help="Кандидатов при случайном поиске")
+    parser.add_argument('--objective', choices=OBJECTIVES, default='target_win_rate', help="Целевая функция")
+    parser.add_argument('--target-win-rate', type=float, default=0.5, help="Желаемая доля побед")
+    parser.add_argument('--min-games', type=int, default=500, help="Партий на первом круге отсева")
+    parser.add_argument('--max-games', type=int, default=5000, help="Партий на последнем круге")
+    parser.add_argument('--eta', type=int, default=3, help="Во сколько раз сокращать кандидатов за круг (1 - без отсева)")
+    parser.add_argument('--turns', type=int, default=100, help="Максимум ходов в партии")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random', help="Стратегия игрока")
+    parser.add_argument('--engine', choices=['batch', 'scalar'], default='batch', help="Движок обработки ходов")
+    parser.add_argument('--stop-at-outcome', action='store_true',
+                        help="Заканчивать партию первой победой или поражением (по умолчанию партии "
+                             "доигрываются, как в боте: иначе новые партии проигрываются на первом ходу)")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Партий в одной пачке")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно симуляции и случайного поиска")
+    parser.add_argument('--cache', default='simulation_cache.db', help="Файл с сохраненными результатами")
+    parser.add_argument('--top', type=int, default=5, help="Сколько лучших кандидатов показать")
+    parser.add_argument('--json', action='store_true', help="Вывести итог в формате JSON")
+    return parser.parse_args(argv)
+
+def format_params(params: dict) -> str:
+    return ", ".join(f"{path}={value:g}" if isinstance(value, float) else f"{path}={value}"
+                     for path, value in params.items())
+
+def main(argv=None):
+    args = parse_args(argv)
+    base = Config()
+    try:
+        spaces = [parse_param(spec, base) for spec in args.param]
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+
+    if args.search == 'grid':
+        candidates = grid_candidates(spaces, base)
+    else:
+        candidates = random_candidates(spaces, args.samples, args.seed, base)
+
+    cache = ResultCache(args.cache)
+    started = time.perf_counter()
+    print(f"Кандидатов: {len(candidates)}", file=sys.stderr)
+
+    rung = None
+    try:
+        for rung in search(candidates, args.objective, args.target_win_rate, args.min_games, args.max_games,
+                           args.eta, args.turns, args.seed, args.policy, args.engine, not args.stop_at_outcome,
+                           args.chunk_size, args.workers, cache):
+            best = rung['results'][0]
+            print(f"Круг {rung['rung'] + 1}: {len(rung['results'])} кандидатов по {rung['games']:,} партий, "
+                  f"лучший: {format_params(best['params'])} (потери {best['loss']:.4f})", file=sys.stderr)
+            if rung['tied']:
+                print("Предупреждение: у всех кандидатов одинаковые потери - параметры не влияют на цель "
+                      "при этих настройках, отсев на этом круге пропущен", file=sys.stderr)
+    finally:
+        cache.close()
+
+    results = rung['results'][:args.top]
+    if args.json:
+        print(json.dumps([{key: value for key, value in result.items() if key != 'candidate'}
+                          for result in results], ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Готово за {time.perf_counter() - started:.1f} с, "
+          f"из кэша пачек: {cache.hits}, посчитано: {cache.misses}")
+    for place, result in enumerate(results, 1):
+        report = result['report']
+        print(f"{place}. {format_params(result['params'])}")
+        print(f"   потери {result['loss']:.4f}, побед {report['win_rate']:.1%}, "
+              f"поражений {report['lose_rate']:.1%}, средние очки {report['score']['mean']:,.0f}, "
+              f"партий {result['games']:,}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,13 +12,36 @@ class Config:
         
         # Настройки базы данных
         self.DB_PATH = os.getenv('DB_PATH', 'file_hub_tycoon.db')
+        self.DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))  # Количество долгоживущих соединений
+        self.DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))  # Кэш страниц SQLite на соединение
+        self.DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024)))  # Размер mmap в байтах
+        self.DB_CODEC = os.getenv('DB_CODEC', 'msgpack')  # Кодек новых записей: msgpack или json
+        self.DB_TRUSTED_LOAD = os.getenv('DB_TRUSTED_LOAD', 'true').lower() == 'true'  # Загрузка своих записей без валидации
+        self.DB_WRITE_QUEUE_SIZE = int(os.getenv('DB_WRITE_QUEUE_SIZE', '1024'))  # Лимит очереди записи
+        self.STATE_CACHE_SIZE = int(os.getenv('STATE_CACHE_SIZE', '10000'))  # Игр, одновременно хранимых в памяти
+        self.STATE_CACHE_TTL = float(os.getenv('STATE_CACHE_TTL', '1800'))  # Секунд простоя до вытеснения игры
+        self.STATE_NEGATIVE_TTL = float(os.getenv('STATE_NEGATIVE_TTL', '60'))  # Секунд помнить об отсутствии игры
+        self.SAVE_BATCH_SIZE = int(os.getenv('SAVE_BATCH_SIZE', '64'))  # Игр в одной транзакции отложенной записи
+        self.SAVE_FLUSH_INTERVAL = float(os.getenv('SAVE_FLUSH_INTERVAL', '5'))  # Секунд между сбросами
+        self.STATE_STORAGE = os.getenv('STATE_STORAGE', 'sections')  # Хранение игр: sections или journal
+        self.SNAPSHOT_INTERVAL = int(os.getenv('SNAPSHOT_INTERVAL', '10'))  # Ходов между снимками в режиме journal
+        self.IDLE_CATCH_UP = os.getenv('IDLE_CATCH_UP', 'false').lower() == 'true'  # Игра идет без игрока (ход в GAME_SPEED часов)
+        self.TIMER_INTERVAL = float(os.getenv('TIMER_INTERVAL', '1'))  # Секунд между проверками сроков событий
+        self.DERIVED_METRICS_CHECK = os.getenv('DERIVED_METRICS_CHECK', 'false').lower() == 'true'  # Сверять кэш метрик с пересчетом
+        self.PLAN_BUDGET_MS = float(os.getenv('PLAN_BUDGET_MS', '200'))  # Бюджет времени поиска плана /plan
+        self.PLAN_MAX_DEPTH = int(os.getenv('PLAN_MAX_DEPTH', '4'))  # Максимальная глубина плана в ходах
+        self.PLAN_SAMPLES = int(os.getenv('PLAN_SAMPLES', '3'))  # Выборок случайности на ход
+        self.PLAN_WORKERS = int(os.getenv('PLAN_WORKERS', '1'))  # Процессов поиска планов
+        self.PROJECTION_FUTURES = int(os.getenv('PROJECTION_FUTURES', '64'))  # Вариантов будущего в прогнозе покупки
+        self.PROJECTION_TURNS = int(os.getenv('PROJECTION_TURNS', '10'))  # Ходов в прогнозе покупки
         
         # Игровые константы
         self.GAME_CONFIG = {
             'STARTING_BUDGET': 100000,  # Начальный бюджет в рублях
             'STARTING_USERS': 3,        # Начальное количество пользователей
-            'TICK_DURATION': 24,        # Часов в одном ходу игры
+            'TICK_DURATION': float(os.getenv('GAME_SPEED', '24')),  # Часов в одном ходу игры
             'MAX_ACTIONS_PER_TURN': 3,  # Максимум действий за ход
+            'MAX_FAST_FORWARD_TURNS': 50,  # Максимум ходов за одну команду /next N
             'SUCCESS_THRESHOLD': 80,    # Порог для победы
             'BANKRUPTCY_THRESHOLD': 0,  # Порог банкротства
             'DOMAIN_BLOCK_PROBABILITY': 0.12,  # Вероятность блокировки домена за ход
@@ -156,6 +179,13 @@ class Config:
             'penalty_threshold': 70
         }
         
+        # Юридические действия (/law): стоимость и изменение риска
+        self.LEGAL_ACTIONS = {
+            'hire_lawyers': {'cost': 40000, 'effect': -15, 'description': 'Снижение юридического риска на 15 пунктов'},
+            'increase_transparency': {'cost': 20000, 'effect': -10, 'description': 'Снижение юридического риска на 10 пунктов'},
+            'cooperate_rights_holders': {'cost': 30000, 'effect': -12, 'description': 'Снижение юридического риска на 12 пунктов'}
+        }
+        
         # Рекламные метрики
         self.AD_METRICS = {
             'base_cpm': 50,       # Базовый CPM в рублях
@@ -212,6 +242,27 @@ class Config:
                 'duration': 0
             }
         }
+        
+        # Поправки вероятностей событий к состоянию игры (game/event_sampler.py):
+        # границы корзин признака (или его уровни) и множители весов по корзинам.
+        # probability в EVENTS задает доли типов событий, а частота событий за ход
+        # равна RANDOM_EVENT_CHANCE (game/event_catalog.py) при множителях 1 и
+        # меняется вместе с ними: множитель 2 удваивает вероятность этого события,
+        # не уменьшая вероятности остальных
+        self.EVENT_MODIFIERS = {
+            'legal_risk': {
+                'bounds': [25, 60],  # Низкий, средний, высокий риск
+                'weights': {'regulatory_check': [0.5, 1.0, 2.0]}
+            },
+            'security_level': {
+                'levels': ['basic', 'advanced', 'enterprise'],
+                'weights': {'security_breach': [1.0, 0.7, 0.4], 'ddos_attack': [1.0, 0.8, 0.6]}
+            },
+            'uptime': {
+                'bounds': [95, 99.5],  # Низкая, обычная, высокая доступность
+                'weights': {'server_outage': [2.0, 1.0, 0.6]}
+            }
+        }
     
     def get_staff_salary(self, role: str) -> int:
         """Получить зарплату для роли"""
@@ -237,39 +288,41 @@ class Config:
         """Получить влияние события"""
         return self.EVENTS.get(event_type, {}).get('impact', 0)
     
-    def generate_site_name(self) -> str:
-        """Генерация случайного названия сайта"""
+    def generate_site_name(self, rng=None) -> str:
+        """Генерация случайного названия сайта (rng - генератор, по умолчанию модуль random)"""
         import random
+        rng = rng or random
         
-        prefix = random.choice(self.SITE_NAME_COMPONENTS['prefixes'])
-        middle = random.choice(self.SITE_NAME_COMPONENTS['middle'])
-        suffix = random.choice(self.SITE_NAME_COMPONENTS['suffixes'])
-        domain = random.choice(self.SITE_NAME_COMPONENTS['domains'])
+        prefix = rng.choice(self.SITE_NAME_COMPONENTS['prefixes'])
+        middle = rng.choice(self.SITE_NAME_COMPONENTS['middle'])
+        suffix = rng.choice(self.SITE_NAME_COMPONENTS['suffixes'])
+        domain = rng.choice(self.SITE_NAME_COMPONENTS['domains'])
         
         # Случайно добавляем middle или нет
-        if random.random() < 0.7:  # 70% шанс добавить middle
+        if rng.random() < 0.7:  # 70% шанс добавить middle
             name = f"{prefix}{middle}{suffix}"
         else:
             name = f"{prefix}{suffix}"
         
         return name + domain
     
-    def generate_custom_domain(self, site_name: str) -> str:
-        """Генерация домена на основе названия сайта"""
+    def generate_custom_domain(self, site_name: str, rng=None) -> str:
+        """Генерация домена на основе названия сайта (rng - генератор, по умолчанию модуль random)"""
         import random
+        rng = rng or random
         
         # Убираем пробелы и превращаем в нижний регистр
         clean_name = ''.join(c for c in site_name.lower() if c.isalnum())
         
         # Добавляем случайный суффикс
         suffixes = ['hub', 'zone', 'net', 'pro', 'plus', 'max', 'ultra']
-        suffix = random.choice(suffixes)
+        suffix = rng.choice(suffixes)
         
         domain = f"{clean_name}{suffix}"
         
         # Добавляем случайный домен
         domains = ['.com', '.net', '.org', '.info', '.xyz']
-        domain += random.choice(domains)
+        domain += rng.choice(domains)
         
         return domain
     
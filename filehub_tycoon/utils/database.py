@@ -1,88 +1,668 @@
 # Модуль базы данных для симулятора
 
+import asyncio
 import sqlite3
 import json
 import logging
-from typing import Optional, Dict, Any
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Optional, Dict, Any, Iterator, List, Callable, Iterable, Tuple, Union
 from pathlib import Path
 
+try:
+    import msgpack
+except ImportError:  # Бинарный кодек недоступен, используется JSON
+    msgpack = None
+
+from game.models import GameState, CORE_SECTION, STATE_SECTIONS, LOG_ACTION, UserRole, InfrastructureLevel, HostingRegion
+
 logger = logging.getLogger(__name__)
 
+class JsonCodec:
+    """Текстовый JSON-кодек (формат, в котором хранились все ранние записи)"""
+    codec_id = 1
+    name = 'json'
+
+    def encode(self, data: Any) -> str:
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+    def decode(self, blob: Union[str, bytes]) -> Any:
+        return json.loads(blob)
+
+class BinaryCodec:
+    """Компактный бинарный кодек на основе msgpack
+
+    Перечисления кодируются номером в таблице _ENUM_TABLE, даты - целым числом
+    микросекунд от эпохи, данные больше порога дополнительно сжимаются zlib.
+    """
+    codec_id = 2
+    name = 'msgpack'
+
+    # Таблица кодирования перечислений: новые значения добавляются ТОЛЬКО в конец,
+    # иначе старые записи будут прочитаны неверно
+    _ENUM_TABLE = (
+        UserRole.CTO, UserRole.CMO, UserRole.COO, UserRole.CLO,
+        UserRole.COMMUNITY_MANAGER, UserRole.DATA_ANALYST,
+        InfrastructureLevel.BASIC, InfrastructureLevel.ADVANCED, InfrastructureLevel.ENTERPRISE,
+        HostingRegion.RUSSIA, HostingRegion.NETHERLANDS, HostingRegion.SINGAPORE, HostingRegion.USA
+    )
+    _ENUM_INDEX = {member: index for index, member in enumerate(_ENUM_TABLE)}
+
+    # Типы расширений msgpack
+    _EXT_ENUM = 1
+    _EXT_DATETIME = 2      # Дата без часового пояса
+    _EXT_DATETIME_UTC = 3  # Дата с часовым поясом, приведенная к UTC
+    _EXT_BIGINT = 4        # Целое, не помещающееся в 64 бита
+
+    # Первый байт записи - флаги формата
+    _FLAG_RAW = b'\x00'
+    _FLAG_ZLIB = b'\x01'
+
+    _EPOCH = datetime(1970, 1, 1)
+    _DATETIME = struct.Struct('>q')
+
+    def __init__(self, compress_threshold: int = 512, compress_level: int = 6):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def _default(self, obj: Any) -> Any:
+        """Кодирование типов, которые msgpack не поддерживает напрямую"""
+        if isinstance(obj, Enum):
+            index = self._ENUM_INDEX.get(obj)
+            if index is not None:
+                return msgpack.ExtType(self._EXT_ENUM, bytes((index,)))
+            return obj.value
+        if isinstance(obj, datetime):
+            if obj.tzinfo is not None:
+                micros = (obj.astimezone(timezone.utc).replace(tzinfo=None) - self._EPOCH) // timedelta(microseconds=1)
+                return msgpack.ExtType(self._EXT_DATETIME_UTC, self._DATETIME.pack(micros))
+            micros = (obj - self._EPOCH) // timedelta(microseconds=1)
+            return msgpack.ExtType(self._EXT_DATETIME, self._DATETIME.pack(micros))
+        if isinstance(obj, int):
+            return msgpack.ExtType(self._EXT_BIGINT, obj.to_bytes(obj.bit_length() // 8 + 1, 'big', signed=True))
+        if isinstance(obj, tuple):
+            return list(obj)
+        if isinstance(obj, str):
+            return str(obj)
+        raise TypeError(f"Тип {type(obj).__name__} не поддерживается бинарным кодеком")
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        """Декодирование расширений msgpack"""
+        if code == self._EXT_ENUM:
+            return self._ENUM_TABLE[data[0]]
+        if code == self._EXT_DATETIME:
+            return self._EPOCH + timedelta(microseconds=self._DATETIME.unpack(data)[0])
+        if code == self._EXT_DATETIME_UTC:
+            moment = self._EPOCH + timedelta(microseconds=self._DATETIME.unpack(data)[0])
+            return moment.replace(tzinfo=timezone.utc)
+        if code == self._EXT_BIGINT:
+            return int.from_bytes(data, 'big', signed=True)
+        return msgpack.ExtType(code, data)
+
+    def encode(self, data: Any) -> bytes:
+        packed = msgpack.packb(data, default=self._default, strict_types=True, use_bin_type=True)
+        if len(packed) > self.compress_threshold:
+            compressed = zlib.compress(packed, self.compress_level)
+            if len(compressed) < len(packed):
+                return self._FLAG_ZLIB + compressed
+        return self._FLAG_RAW + packed
+
+    def decode(self, blob: bytes) -> Any:
+        payload = blob[1:]
+        if blob[:1] == self._FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        return msgpack.unpackb(payload, ext_hook=self._ext_hook, strict_map_key=False, raw=False)
+
+# Реестр кодеков по номеру версии, который хранится в каждой строке
+CODECS: Dict[int, Any] = {}
+
+def register_codec(codec: Any):
+    """Регистрация кодека в реестре"""
+    CODECS[codec.codec_id] = codec
+
+def get_codec(name: str) -> Any:
+    """Получение кодека по имени"""
+    for codec in CODECS.values():
+        if codec.name == name:
+            return codec
+    raise KeyError(f"Неизвестный кодек: {name}")
+
+register_codec(JsonCodec())
+if msgpack is not None:
+    register_codec(BinaryCodec())
+
+# SQL-выражения вынесены в константы: одинаковый текст запроса позволяет
+# sqlite3 переиспользовать подготовленные выражения из кэша соединения
+_UPSERT_GAME_SQL = '''
+    INSERT INTO games (user_id, tracker_name, game_state, version, updated_at)
+    VALUES (?, ?, NULL, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        tracker_name = excluded.tracker_name,
+        game_state = NULL,
+        version = excluded.version,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+_SAVE_SECTION_SQL = '''
+    INSERT OR REPLACE INTO game_sections (user_id, section, data, version, codec)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_SAVE_EVENT_SQL = '''
+    INSERT OR IGNORE INTO events (user_id, turn, seq, kind, data, codec)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+_SAVE_SNAPSHOT_SQL = '''
+    INSERT OR REPLACE INTO snapshots (user_id, turn, log_seq, version, data, codec)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Для восстановления нужен только последний снимок
+_PRUNE_SNAPSHOTS_SQL = '''
+    DELETE FROM snapshots WHERE user_id = ? AND turn < ?
+'''
+
+_LOAD_SNAPSHOT_SQL = '''
+    SELECT turn, log_seq, data, codec FROM snapshots
+    WHERE user_id = ? ORDER BY turn DESC LIMIT 1
+'''
+
+_LOAD_ACTIONS_SQL = f'''
+    SELECT data, codec FROM events
+    WHERE user_id = ? AND turn >= ? AND seq > ? AND kind = '{LOG_ACTION}'
+    ORDER BY turn, seq
+'''
+
+_LOAD_GAME_SQL = '''
+    SELECT user_id, tracker_name, game_state, created_at, updated_at
+    FROM games WHERE user_id = ?
+'''
+
+_LOAD_SECTIONS_SQL = '''
+    SELECT section, data, codec FROM game_sections WHERE user_id = ?
+'''
+
 class Database:
     """Класс для работы с базой данных игры"""
-    
-    def __init__(self, db_path: str = "file_hub_tycoon.db"):
+
+    def __init__(self, db_path: str = "file_hub_tycoon.db", pool_size: int = 4,
+                 cache_size_kb: int = 16384, mmap_size: int = 128 * 1024 * 1024,
+                 cached_statements: int = 128, busy_timeout_ms: int = 5000,
+                 codec: str = 'json'):
         self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+
+        # Кодек для новых записей; старые читаются кодеком, указанным в строке
+        if codec not in (c.name for c in CODECS.values()):
+            logger.warning(f"Кодек {codec} недоступен, используется json")
+            codec = JsonCodec.name
+        self.codec = get_codec(codec)
+
+        # Пул долгоживущих соединений (LIFO - чаще выдаем "горячие" соединения)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=self.pool_size)
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
         self._init_database()
-    
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Создание соединения с настройками производительности"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # Соединение используется одним потоком за раз через пул
+            cached_statements=self.cached_statements
+        )
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")  # Отрицательное значение - в КиБ
+        cursor.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Получение соединения из пула"""
+        if self._closed:
+            raise RuntimeError("База данных закрыта")
+
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Пул пуст - создаем новое соединение, если не достигнут лимит
+        with self._pool_lock:
+            if len(self._connections) < self.pool_size:
+                conn = self._create_connection()
+                self._connections.append(conn)
+                return conn
+
+        # Все соединения заняты - ждем освобождения
+        return self._pool.get(timeout=self.busy_timeout_ms / 1000)
+
+    def _release(self, conn: sqlite3.Connection):
+        """Возврат соединения в пул"""
+        if self._closed:
+            conn.close()
+            return
+        self._pool.put_nowait(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдача соединения из пула на время операции"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._pool_lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            while True:
+                try:
+                    conn = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    conn.execute("PRAGMA optimize")
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Ошибка закрытия соединения с базой данных: {e}")
+
+            # Соединения, выданные в данный момент, закрываются при возврате в пул
+            self._connections.clear()
+            logger.info("Соединения с базой данных закрыты")
+
     def _init_database(self):
         """Инициализация базы данных"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn, conn:
                 cursor = conn.cursor()
 
-                # Таблица игр - хранит состояние игры для каждого пользователя
+                # Таблица игр - хранит заголовок игры для каждого пользователя.
+                # Колонка game_state содержит JSON всего состояния только у старых записей.
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS games (
                         user_id INTEGER PRIMARY KEY,
                         tracker_name TEXT,
                         game_state TEXT,  -- JSON
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        version INTEGER DEFAULT 0
                     )
                 ''')
 
-                conn.commit()
+                # Секции состояния игры - записываются только измененные
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS game_sections (
+                        user_id INTEGER NOT NULL,
+                        section TEXT NOT NULL,
+                        data BLOB,  -- Закодировано кодеком из колонки codec
+                        version INTEGER NOT NULL,
+                        codec INTEGER NOT NULL DEFAULT 1,
+                        PRIMARY KEY (user_id, section)
+                    ) WITHOUT ROWID
+                ''')
+
+                # Журнал событий игры - только добавление, в состоянии хранятся лишь последние записи
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS events (
+                        user_id INTEGER NOT NULL,
+                        turn INTEGER NOT NULL,
+                        seq INTEGER NOT NULL,
+                        kind TEXT NOT NULL,
+                        data BLOB,
+                        codec INTEGER NOT NULL DEFAULT 1,
+                        PRIMARY KEY (user_id, turn, seq)
+                    ) WITHOUT ROWID
+                ''')
+
+                # Снимки полного состояния для восстановления игры из журнала действий
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS snapshots (
+                        user_id INTEGER NOT NULL,
+                        turn INTEGER NOT NULL,
+                        log_seq INTEGER NOT NULL,  -- Последняя запись журнала, вошедшая в снимок
+                        version INTEGER NOT NULL,
+                        data BLOB,
+                        codec INTEGER NOT NULL DEFAULT 1,
+                        PRIMARY KEY (user_id, turn)
+                    ) WITHOUT ROWID
+                ''')
+
+                self._migrate(cursor)
                 logger.info("База данных успешно инициализирована")
 
         except Exception as e:
             logger.error(f"Ошибка инициализации базы данных: {e}")
             raise
-    
-    def save_game(self, user_id: int, tracker_name: str, game_state: Dict[str, Any]) -> bool:
-        """Сохранение состояния игры для пользователя"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
 
-                game_state_json = json.dumps(game_state, default=str, ensure_ascii=False)
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Добавление колонок, отсутствующих в базах старых версий"""
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(games)")}
+        if 'version' not in columns:
+            cursor.execute("ALTER TABLE games ADD COLUMN version INTEGER DEFAULT 0")
 
-                cursor.execute('''
-                    INSERT OR REPLACE INTO games
-                    (user_id, tracker_name, game_state, updated_at)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (user_id, tracker_name, game_state_json))
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(game_sections)")}
+        if 'codec' not in columns:
+            cursor.execute(f"ALTER TABLE game_sections ADD COLUMN codec INTEGER NOT NULL DEFAULT {JsonCodec.codec_id}")
+
+    def _section_rows(self, user_id: int, version: int, sections: Dict[str, Any]) -> List[tuple]:
+        """Строки секций для записи"""
+        codec = self.codec
+        return [
+            (user_id, section, codec.encode(data), version, codec.codec_id)
+            for section, data in sections.items()
+        ]
 
-                conn.commit()
+    def _event_rows(self, user_id: int, log: Iterable[Tuple[int, int, str, Any]]) -> List[tuple]:
+        """Строки журнала событий для записи"""
+        codec = self.codec
+        return [
+            (user_id, turn, seq, kind, codec.encode(data), codec.codec_id)
+            for turn, seq, kind, data in log
+        ]
+
+    def save_game(self, user_id: int, tracker_name: str, version: int, sections: Dict[str, Any],
+                  log: Optional[List[Tuple[int, int, str, Any]]] = None,
+                  snapshot: Optional[Tuple[int, int, Dict[str, Any]]] = None) -> bool:
+        """Сохранение измененных секций состояния игры для пользователя"""
+        return self.save_games([(user_id, tracker_name, version, sections, log or [], snapshot)])
+
+    def save_games(self, games: List[Tuple[int, str, int, Dict[str, Any], List[Tuple[int, int, str, Any]],
+                                           Optional[Tuple[int, int, Dict[str, Any]]]]]) -> bool:
+        """Сохранение пачки игр одной транзакцией
+
+        Каждая игра передается как (user_id, tracker_name, version, sections, log, snapshot),
+        где sections содержит только секции, которые нужно перезаписать, log -
+        новые записи журнала событий в виде (turn, seq, kind, data), а snapshot -
+        None или снимок всех секций в виде (turn, log_seq, sections).
+        """
+        try:
+            headers = []
+            section_rows = []
+            event_rows = []
+            snapshot_rows = []
+            codec = self.codec
+            for user_id, tracker_name, version, sections, log, snapshot in games:
+                headers.append((user_id, tracker_name, version))
+                section_rows.extend(self._section_rows(user_id, version, sections))
+                event_rows.extend(self._event_rows(user_id, log))
+                if snapshot is not None:
+                    turn, log_seq, data = snapshot
+                    snapshot_rows.append((user_id, turn, log_seq, version, codec.encode(data), codec.codec_id))
+
+            with self.connection() as conn, conn:
+                conn.executemany(_UPSERT_GAME_SQL, headers)
+                if section_rows:
+                    conn.executemany(_SAVE_SECTION_SQL, section_rows)
+                if event_rows:
+                    conn.executemany(_SAVE_EVENT_SQL, event_rows)
+                if snapshot_rows:
+                    conn.executemany(_SAVE_SNAPSHOT_SQL, snapshot_rows)
+                    conn.executemany(_PRUNE_SNAPSHOTS_SQL, [row[:2] for row in snapshot_rows])
                 return True
 
         except Exception as e:
-            logger.error(f"Ошибка сохранения игры для пользователя {user_id}: {e}")
+            logger.error(f"Ошибка сохранения {len(games)} игр: {e}")
             return False
-    
+
+    def _read_sections(self, conn: sqlite3.Connection, user_id: int,
+                       sections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Чтение секций состояния игры (всех или указанных)"""
+        if sections is None:
+            rows = conn.execute(_LOAD_SECTIONS_SQL, (user_id,)).fetchall()
+        else:
+            sections = list(sections)
+            placeholders = ', '.join('?' * len(sections))
+            rows = conn.execute(
+                f"SELECT section, data, codec FROM game_sections WHERE user_id = ? AND section IN ({placeholders})",
+                (user_id, *sections)
+            ).fetchall()
+        return {section: CODECS[codec].decode(data) if data else None for section, data, codec in rows}
+
     def load_game(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Загрузка состояния игры для пользователя"""
+        """Загрузка состояния игры для пользователя
+
+        Основа состояния - секции или последний снимок, смотря что новее по
+        журналу. В 'actions' возвращаются действия игрока, записанные после
+        основы: их нужно повторить (game/actions.py, replay).
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT user_id, tracker_name, game_state, created_at, updated_at
-                    FROM games WHERE user_id = ?
-                ''', (user_id,))
-                row = cursor.fetchone()
-
-                if row:
-                    game_data = {
-                        'user_id': row[0],
-                        'tracker_name': row[1],
-                        'game_state': json.loads(row[2]) if row[2] else None,
-                        'created_at': row[3],
-                        'updated_at': row[4]
-                    }
-                    return game_data
-                return None
+            with self.connection() as conn:
+                # Заголовок, секции, снимок и журнал читаются из одного снимка базы
+                conn.execute("BEGIN")
+                try:
+                    row = conn.execute(_LOAD_GAME_SQL, (user_id,)).fetchone()
+                    if not row:
+                        return None
+                    sections = self._read_sections(conn, user_id)
+                    snapshot = conn.execute(_LOAD_SNAPSHOT_SQL, (user_id,)).fetchone()
+
+                    snapshot_turn = None
+                    sections_log_seq = (sections.get(CORE_SECTION) or {}).get('log_seq', 0)
+                    if snapshot and (not sections or snapshot[1] > sections_log_seq):
+                        snapshot_turn, _, data, codec = snapshot
+                        game_state = GameState.merge_sections(CODECS[codec].decode(data))
+                    elif sections:
+                        game_state = GameState.merge_sections(sections)
+                    else:
+                        # Старые записи хранят состояние одним JSON в таблице games
+                        game_state = json.loads(row[2]) if row[2] else None
+
+                    actions = []
+                    if game_state:
+                        actions = [
+                            CODECS[codec].decode(data)
+                            for data, codec in conn.execute(
+                                _LOAD_ACTIONS_SQL,
+                                (user_id, game_state.get('current_turn', 0), game_state.get('log_seq', 0))
+                            )
+                        ]
+                finally:
+                    conn.rollback()
+
+            return {
+                'user_id': row[0],
+                'tracker_name': row[1],
+                'game_state': game_state,
+                'actions': actions,
+                'snapshot_turn': snapshot_turn,
+                'created_at': row[3],
+                'updated_at': row[4],
+                'legacy': not sections and snapshot_turn is None
+            }
 
         except Exception as e:
             logger.error(f"Ошибка загрузки игры для пользователя {user_id}: {e}")
             return None
-    
\ No newline at end of file
+
+    def load_sections(self, user_id: int, sections: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Частичная загрузка состояния игры (для экранов только для чтения)"""
+        try:
+            sections = list(sections)
+            with self.connection() as conn:
+                data = self._read_sections(conn, user_id, sections)
+                if data:
+                    return data
+
+                # Старая запись - берем секции из полного JSON
+                row = conn.execute(_LOAD_GAME_SQL, (user_id,)).fetchone()
+                if not row or not row[2]:
+                    return None
+                game_state = json.loads(row[2])
+
+            data = {}
+            for section in sections:
+                if section == CORE_SECTION:
+                    data[section] = {k: v for k, v in game_state.items() if k not in STATE_SECTIONS}
+                elif section in game_state:
+                    data[section] = game_state[section]
+            return data
+
+        except Exception as e:
+            logger.error(f"Ошибка частичной загрузки игры для пользователя {user_id}: {e}")
+            return None
+
+    def load_events(self, user_id: int, kinds: Optional[Iterable[str]] = None,
+                    since_turn: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Чтение журнала событий пользователя (от новых к старым)"""
+        try:
+            query = "SELECT turn, seq, kind, data, codec FROM events WHERE user_id = ?"
+            params: List[Any] = [user_id]
+            if kinds is not None:
+                kinds = list(kinds)
+                query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                params.extend(kinds)
+            if since_turn is not None:
+                query += " AND turn >= ?"
+                params.append(since_turn)
+            query += " ORDER BY turn DESC, seq DESC"
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+
+            with self.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+            return [
+                {'turn': turn, 'seq': seq, 'kind': kind, 'data': CODECS[codec].decode(data) if data else None}
+                for turn, seq, kind, data, codec in rows
+            ]
+
+        except Exception as e:
+            logger.error(f"Ошибка чтения журнала событий пользователя {user_id}: {e}")
+            return []
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database для обработчиков бота
+
+    Запись выполняется в выделенном потоке-писателе через ограниченную очередь,
+    чтение - в небольшом пуле потоков. Event loop не ждет диск ни в одном из случаев.
+    """
+
+    def __init__(self, db: Database, queue_size: int = 1024, read_workers: int = 2):
+        self.db = db
+        self.queue_size = max(1, queue_size)
+
+        self._write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._write_slots: Optional[asyncio.Semaphore] = None  # Создается в event loop при первом вызове
+        self._pending_writes: Dict[int, "asyncio.Future"] = {}  # Последняя запись каждого пользователя
+        self._reader = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-reader")
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._closed = False
+        self._writer.start()
+
+    def _writer_loop(self):
+        """Цикл потока-писателя: выполняет операции записи по очереди"""
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+
+            func, args, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit_write(self, func: Callable, *args) -> Future:
+        """Постановка операции записи в очередь потока-писателя"""
+        if self._closed:
+            raise RuntimeError("Хранилище закрыто")
+        future: Future = Future()
+        self._write_queue.put((func, args, future))
+        return future
+
+    async def _run_write(self, user_ids: Iterable[int], func: Callable, *args):
+        """Выполнение записи с ограничением длины очереди"""
+        if self._write_slots is None:
+            self._write_slots = asyncio.Semaphore(self.queue_size)
+
+        # Если очередь заполнена, обработчик ждет свободного места, не блокируя event loop
+        async with self._write_slots:
+            future = asyncio.wrap_future(self.submit_write(func, *args))
+            user_ids = list(user_ids)
+            for user_id in user_ids:
+                self._pending_writes[user_id] = future
+            try:
+                return await future
+            finally:
+                for user_id in user_ids:
+                    if self._pending_writes.get(user_id) is future:
+                        del self._pending_writes[user_id]
+
+    async def save_game(self, user_id: int, tracker_name: str, version: int, sections: Dict[str, Any],
+                        log: Optional[List[Tuple[int, int, str, Any]]] = None,
+                        snapshot: Optional[Tuple[int, int, Dict[str, Any]]] = None) -> bool:
+        """Асинхронное сохранение секций состояния игры"""
+        return await self._run_write([user_id], self.db.save_game, user_id, tracker_name, version, sections, log,
+                                     snapshot)
+
+    async def save_games(self, games: List[Tuple[int, str, int, Dict[str, Any], List[Tuple[int, int, str, Any]],
+                                                 Optional[Tuple[int, int, Dict[str, Any]]]]]) -> bool:
+        """Асинхронное сохранение пачки игр одной транзакцией"""
+        return await self._run_write([game[0] for game in games], self.db.save_games, games)
+
+    async def load_game(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Асинхронная загрузка состояния игры"""
+        # Дожидаемся записи этого пользователя, уже стоящей в очереди, чтобы не прочитать старые данные
+        pending = self._pending_writes.get(user_id)
+        if pending is not None:
+            await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, self.db.load_game, user_id)
+
+    async def load_sections(self, user_id: int, sections: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Асинхронная частичная загрузка состояния игры"""
+        pending = self._pending_writes.get(user_id)
+        if pending is not None:
+            await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, self.db.load_sections, user_id, list(sections))
+
+    async def load_events(self, user_id: int, kinds: Optional[Iterable[str]] = None,
+                          since_turn: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Асинхронное чтение журнала событий"""
+        pending = self._pending_writes.get(user_id)
+        if pending is not None:
+            await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        kinds = list(kinds) if kinds is not None else None
+        return await loop.run_in_executor(self._reader, self.db.load_events, user_id, kinds, since_turn, limit)
+
+    def close(self):
+        """Завершение потока-писателя (с дозаписью очереди) и закрытие базы данных"""
+        if self._closed:
+            return
+        self._closed = True
+
+        self._write_queue.put(None)
+        self._writer.join()
+        self._reader.shutdown(wait=True)
+        self.db.close()
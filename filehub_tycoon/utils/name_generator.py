@@ -35,19 +35,19 @@ class TrackerNameGenerator:
     ]
     
     @classmethod
-    def generate_random_name(cls) -> Tuple[str, str]:
-        """Генерация случайного названия сайта и домена"""
+    def generate_random_name(cls, rng=random) -> Tuple[str, str]:
+        """Генерация случайного названия сайта и домена (rng - генератор, по умолчанию модуль random)"""
         
         # Генерируем название сайта
         name_parts = []
         
         # Добавляем префикс (50% вероятность)
-        if random.random() < 0.5:
-            prefix = random.choice(cls.PREFIXES)
+        if rng.random() < 0.5:
+            prefix = rng.choice(cls.PREFIXES)
             name_parts.append(prefix)
         
         # Добавляем основное слово или оставляем пустым
-        main_word = random.choice([
+        main_word = rng.choice([
             "", "Мир", "Клуб", "Зона", "Центр", "Портал", "Сервис",
             "World", "Club", "Zone", "Center", "Portal", "Service",
             "Топ", "Бест", "Лучший", "Первый", "Главный",
@@ -57,8 +57,8 @@ class TrackerNameGenerator:
             name_parts.append(main_word)
         
         # Добавляем суффикс (30% вероятность)
-        if random.random() < 0.3:
-            suffix = random.choice(cls.SUFFIXES)
+        if rng.random() < 0.3:
+            suffix = rng.choice(cls.SUFFIXES)
             name_parts.append(suffix)
         
         # Формируем название
@@ -68,50 +68,50 @@ class TrackerNameGenerator:
         site_name = " ".join(name_parts)
         
         # Генерируем домен
-        domain = cls._generate_domain()
+        domain = cls._generate_domain(rng)
         
         return site_name, domain
     
     @classmethod
-    def _generate_domain(cls) -> str:
+    def _generate_domain(cls, rng=random) -> str:
         """Генерация случайного домена"""
         
         # Случайно выбираем тип генерации
-        generation_type = random.choice(["prefix_domain", "full_name", "number_domain"])
+        generation_type = rng.choice(["prefix_domain", "full_name", "number_domain"])
         
         if generation_type == "prefix_domain":
             # Используем префикс + стандартный домен
-            prefix = random.choice(cls.DOMAIN_PREFIXES)
-            domain_tld = random.choice(cls.DOMAINS)
-            domain = f"{prefix}{random.randint(1, 99)}.{domain_tld}"
+            prefix = rng.choice(cls.DOMAIN_PREFIXES)
+            domain_tld = rng.choice(cls.DOMAINS)
+            domain = f"{prefix}{rng.randint(1, 99)}.{domain_tld}"
             
         elif generation_type == "full_name":
             # Используем полное название в домене
-            main_word = random.choice(cls.PREFIXES + cls.SUFFIXES)
-            domain_tld = random.choice(cls.DOMAINS)
+            main_word = rng.choice(cls.PREFIXES + cls.SUFFIXES)
+            domain_tld = rng.choice(cls.DOMAINS)
             # Убираем пробелы и делаем lowercase
             main_word = re.sub(r'\s+', '', main_word.lower())
             domain = f"{main_word}.{domain_tld}"
             
         else:  # number_domain
             # Простой домен с номером
-            domain_tld = random.choice(cls.DOMAINS)
-            domain = f"hub{random.randint(100, 999)}.{domain_tld}"
+            domain_tld = rng.choice(cls.DOMAINS)
+            domain = f"hub{rng.randint(100, 999)}.{domain_tld}"
         
         # Проверяем длину домена (не более 25 символов)
         if len(domain) > 25:
-            domain = f"fh{random.randint(1000, 9999)}.{random.choice(cls.DOMAINS)}"
+            domain = f"fh{rng.randint(1000, 9999)}.{rng.choice(cls.DOMAINS)}"
         
         return domain
     
     @classmethod
-    def generate_multiple_options(cls, count: int = 5) -> List[Tuple[str, str]]:
+    def generate_multiple_options(cls, count: int = 5, rng=random) -> List[Tuple[str, str]]:
         """Генерация нескольких вариантов названий"""
         options = []
         used_domains = set()
         
         while len(options) < count:
-            name, domain = cls.generate_random_name()
+            name, domain = cls.generate_random_name(rng)
             
             # Избегаем повторяющихся доменов
             if domain not in used_domains:
@@ -0,0 +1,113 @@
+# Ограниченный кэш активных состояний игр
+
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Callable, Tuple
+
+from game.models import GameState
+
+class StateCache:
+    """LRU-кэш состояний игр с ограничением числа записей и временем простоя
+
+    Записи упорядочены по последнему обращению, поэтому устаревшие по TTL
+    всегда находятся в начале и вытесняются вместе с лишними по размеру.
+    Вытесненное состояние передается в on_evict (например, для записи в базу).
+    Отдельно хранится негативный кэш пользователей без игры.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 1800.0, negative_ttl: float = 60.0,
+                 on_evict: Optional[Callable[[int, GameState], None]] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.on_evict = on_evict
+
+        self._entries: "OrderedDict[int, Tuple[GameState, float]]" = OrderedDict()
+        self._missing: Dict[int, float] = {}  # Пользователь -> момент истечения негативной записи
+
+        self.stats = {
+            'hits': 0,            # Найдено в кэше
+            'misses': 0,          # Не найдено в кэше
+            'evictions': 0,       # Вытеснено по размеру
+            'expirations': 0,     # Вытеснено по времени простоя
+            'negative_hits': 0    # Запросов, отвеченных негативным кэшем
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int) -> Optional[GameState]:
+        """Получение состояния с обновлением времени последнего обращения"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        now = time.monotonic()
+        game_state, last_access = entry
+        if now - last_access > self.ttl:
+            self.stats['expirations'] += 1
+            self._evict(user_id)
+            self.stats['misses'] += 1
+            return None
+
+        self._entries[user_id] = (game_state, now)
+        self._entries.move_to_end(user_id)
+        self.stats['hits'] += 1
+        return game_state
+
+    def put(self, user_id: int, game_state: GameState):
+        """Добавление состояния с вытеснением устаревших и лишних записей"""
+        self._missing.pop(user_id, None)
+        self._entries[user_id] = (game_state, time.monotonic())
+        self._entries.move_to_end(user_id)
+        self.evict_expired()
+        while len(self._entries) > self.max_entries:
+            self.stats['evictions'] += 1
+            self._evict(next(iter(self._entries)))
+
+    def pop(self, user_id: int) -> Optional[GameState]:
+        """Удаление состояния из кэша без вызова on_evict"""
+        entry = self._entries.pop(user_id, None)
+        return entry[0] if entry else None
+
+    def evict_expired(self) -> int:
+        """Вытеснение записей, простаивающих дольше TTL"""
+        deadline = time.monotonic() - self.ttl
+        expired = 0
+        while self._entries:
+            user_id, (_, last_access) = next(iter(self._entries.items()))
+            if last_access > deadline:
+                break
+            self._evict(user_id)
+            expired += 1
+        self.stats['expirations'] += expired
+        return expired
+
+    def _evict(self, user_id: int):
+        """Удаление записи с передачей состояния в on_evict"""
+        game_state, _ = self._entries.pop(user_id)
+        if self.on_evict is not None:
+            self.on_evict(user_id, game_state)
+
+    def mark_missing(self, user_id: int):
+        """Запоминание, что у пользователя нет сохраненной игры"""
+        self._missing[user_id] = time.monotonic() + self.negative_ttl
+
+    def is_missing(self, user_id: int) -> bool:
+        """Проверка негативного кэша"""
+        expires = self._missing.get(user_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._missing[user_id]
+            return False
+        self.stats['negative_hits'] += 1
+        return True
+
+    def items(self):
+        """Все закэшированные состояния (без обновления времени обращения)"""
+        return [(user_id, game_state) for user_id, (game_state, _) in self._entries.items()]
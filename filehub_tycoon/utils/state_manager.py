@@ -1,22 +1,139 @@
 # Менеджер состояний игры
 
 import logging
-from typing import Optional, Dict, Any
+import asyncio
+import time
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 
-from game.models import GameState, Staff, UserRole, InfrastructureLevel, HostingRegion
-from utils.database import Database
+from game.models import GameState, GameStateView, construct_trusted, UserRole, TIMER_EVENT_EXPIRY
+from game import actions, idle
+from game.game_engine import GameEngine
+from utils.database import AsyncDatabase
+from utils.state_cache import StateCache
+from utils.timer_wheel import TimerWheel
+from utils.write_behind import WriteBehindQueue
 
 logger = logging.getLogger(__name__)
 
 class StateManager:
     """Класс для управления состоянием игры"""
     
-    def __init__(self, db: Database):
+    def __init__(self, db: AsyncDatabase, save_batch_size: int = 64, save_flush_interval: float = 5.0,
+                 trusted_load: bool = True, cache_size: int = 10000, cache_ttl: float = 1800.0,
+                 negative_ttl: float = 60.0, engine: Optional[GameEngine] = None, journal: bool = False,
+                 snapshot_interval: int = 10, idle_tick_hours: float = 0, timer_interval: float = 1.0):
         self.db = db
-        self._active_states: Dict[int, GameState] = {}
+        self.engine = engine or GameEngine()  # Повторяет ходы при восстановлении игры из журнала
+        self.trusted_load = trusted_load  # Собирать свои записи без повторной валидации
+        self.journal = journal  # Хранить журнал действий со снимками вместо секций
+        self.idle_tick_hours = idle_tick_hours  # Часов в ходу игры без игрока (0 - игра ждет игрока)
+        self.write_behind = WriteBehindQueue(db, max_batch=save_batch_size, flush_interval=save_flush_interval,
+                                             journal=journal, snapshot_interval=snapshot_interval)
+        self.cache = StateCache(max_entries=cache_size, ttl=cache_ttl, negative_ttl=negative_ttl,
+                                on_evict=self._on_evict)
+        self._loading: Dict[int, asyncio.Future] = {}  # Загрузки из базы, выполняющиеся сейчас
+        # Сроки по времени для всех игр в памяти (секунды); после перезапуска
+        # таймер игры восстанавливается из ее состояния при загрузке
+        self.timers = TimerWheel(now=int(time.time()))
+        self.timer_interval = timer_interval
+        self._timer_task: Optional[asyncio.Task] = None
+        self.load_stats = {
+            'loads': 0,          # Чтений из базы данных
+            'coalesced': 0       # Запросов, дождавшихся уже идущей загрузки
+        }
     
-    def create_new_game(self, user_id: int, username: str = None,
+    async def start(self):
+        """Запуск фоновой отложенной записи и проверки сроков"""
+        await self.write_behind.start()
+        if self._timer_task is None:
+            self._timer_task = asyncio.get_running_loop().create_task(self._periodic_timers())
+    
+    async def shutdown(self):
+        """Остановка проверки сроков и отложенной записи с сохранением всех изменений"""
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        self._enqueue_dirty()
+        await self.write_behind.stop()
+    
+    def flush_pending(self) -> bool:
+        """Синхронное сохранение всех ожидающих записи игр (перед выходом процесса)"""
+        self._enqueue_dirty()
+        return self.write_behind.flush_sync()
+    
+    def _enqueue_dirty(self):
+        """Постановка в очередь записи всех игр в памяти с несохраненными изменениями"""
+        for _, game_state in self.cache.items():
+            if game_state.is_dirty:
+                self.write_behind.mark_dirty(game_state)
+    
+    def _on_evict(self, user_id: int, game_state: GameState):
+        """Несохраненное состояние при вытеснении передается в отложенную запись"""
+        self.timers.cancel((user_id, TIMER_EVENT_EXPIRY))
+        if game_state.is_dirty:
+            self.write_behind.mark_dirty(game_state)
+
+    def _schedule_timers(self, game_state: Optional[GameState]) -> Optional[GameState]:
+        """Таймер истечения срока ответа на текущее событие игры"""
+        if game_state is None:
+            return None
+        key = (game_state.user_id, TIMER_EVENT_EXPIRY)
+        event = game_state.last_event
+        if event and not event.resolved and event.duration_hours:
+            deadline = int(event.timestamp.timestamp()) + event.duration_hours * 3600
+            self.timers.schedule(key, deadline, game_state.user_id)
+        else:
+            self.timers.cancel(key)
+        return game_state
+
+    def process_timers(self, now: Optional[float] = None) -> int:
+        """Срабатывание наступивших сроков пачкой; возвращает число закрытых событий"""
+        expired = 0
+        for timer in self.timers.advance(int(now if now is not None else time.time())):
+            user_id = timer.payload
+            try:
+                game_state = self._cached(user_id)
+                if game_state is not None and self._journal(game_state, 'expire_event'):
+                    expired += 1
+            except Exception as e:
+                logger.error(f"Ошибка истечения события для пользователя {user_id}: {e}")
+        if expired:
+            logger.info(f"Истек срок ответа на события: {expired}")
+        return expired
+
+    async def _periodic_timers(self):
+        """Проверка сроков по таймеру"""
+        while True:
+            await asyncio.sleep(self.timer_interval)
+            try:
+                self.process_timers()
+            except Exception as e:
+                logger.error(f"Ошибка проверки сроков: {e}")
+
+    def _cached(self, user_id: int) -> Optional[GameState]:
+        """Состояние игры из кэша или из очереди отложенной записи"""
+        game_state = self.cache.get(user_id)
+        if game_state is None:
+            # Вытесненное состояние может еще ожидать записи - оно новее, чем в базе
+            game_state = self.write_behind.pending(user_id)
+            if game_state is not None:
+                self.cache.put(user_id, game_state)
+        return game_state
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счетчики кэша состояний, загрузок и отложенной записи"""
+        stats = dict(self.cache.stats)
+        stats.update(self.load_stats)
+        stats['cached'] = len(self.cache)
+        stats['pending_writes'] = len(self.write_behind)
+        return stats
+
+    async def create_new_game(self, user_id: int, username: str = None,
                        first_name: str = None, last_name: str = None) -> GameState:
         """Создание новой игры"""
         try:
@@ -30,15 +147,12 @@ class StateManager:
                 name_setup_step="name"
             )
 
-            # Сохраняем игру в базе данных
-            self.db.save_game(
-                user_id=user_id,
-                tracker_name=game_state.tracker_name,
-                game_state=game_state.model_dump()
-            )
+            # Ставим игру в очередь отложенной записи
+            self.write_behind.mark_dirty(game_state)
 
             # Кэшируем состояние в памяти
-            self._active_states[user_id] = game_state
+            self.cache.put(user_id, game_state)
+            self._schedule_timers(game_state)
 
             logger.info(f"Создана новая игра для пользователя {user_id}")
             return game_state
@@ -47,40 +161,112 @@ class StateManager:
             logger.error(f"Ошибка создания новой игры для пользователя {user_id}: {e}")
             raise
     
-    def load_game(self, user_id: int) -> Optional[GameState]:
-        """Загрузка игры пользователя"""
+    async def load_game(self, user_id: int, validate: bool = False) -> Optional[GameState]:
+        """Загрузка игры пользователя
+        
+        Записи в секциях созданы нашими кодеками и собираются без валидации;
+        старые записи (и любые при validate=True) проходят полную валидацию.
+        Одновременные запросы одного пользователя выполняют одно чтение из базы.
+        """
         try:
-            # Проверяем кэш
-            if user_id in self._active_states:
-                return self._active_states[user_id]
+            # Проверяем кэш и очередь отложенной записи
+            game_state = self._cached(user_id)
+            if game_state is not None:
+                return self._schedule_timers(self._catch_up(game_state))
 
-            # Загружаем из базы данных
-            game_data = self.db.load_game(user_id)
-            if game_data and game_data['game_state']:
-                game_state = GameState(**game_data['game_state'])
-                self._active_states[user_id] = game_state
-                return game_state
+            # Пользователь недавно проверялся и игры не имеет
+            if self.cache.is_missing(user_id):
+                return None
 
-            return None
+            # Загрузка уже идет - ждем ее результата
+            loading = self._loading.get(user_id)
+            if loading is not None:
+                self.load_stats['coalesced'] += 1
+                return await asyncio.shield(loading)
+
+            loading = asyncio.get_running_loop().create_future()
+            self._loading[user_id] = loading
+            game_state = None
+            try:
+                game_state = await self._read_game(user_id, validate)
+                # До выдачи результата ожидающим: все запросы получают игру
+                # с примененными пропущенными ходами и запланированными сроками
+                game_state = self._schedule_timers(self._catch_up(game_state))
+            finally:
+                self._loading.pop(user_id, None)
+                loading.set_result(game_state)
+            return game_state
 
         except Exception as e:
             logger.error(f"Ошибка загрузки игры для пользователя {user_id}: {e}")
             return None
     
-    def save_game(self, user_id: int) -> bool:
-        """Сохранение игры в базу данных"""
+    def _catch_up(self, game_state: Optional[GameState]) -> Optional[GameState]:
+        """Применение ходов, прошедших без игрока (в режиме реального времени)"""
+        if game_state is None or not self.idle_tick_hours or not game_state.setup_complete:
+            return game_state
+        
+        turns = idle.elapsed_turns(game_state, datetime.now(), self.idle_tick_hours)
+        if turns:
+            summary = self._journal(game_state, 'catch_up', turns=turns, tick_hours=self.idle_tick_hours)
+            logger.info(f"Применено пропущенных ходов для пользователя {game_state.user_id}: "
+                        f"{summary['turns']} из {turns}")
+        return game_state
+    
+    async def _read_game(self, user_id: int, validate: bool) -> Optional[GameState]:
+        """Чтение игры из базы данных и помещение ее в кэш"""
+        self.load_stats['loads'] += 1
+        game_data = await self.db.load_game(user_id)
+        if not game_data or not game_data['game_state']:
+            self.cache.mark_missing(user_id)
+            return None
+
+        if self.trusted_load and not validate and not game_data['legacy']:
+            game_state = construct_trusted(GameState, game_data['game_state'])
+        else:
+            game_state = GameState(**game_data['game_state'])
+        game_state.link_last_event()
+        if game_data['snapshot_turn'] is not None:
+            game_state.mark_snapshot(game_data['snapshot_turn'])
+        if game_data['actions']:
+            # Действия после снимка повторяются; их записи журнала уже есть в базе
+            actions.replay(game_state, self.engine, game_data['actions'])
+            game_state.take_log()
+        if not game_data['legacy']:
+            # Старые записи будут целиком переписаны в секции при следующем сохранении
+            game_state.mark_persisted(game_state.version)
+            if not self.journal and (game_data['snapshot_turn'] is not None or game_data['actions']):
+                # Секции в базе старее снимка и повторенных действий: при первой
+                # записи секциями переписываются все, иначе чтение смешает их со старыми
+                game_state.touch()
+                self.write_behind.mark_dirty(game_state)
+        if game_state.compact_history():
+            # История из состояния старого формата переносится в журнал событий
+            self.write_behind.mark_dirty(game_state)
+
+        # Пока шло чтение, игра могла быть создана заново - она новее
+        if user_id in self.cache:
+            return self.cache.get(user_id)
+        self.cache.put(user_id, game_state)
+        return game_state
+    
+    async def save_game(self, user_id: int, durable: bool = False) -> bool:
+        """Сохранение игры в базу данных
+        
+        По умолчанию игра ставится в очередь отложенной записи; durable=True
+        записывает ее немедленно (явное сохранение игроком).
+        """
         try:
-            if user_id not in self._active_states:
+            game_state = self._cached(user_id)
+            if game_state is None:
                 logger.warning(f"Нет активной игры для пользователя {user_id}")
                 return False
 
-            game_state = self._active_states[user_id]
+            if durable:
+                return await self.write_behind.flush_user(user_id, game_state)
 
-            return self.db.save_game(
-                user_id=user_id,
-                tracker_name=game_state.tracker_name,
-                game_state=game_state.model_dump()
-            )
+            self.write_behind.mark_dirty(game_state)
+            return True
 
         except Exception as e:
             logger.error(f"Ошибка сохранения игры для пользователя {user_id}: {e}")
@@ -89,47 +275,126 @@ class StateManager:
     def update_state(self, user_id: int, updates: Dict[str, Any]) -> bool:
         """Обновление состояния игры"""
         try:
-            if user_id not in self._active_states:
+            game_state = self._cached(user_id)
+            if game_state is None:
                 logger.warning(f"Нет активной игры для пользователя {user_id}")
                 return False
             
-            game_state = self._active_states[user_id]
-            
-            # Применяем обновления
-            for key, value in updates.items():
-                if hasattr(game_state, key):
-                    setattr(game_state, key, value)
-                else:
+            for key in updates:
+                if not hasattr(game_state, key):
                     logger.warning(f"Неизвестное поле состояния игры: {key}")
             
-            return True
+            # Применяем обновления
+            return bool(self._perform(user_id, 'update', updates=updates))
             
         except Exception as e:
             logger.error(f"Ошибка обновления состояния для пользователя {user_id}: {e}")
             return False
     
-    def get_game_state(self, user_id: int) -> Optional[GameState]:
-        """Получение текущего состояния игры"""
-        return self._active_states.get(user_id)
+    async def get_game_state(self, user_id: int) -> Optional[GameState]:
+        """Получение текущего состояния игры (из кэша или из базы данных)"""
+        return await self.load_game(user_id)
     
-    def advance_turn(self, user_id: int) -> bool:
-        """Переход к следующему ходу игры"""
+    async def get_sections(self, user_id: int, sections: List[str]) -> Optional[Any]:
+        """Получение состояния игры для экранов только для чтения
+        
+        Если игра уже в памяти, возвращается она сама; иначе из базы данных
+        читаются только указанные секции.
+        """
+        if self.journal or self.idle_tick_hours:
+            # Секции в режиме журнала не обновляются - игра собирается из снимка,
+            # а в режиме реального времени сначала применяются пропущенные ходы
+            return await self.load_game(user_id)
+        
+        game_state = self._cached(user_id)
+        if game_state is not None:
+            return game_state
+        
+        data = await self.db.load_sections(user_id, sections)
+        if not data:
+            return None
+        return GameStateView(data)
+    
+    async def get_event_history(self, user_id: int, kinds: Optional[List[str]] = None,
+                                limit: int = 20) -> List[Dict[str, Any]]:
+        """История событий игры из журнала (от новых к старым), включая еще не записанные"""
+        records = []
+        game_state = self._cached(user_id)
+        if game_state is not None:
+            for turn, seq, kind, data in reversed(game_state.pending_log()):
+                if kinds is None or kind in kinds:
+                    records.append({'turn': turn, 'seq': seq, 'kind': kind, 'data': data})
+        
+        if len(records) < limit:
+            stored = await self.db.load_events(user_id, kinds, limit=limit)
+            seen = {record['seq'] for record in records}
+            records.extend(record for record in stored if record['seq'] not in seen)
+        return records[:limit]
+    
+    def _perform(self, user_id: int, action: str, **params) -> Any:
+        """Выполнение действия игрока с записью в журнал (None - нет активной игры)"""
+        game_state = self._cached(user_id)
+        if game_state is None:
+            return None
+        result = self._journal(game_state, action, **params)
+        self._schedule_timers(game_state)
+        return result
+    
+    def _journal(self, game_state: GameState, action: str, **params) -> Any:
+        """Выполнение действия с записью в журнал и постановкой игры в очередь записи
+        
+        Через этот метод проходят все действия менеджера: запись журнала
+        попадает в базу со следующим сбросом очереди, а повторные нажатия
+        кнопок склеиваются в одну запись.
+        """
+        result = actions.perform(game_state, self.engine, action, **params)
+        if game_state.is_dirty:
+            self.write_behind.mark_dirty(game_state)
+        return result
+    
+    def play_turn(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Обработка хода игры движком (результат GameEngine.process_turn)"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
+            return self._perform(user_id, 'turn')
             
-            # Увеличиваем номер хода
-            game_state.current_turn += 1
+        except Exception as e:
+            logger.error(f"Ошибка обработки хода для пользователя {user_id}: {e}")
+            return {'status': 'error', 'message': str(e)}
+    
+    def fast_forward(self, user_id: int, max_turns: int) -> Optional[Dict[str, Any]]:
+        """Пропуск нескольких ходов подряд (сводка game.actions.fast_forward)
+        
+        Игра ставится в очередь записи один раз - после всех ходов.
+        """
+        try:
+            game_state = self._cached(user_id)
+            if game_state is None:
+                return None
             
-            # Восстанавливаем количество действий
-            game_state.actions_remaining = 3
+            summary = actions.fast_forward(game_state, self.engine, max_turns)
+            self._schedule_timers(game_state)
+            self.write_behind.mark_dirty(game_state)
+            logger.info(f"Пропущено ходов для пользователя {user_id}: {summary['turns']}")
+            return summary
             
-            # Обновляем время последнего хода
-            game_state.last_turn_date = datetime.now()
+        except Exception as e:
+            logger.error(f"Ошибка пропуска ходов для пользователя {user_id}: {e}")
+            return None
+    
+    def choose_event(self, user_id: int, choice_index: int) -> Dict[str, Any]:
+        """Выбор варианта в текущем событии (результат GameEngine.handle_event_choice)"""
+        try:
+            result = self._perform(user_id, 'event_choice', choice_index=choice_index)
+            return result if result is not None else {'success': False, 'message': 'Нет активной игры'}
             
-            return True
+        except Exception as e:
+            logger.error(f"Ошибка выбора в событии для пользователя {user_id}: {e}")
+            return {'success': False, 'message': str(e)}
+    
+    def advance_turn(self, user_id: int) -> bool:
+        """Переход к следующему ходу игры"""
+        try:
+            return bool(self._perform(user_id, 'next', at=datetime.now().isoformat()))
             
         except Exception as e:
             logger.error(f"Ошибка перехода к следующему ходу для пользователя {user_id}: {e}")
@@ -139,35 +404,8 @@ class StateManager:
                   salary: int, skill_level: int = 1) -> bool:
         """Найм сотрудника"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            
-            # Проверяем, не нанят ли уже сотрудник на эту роль
-            if role in game_state.staff and game_state.staff[role].hired:
-                return False
-            
-            # Создаем нового сотрудника
-            staff_member = Staff(
-                role=role,
-                name=name,
-                salary=salary,
-                skill_level=skill_level,
-                hired=True,
-                hired_date=datetime.now()
-            )
-            
-            # Добавляем в команду
-            game_state.staff[role.value] = staff_member
-            
-            # Увеличиваем расходы на персонал
-            game_state.expenses.staff_cost += salary
-            
-            # Увеличиваем общие расходы
-            game_state.expenses.total_expenses += salary
-            
-            return True
+            return bool(self._perform(user_id, 'hire', role=UserRole(role).value, name=name,
+                                      salary=salary, skill_level=skill_level))
             
         except Exception as e:
             logger.error(f"Ошибка найма сотрудника для пользователя {user_id}: {e}")
@@ -176,25 +414,7 @@ class StateManager:
     def upgrade_infrastructure(self, user_id: int, upgrade_type: str, level: str) -> bool:
         """Апгрейд инфраструктуры"""
         try:
-            if user_id not in self._active_states:
-                return False
-
-            game_state = self._active_states[user_id]
-            infrastructure = game_state.infrastructure
-
-            # Обновляем соответствующий компонент инфраструктуры
-            if upgrade_type == 'server' and hasattr(infrastructure, 'server_level'):
-                infrastructure.server_level = InfrastructureLevel(level)
-            elif upgrade_type == 'bandwidth' and hasattr(infrastructure, 'bandwidth_level'):
-                infrastructure.bandwidth_level = InfrastructureLevel(level)
-            elif upgrade_type == 'storage' and hasattr(infrastructure, 'storage_level'):
-                infrastructure.storage_level = InfrastructureLevel(level)
-            elif upgrade_type == 'security' and hasattr(infrastructure, 'security_level'):
-                infrastructure.security_level = InfrastructureLevel(level)
-            else:
-                return False
-
-            return True
+            return bool(self._perform(user_id, 'upgrade', upgrade_type=upgrade_type, level=level))
 
         except Exception as e:
             logger.error(f"Ошибка апгрейда инфраструктуры для пользователя {user_id}: {e}")
@@ -203,17 +423,7 @@ class StateManager:
     def add_hosting_region(self, user_id: int, region: str, level: str) -> bool:
         """Добавление региона хостинга"""
         try:
-            if user_id not in self._active_states:
-                return False
-
-            game_state = self._active_states[user_id]
-            hosting = game_state.hosting
-
-            # Добавляем новый регион
-            hosting.regions[HostingRegion(region)] = InfrastructureLevel(level)
-            hosting.mirrors_count += 1
-
-            return True
+            return bool(self._perform(user_id, 'hosting', region=region, level=level))
 
         except Exception as e:
             logger.error(f"Ошибка добавления региона хостинга для пользователя {user_id}: {e}")
@@ -222,73 +432,70 @@ class StateManager:
     def start_marketing_campaign(self, user_id: int, campaign_type: str, level: str, cost: int) -> bool:
         """Запуск маркетинговой кампании"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            marketing = game_state.marketing
-            
-            # Добавляем кампанию
-            campaign_key = f"{campaign_type}_{level}"
-            marketing.campaigns[campaign_key] = {
-                'type': campaign_type,
-                'level': level,
-                'cost': cost,
-                'start_turn': game_state.current_turn,
-                'duration': 3  # Ходы
-            }
-            
-            # Увеличиваем расходы на маркетинг
-            marketing.ad_spend += cost
-            game_state.expenses.marketing_cost += cost
-            game_state.expenses.total_expenses += cost
-            
-            # Уменьшаем бюджет
-            game_state.budget -= cost
-            
-            return True
+            return bool(self._perform(user_id, 'campaign', campaign_type=campaign_type, level=level, cost=cost))
             
         except Exception as e:
             logger.error(f"Ошибка запуска маркетинговой кампании для пользователя {user_id}: {e}")
             return False
     
-    def calculate_metrics(self, user_id: int) -> bool:
-        """Расчет игровых метрик"""
+    def buy_staff(self, user_id: int, role: str, name: str = None) -> bool:
+        """Найм сотрудника с оплатой первой зарплаты из бюджета"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
+            return bool(self._perform(user_id, 'buy_staff', role=UserRole(role).value, name=name))
             
-            # Расчет доходов
-            ad_revenue = int(game_state.active_users * 0.1)  # 10 копеек за пользователя
-            donation_revenue = int(game_state.community.donations_monthly * 0.8)
-            
-            game_state.revenue.ad_revenue = ad_revenue
-            game_state.revenue.donation_revenue = donation_revenue
-            game_state.revenue.total_revenue = ad_revenue + donation_revenue
+        except Exception as e:
+            logger.error(f"Ошибка найма сотрудника для пользователя {user_id}: {e}")
+            return False
+    
+    def buy_upgrade(self, user_id: int, upgrade_type: str, level: str) -> bool:
+        """Апгрейд инфраструктуры с оплатой из бюджета"""
+        try:
+            return bool(self._perform(user_id, 'buy_upgrade', upgrade_type=upgrade_type, level=level))
             
-            # Расчет денежного потока
-            game_state.financial.cash_flow = game_state.revenue.total_revenue - game_state.expenses.total_expenses
+        except Exception as e:
+            logger.error(f"Ошибка апгрейда инфраструктуры для пользователя {user_id}: {e}")
+            return False
+    
+    def buy_hosting(self, user_id: int, region: str, level: str = 'basic') -> bool:
+        """Добавление региона хостинга с оплатой из бюджета"""
+        try:
+            return bool(self._perform(user_id, 'buy_hosting', region=region, level=level))
             
-            # Обновляем бюджет
-            game_state.budget += game_state.financial.cash_flow
+        except Exception as e:
+            logger.error(f"Ошибка добавления региона хостинга для пользователя {user_id}: {e}")
+            return False
+    
+    def buy_legal(self, user_id: int, legal_action: str) -> bool:
+        """Юридическое действие (Config.LEGAL_ACTIONS) с оплатой из бюджета"""
+        try:
+            return bool(self._perform(user_id, 'buy_legal', legal_action=legal_action))
             
-            # Расчет скорости сжигания денег
-            if game_state.financial.cash_flow < 0:
-                game_state.financial.burn_rate = abs(game_state.financial.cash_flow)
-                # Расчет оставшихся месяцев
-                if game_state.financial.burn_rate > 0:
-                    game_state.financial.runway_months = game_state.budget / game_state.financial.burn_rate
-            else:
-                game_state.financial.burn_rate = 0
-                game_state.financial.runway_months = 999
+        except Exception as e:
+            logger.error(f"Ошибка юридического действия для пользователя {user_id}: {e}")
+            return False
+    
+    def request_donations(self, user_id: int, amount: int) -> bool:
+        """Сбор пожертвований у сообщества"""
+        try:
+            return bool(self._perform(user_id, 'donations', amount=amount))
             
-            # Расчет прибыльности
-            if game_state.revenue.total_revenue > 0:
-                game_state.financial.profit_margin = (game_state.revenue.total_revenue - game_state.expenses.total_expenses) / game_state.revenue.total_revenue * 100
+        except Exception as e:
+            logger.error(f"Ошибка сбора пожертвований для пользователя {user_id}: {e}")
+            return False
+    
+    def post_ledger_entry(self, user_id: int, category: str, amount: int, source: str) -> bool:
+        """Разовая операция в финансовом журнале (доход положительный, расход отрицательный)"""
+        try:
+            return bool(self._perform(user_id, 'ledger', category=category, amount=amount, source=source))
             
-            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи в финансовый журнал для пользователя {user_id}: {e}")
+            return False
+    
+    def calculate_metrics(self, user_id: int) -> bool:
+        """Расчет игровых метрик"""
+        try:
+            return bool(self._perform(user_id, 'metrics'))
             
         except Exception as e:
             logger.error(f"Ошибка расчета метрик для пользователя {user_id}: {e}")
@@ -297,21 +504,7 @@ class StateManager:
     def handle_event_response(self, user_id: int, choice: str) -> bool:
         """Обработка ответа на событие"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            
-            if game_state.last_event and not game_state.last_event.resolved:
-                game_state.last_event.selected_choice = choice
-                game_state.last_event.resolved = True
-                
-                # Применяем влияние выбора
-                # Это будет реализовано в зависимости от типа события
-                
-                return True
-            
-            return False
+            return bool(self._perform(user_id, 'event_answer', choice=choice))
             
         except Exception as e:
             logger.error(f"Ошибка обработки ответа на событие для пользователя {user_id}: {e}")
@@ -320,11 +513,10 @@ class StateManager:
     def check_win_conditions(self, user_id: int) -> bool:
         """Проверка условий победы"""
         try:
-            if user_id not in self._active_states:
+            game_state = self._cached(user_id)
+            if game_state is None:
                 return False
             
-            game_state = self._active_states[user_id]
-            
             # Условия победы:
             # 1. Больше 1 млн активных пользователей
             # 2. NPS больше 70
@@ -347,11 +539,10 @@ class StateManager:
     def check_lose_conditions(self, user_id: int) -> bool:
         """Проверка условий поражения"""
         try:
-            if user_id not in self._active_states:
+            game_state = self._cached(user_id)
+            if game_state is None:
                 return False
             
-            game_state = self._active_states[user_id]
-            
             # Условия поражения:
             # 1. Бюджет меньше или равен 0
             # 2. Юридический риск больше или равен 100
@@ -372,19 +563,7 @@ class StateManager:
     def generate_setup_options(self, user_id: int) -> bool:
         """Генерация вариантов для настройки названия и домена"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            
-            # Импортируем генератор
-            from utils.name_generator import TrackerNameGenerator
-            
-            # Генерируем варианты
-            options = TrackerNameGenerator.generate_multiple_options(5)
-            game_state.current_setup_options = options
-            
-            return True
+            return bool(self._perform(user_id, 'setup_options'))
             
         except Exception as e:
             logger.error(f"Ошибка генерации вариантов настройки для пользователя {user_id}: {e}")
@@ -393,16 +572,9 @@ class StateManager:
     def setup_hub_name(self, user_id: int, name: str) -> bool:
         """Настройка названия хаба"""
         try:
-            if user_id not in self._active_states:
+            if not self._perform(user_id, 'setup_name', name=name):
                 return False
             
-            game_state = self._active_states[user_id]
-            
-            # Устанавливаем название
-            game_state.tracker_name = name
-            game_state.site_name = name
-            game_state.name_setup_step = "domain"
-            
             logger.info(f"Установлено название хаба для пользователя {user_id}: {name}")
             return True
             
@@ -413,17 +585,9 @@ class StateManager:
     def setup_hub_domain(self, user_id: int, domain: str) -> bool:
         """Настройка домена хаба"""
         try:
-            if user_id not in self._active_states:
+            if not self._perform(user_id, 'setup_domain', domain=domain):
                 return False
             
-            game_state = self._active_states[user_id]
-            
-            # Устанавливаем домен
-            game_state.domain_name = domain
-            game_state.available_domains = [domain]
-            game_state.name_setup_step = "complete"
-            game_state.setup_complete = True
-            
             logger.info(f"Установлен домен хаба для пользователя {user_id}: {domain}")
             return True
             
@@ -434,27 +598,11 @@ class StateManager:
     def select_setup_option(self, user_id: int, option_index: int) -> bool:
         """Выбор варианта настройки из предложенных"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            
-            if option_index >= len(game_state.current_setup_options):
+            if not self._perform(user_id, 'setup_select', option_index=option_index):
                 return False
             
-            # Получаем выбранный вариант
-            name, domain = game_state.current_setup_options[option_index]
-            
-            # Устанавливаем название и домен
-            game_state.tracker_name = name
-            game_state.site_name = name
-            game_state.domain_name = domain
-            game_state.available_domains = [domain]
-            game_state.name_setup_step = "complete"
-            game_state.setup_complete = True
-            game_state.current_setup_options = []
-            
-            logger.info(f"Выбран вариант настройки для пользователя {user_id}: {name} ({domain})")
+            game_state = self._cached(user_id)
+            logger.info(f"Выбран вариант настройки для пользователя {user_id}: {game_state.tracker_name} ({game_state.domain_name})")
             return True
             
         except Exception as e:
@@ -464,30 +612,12 @@ class StateManager:
     def change_domain(self, user_id: int, new_domain: str) -> bool:
         """Смена домена хаба"""
         try:
-            if user_id not in self._active_states:
-                return False
-            
-            game_state = self._active_states[user_id]
-            
-            # Проверяем, что домен валиден
-            from utils.name_generator import TrackerNameGenerator
-            if not TrackerNameGenerator.validate_domain(new_domain):
+            if not self._perform(user_id, 'change_domain', domain=new_domain):
                 return False
             
-            # Добавляем новый домен в список доступных
-            if new_domain not in game_state.available_domains:
-                game_state.available_domains.append(new_domain)
-            
-            # Устанавливаем новый домен как текущий
-            game_state.domain_name = new_domain
-            
-            # Если текущий домен был заблокирован, разблокируем
-            if game_state.current_domain_blocked:
-                game_state.current_domain_blocked = False
-            
             logger.info(f"Сменен домен хаба для пользователя {user_id}: {new_domain}")
             return True
             
         except Exception as e:
             logger.error(f"Ошибка смены домена для пользователя {user_id}: {e}")
-            return False
\ No newline at end of file
+            return False
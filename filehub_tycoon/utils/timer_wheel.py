@@ -0,0 +1,135 @@
+# Иерархическое колесо таймеров
+#
+# Таймер - ключ со сроком в целых тиках (ходах или секундах). Колесо
+# уровня l делит время на ячейки по slots^l тиков; таймер лежит на самом
+# нижнем уровне, где его срок и текущее время совпадают во всех старших
+# разрядах. Когда время переходит границу ячейки верхнего уровня, ее таймеры
+# раскладываются по нижним уровням, а таймеры ячейки нулевого уровня
+# срабатывают. Добавление и отмена по ключу - O(1), продвижение времени
+# пропускает пустые участки и возвращает сработавшие таймеры пачкой.
+
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional
+
+class Timer(NamedTuple):
+    """Сработавший таймер"""
+    key: Hashable
+    deadline: int
+    payload: Any
+
+class TimerWheel:
+    """Таймеры с O(1) добавлением и отменой по ключу
+
+    Ключ уникален: повторное добавление заменяет прежний таймер. Таймеры со
+    сроком не позже текущего времени срабатывают при следующем advance.
+    """
+
+    def __init__(self, now: int = 0, slot_bits: int = 6, levels: int = 4):
+        self.now = now
+        self._bits = slot_bits
+        self._mask = (1 << slot_bits) - 1
+        self._levels: List[Dict[int, Dict[Hashable, Timer]]] = [{} for _ in range(levels)]  # Уровень -> ячейка -> таймеры
+        self._counts = [0] * levels
+        self._overflow: Dict[Hashable, Timer] = {}  # Сроки за пределами верхнего уровня
+        self._due: Dict[Hashable, Timer] = {}       # Сроки, уже наступившие при добавлении
+        self._where: Dict[Hashable, Dict[Hashable, Timer]] = {}  # Ключ -> ячейка, где лежит таймер
+        self._level_of: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def _place(self, timer: Timer):
+        """Помещение таймера в ячейку относительно текущего времени"""
+        if timer.deadline <= self.now:
+            bucket, level = self._due, -1
+        else:
+            bucket, level = self._overflow, -1
+            for candidate in range(len(self._levels)):
+                shift = self._bits * (candidate + 1)
+                if timer.deadline >> shift == self.now >> shift:
+                    slot = (timer.deadline >> (self._bits * candidate)) & self._mask
+                    bucket = self._levels[candidate].setdefault(slot, {})
+                    level = candidate
+                    self._counts[level] += 1
+                    break
+        bucket[timer.key] = timer
+        self._where[timer.key] = bucket
+        self._level_of[timer.key] = level
+
+    def schedule(self, key: Hashable, deadline: int, payload: Any = None):
+        """Добавление (или перенос) таймера с ключом key на срок deadline"""
+        self.cancel(key)
+        self._place(Timer(key, deadline, payload))
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отмена таймера; False - таймера с таким ключом нет"""
+        bucket = self._where.pop(key, None)
+        if bucket is None:
+            return False
+        del bucket[key]
+        level = self._level_of.pop(key)
+        if level >= 0:
+            self._counts[level] -= 1
+        return True
+
+    def _take(self, bucket: Dict[Hashable, Timer], level: int) -> List[Timer]:
+        """Извлечение всех таймеров ячейки"""
+        timers = list(bucket.values())
+        bucket.clear()
+        for timer in timers:
+            del self._where[timer.key]
+            del self._level_of[timer.key]
+        if level >= 0:
+            self._counts[level] -= len(timers)
+        return timers
+
+    def _skip_target(self, target: int) -> int:
+        """Последний тик до target, который можно пропустить без срабатываний и раскладок"""
+        for level, count in enumerate(self._counts):
+            if count:
+                if level == 0:
+                    return self.now
+                block = 1 << (self._bits * level)
+                return min(target, (self.now // block + 1) * block - 1)
+        if self._overflow:
+            # Сразу к блоку верхнего уровня с ближайшим сроком
+            block = 1 << (self._bits * len(self._levels))
+            earliest = min(timer.deadline for timer in self._overflow.values())
+            return min(target, earliest // block * block - 1)
+        return target
+
+    def advance(self, now: int) -> List[Timer]:
+        """Продвижение времени до now; возвращает сработавшие таймеры в порядке сроков"""
+        fired = self._take(self._due, -1) if self._due else []
+        while self.now < now:
+            self.now = self._skip_target(now)
+            if self.now >= now:
+                break
+
+            previous, self.now = self.now, self.now + 1
+            # Раскладка ячеек уровней, чей разряд изменился (сверху вниз)
+            top_shift = self._bits * len(self._levels)
+            if self._overflow and self.now >> top_shift != previous >> top_shift:
+                for timer in self._take(self._overflow, -1):
+                    self._place(timer)
+            for level in range(len(self._levels) - 1, 0, -1):
+                shift = self._bits * level
+                if self.now >> shift != previous >> shift:
+                    bucket = self._levels[level].get((self.now >> shift) & self._mask)
+                    if bucket:
+                        for timer in self._take(bucket, level):
+                            self._place(timer)
+
+            bucket = self._levels[0].get(self.now & self._mask)
+            if bucket:
+                fired.extend(self._take(bucket, 0))
+            if self._due:
+                fired.extend(self._take(self._due, -1))
+        return fired
+
+    def next_deadline(self) -> Optional[int]:
+        """Ближайший срок (для проверок и отладки; O(числа таймеров))"""
+        deadlines = [bucket[key].deadline for key, bucket in self._where.items()]
+        return min(deadlines) if deadlines else None
@@ -0,0 +1,189 @@
+# Отложенная запись состояний игр
+
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+from game.models import GameState, ALL_SECTIONS
+from utils.database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """Очередь отложенной записи между StateManager и базой данных
+
+    Повторные сохранения одного пользователя склеиваются в одну запись,
+    накопленные игры сбрасываются одной транзакцией по порогу размера или времени.
+    В режиме журнала (journal=True) секции не пишутся: записываются только
+    новые записи журнала и раз в snapshot_interval ходов - снимок состояния.
+    """
+
+    def __init__(self, db: AsyncDatabase, max_batch: int = 64, flush_interval: float = 5.0,
+                 journal: bool = False, snapshot_interval: int = 10):
+        self.db = db
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.snapshot_interval = max(1, snapshot_interval)
+
+        self._dirty: Dict[int, GameState] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None  # Создается в event loop при первом сбросе
+        self._flush_task: Optional[asyncio.Task] = None
+        self._periodic_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'marked': 0,       # Всего запросов на сохранение
+            'coalesced': 0,    # Запросов, склеенных с уже ожидающими
+            'batches': 0,      # Выполненных пакетных транзакций
+            'rows_written': 0,  # Записанных строк
+            'skipped_clean': 0,  # Пропущенных игр без изменений с последней записи
+            'sections_written': 0,  # Записанных секций состояния
+            'events_written': 0,    # Записанных строк журнала событий
+            'snapshots_written': 0  # Записанных снимков состояния (режим журнала)
+        }
+
+    def mark_dirty(self, game_state: GameState):
+        """Пометка состояния игры как требующего сохранения"""
+        self.stats['marked'] += 1
+        if game_state.user_id in self._dirty:
+            self.stats['coalesced'] += 1
+        self._dirty[game_state.user_id] = game_state
+
+        # Порог по размеру - сбрасываем, не дожидаясь таймера
+        if len(self._dirty) >= self.max_batch:
+            self._schedule_flush()
+
+    def pending(self, user_id: int) -> Optional[GameState]:
+        """Получение ожидающего записи состояния пользователя"""
+        return self._dirty.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._dirty)
+
+    def _schedule_flush(self):
+        """Запуск фонового сброса, если он еще не запущен"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Вне event loop сброс выполнит таймер или flush_sync
+        self._flush_task = loop.create_task(self.flush())
+
+    def _take_batch(self, user_ids: Optional[List[int]] = None) -> List[Tuple[GameState, int, Dict[str, Any], list, Optional[tuple]]]:
+        """Извлечение и сериализация ожидающих записи игр
+
+        Игры, версия которых уже записана в базу, не сериализуются повторно,
+        у остальных сериализуются только измененные секции (в режиме журнала -
+        снимок, если он нужен) и новые записи журнала.
+        """
+        if user_ids is None:
+            user_ids = list(self._dirty)
+
+        batch = []
+        for user_id in user_ids:
+            game_state = self._dirty.pop(user_id, None)
+            if game_state is None:
+                continue
+            if not game_state.is_dirty:
+                self.stats['skipped_clean'] += 1
+                continue
+            snapshot = None
+            if self.journal:
+                sections = {}
+                if game_state.snapshot_due(self.snapshot_interval):
+                    # Снимок и забираемый ниже журнал согласованы: в снимок вошли записи до log_seq
+                    snapshot = (game_state.current_turn, game_state.log_seq, game_state.dump_sections(ALL_SECTIONS))
+                    self.stats['snapshots_written'] += 1
+            else:
+                sections = game_state.dump_sections(game_state.dirty_sections())
+            log = game_state.take_log()
+            self.stats['sections_written'] += len(sections)
+            self.stats['events_written'] += len(log)
+            batch.append((game_state, game_state.version, sections, log, snapshot))
+        return batch
+
+    @staticmethod
+    def _rows(batch: List[Tuple[GameState, int, Dict[str, Any], list, Optional[tuple]]]) -> List[tuple]:
+        """Строки для пакетной записи в базу данных"""
+        return [(game_state.user_id, game_state.tracker_name, version, sections, log, snapshot)
+                for game_state, version, sections, log, snapshot in batch]
+
+    def _complete(self, batch: List[Tuple[GameState, int, Dict[str, Any], list, Optional[tuple]]], success: bool):
+        """Учет результата записи пачки"""
+        if success:
+            for game_state, version, _, _, snapshot in batch:
+                game_state.mark_persisted(version)
+                if snapshot is not None:
+                    game_state.mark_snapshot(snapshot[0])
+            self.stats['batches'] += 1
+            self.stats['rows_written'] += len(batch)
+        else:
+            # Возвращаем игры в очередь, если их не пометили заново; записи журнала - обратно в игру
+            for game_state, _, _, log, _ in batch:
+                game_state.restore_log(log)
+                self._dirty.setdefault(game_state.user_id, game_state)
+
+    async def _write(self, user_ids: Optional[List[int]] = None) -> bool:
+        """Запись выбранных (или всех) ожидающих игр одной транзакцией"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            batch = self._take_batch(user_ids)
+            if not batch:
+                return True
+
+            success = await self.db.save_games(self._rows(batch))
+            self._complete(batch, success)
+            return success
+
+    async def flush(self) -> bool:
+        """Сброс всех ожидающих игр"""
+        return await self._write()
+
+    async def flush_user(self, user_id: int, game_state: Optional[GameState] = None) -> bool:
+        """Приоритетная запись одной игры (например, для явного /save)"""
+        if game_state is not None:
+            self._dirty[user_id] = game_state
+        return await self._write([user_id])
+
+    def flush_sync(self, timeout: Optional[float] = None) -> bool:
+        """Синхронный сброс всех ожидающих игр (для обработчика сигналов)"""
+        batch = self._take_batch()
+        if not batch:
+            return True
+
+        # Запись идет через поток-писатель, чтобы не обогнать уже стоящие в очереди записи
+        success = self.db.submit_write(self.db.db.save_games, self._rows(batch)).result(timeout)
+        self._complete(batch, success)
+        return success
+
+    async def _periodic_flush(self):
+        """Сброс по таймеру"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Ошибка отложенной записи: {e}")
+
+    async def start(self):
+        """Запуск сброса по таймеру"""
+        if self._periodic_task is None:
+            self._periodic_task = asyncio.get_running_loop().create_task(self._periodic_flush())
+
+    async def stop(self):
+        """Остановка таймера и финальный сброс"""
+        if self._periodic_task is not None:
+            self._periodic_task.cancel()
+            try:
+                await self._periodic_task
+            except asyncio.CancelledError:
+                pass
+            self._periodic_task = None
+
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self.flush()